@@ -305,7 +305,7 @@ class CharGenerator(commands.Cog):
 
     @staticmethod
     def stat_gen():
-        stats = [roll('4d6kh3').total for _ in range(6)]
+        stats = [roll('4d6kh3', total_only=True).total for _ in range(6)]
         return stats
 
 
@@ -5,10 +5,13 @@ import discord
 from discord.ext import commands
 
 from cogs5e.funcs import scripting
-from cogs5e.funcs.dice import roll
+from cogs5e.funcs.dice import roll, roll_many
+from cogs5e.funcs.dicesim import DEFAULT_TRIALS, simulate
+from cogs5e.funcs.dicestats import get_distribution
 from cogs5e.funcs.lookupFuncs import select_monster_full
 from cogs5e.funcs.sheetFuncs import sheet_attack
 from cogs5e.models import embeds
+from cogs5e.models.errors import NoExactDistribution
 from cogs5e.models.monster import Monster, SKILL_MAP
 from utils.argparser import argparse
 from utils.functions import fuzzy_search, a_or_an, verbose_stat, camel_to_title
@@ -83,13 +86,10 @@ class Dice(commands.Cog):
             return await ctx.send("Too many or too few iterations.")
         self.bot.rdb.incr('dice_rolled_life')
         adv = 0
-        out = []
         if re.search('(^|\s+)(adv|dis)(\s+|$)', args) is not None:
             adv = 1 if re.search('(^|\s+)adv(\s+|$)', args) is not None else -1
             args = re.sub('(adv|dis)(\s+|$)', '', args)
-        for _ in range(iterations):
-            res = roll(rollStr, adv=adv, rollFor=args, inline=True)
-            out.append(res)
+        out = roll_many(rollStr, iterations, adv=adv, rollFor=args, inline=True)
         outStr = "Rolling {} iterations...\n".format(iterations)
         outStr += '\n'.join([o.skeleton for o in out])
         if len(outStr) < 1500:
@@ -116,8 +116,7 @@ class Dice(commands.Cog):
         if re.search('(^|\s+)(adv|dis)(\s+|$)', args) is not None:
             adv = 1 if re.search('(^|\s+)adv(\s+|$)', args) is not None else -1
             args = re.sub('(adv|dis)(\s+|$)', '', args)
-        for r in range(iterations):
-            res = roll(rollStr, adv=adv, rollFor=args, inline=True)
+        for res in roll_many(rollStr, iterations, adv=adv, rollFor=args, inline=True):
             if res.plain >= dc:
                 successes += 1
             out.append(res)
@@ -135,6 +134,45 @@ class Dice(commands.Cog):
             pass
         await ctx.send(ctx.author.mention + '\n' + outStr)
 
+    @commands.command(name='dstats', aliases=['rstats'])
+    async def dice_stats(self, ctx, rollStr, *, args=''):
+        """Shows the probability distribution of a roll.
+        Rolls that cannot be solved exactly (such as exploding or rerolling dice) are simulated instead.
+        Usage: !dstats <xdy> [args]
+        __Valid Arguments__
+        adv/dis
+        -dc [dc] (shows the chance to meet or beat the DC)
+        -trials [trials] (the number of trials to simulate, default 100000)"""
+        args = argparse(args)
+        adv = args.adv()
+        dc = args.last('dc', type_=int)
+        trials = args.last('trials', DEFAULT_TRIALS, int)
+
+        simulated = False
+        try:
+            dist = await self.bot.loop.run_in_executor(None, get_distribution, rollStr, adv)
+        except NoExactDistribution:
+            dist = await self.bot.loop.run_in_executor(None, simulate, rollStr, adv, trials)
+            simulated = True
+
+        percentiles = ' | '.join(f"{p}%: {dist.percentile(p)}" for p in (5, 25, 50, 75, 95))
+        out = f"**{rollStr}**{' (advantage)' if adv == 1 else ' (disadvantage)' if adv == -1 else ''}\n" \
+              f"**Mean:** {float(dist.mean()):.2f} | **Std. Dev.:** {dist.stdev():.2f} | " \
+              f"**Range:** {dist.min} to {dist.max}\n" \
+              f"**Percentiles:** {percentiles}"
+        if simulated:
+            low, high = dist.confidence_interval()
+            histogram = '\n'.join(f"`{lo:>4}-{hi:<4}` {'#' * round(frac * 40)} {frac:.1%}"
+                                  for lo, hi, frac in dist.histogram() if frac)
+            out += f"\n**Mean (95% CI):** {low:.2f} to {high:.2f}\n{histogram}\n" \
+                   f"*Simulated from {dist.trials} trials.*"
+        if dc is not None:
+            out += f"\n**Chance to meet DC {dc}:** {float(dist.at_least(dc)):.2%}"
+            if simulated:
+                low, high = dist.at_least_interval(dc)
+                out += f" ({low:.2%} to {high:.2%})"
+        await ctx.send(out)
+
     @commands.command(aliases=['ma', 'monster_attack'])
     async def monster_atk(self, ctx, monster_name, atk_name='list', *, args=''):
         """Rolls a monster's attack.
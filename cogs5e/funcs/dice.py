@@ -5,14 +5,19 @@ Created on Dec 25, 2016
 """
 
 import logging
+import operator
 import random
 import re
 import traceback
+from collections import Counter, namedtuple
+from decimal import Decimal
+from fractions import Fraction
+from functools import lru_cache
 from heapq import nlargest, nsmallest
 from math import floor
 from re import IGNORECASE
 
-import numexpr
+import numpy
 
 from cogs5e.models import errors
 
@@ -22,8 +27,67 @@ VALID_OPERATORS = 'k|rr|ro|mi|ma|ra|e|p'
 VALID_OPERATORS_ARRAY = VALID_OPERATORS.split('|')
 VALID_OPERATORS_2 = re.compile('|'.join(["({})".format(i) for i in VALID_OPERATORS_ARRAY]))
 DICE_PATTERN = re.compile(
-    r'^\s*(?:(?:(\d*d\d+)(?:(?:' + VALID_OPERATORS + r')(?:[lh<>]?\d+))*|(\d+)|([-+*/().=])?)\s*(\[.*\])?)(.*?)\s*$',
+    r'^\s*(?:(?:(\d*d\d+)(?:(?:' + VALID_OPERATORS + r')(?:[lh<>]?\d+))*|(\d+(?:\.\d*)?|\.\d+)|([-+*/().=])?)\s*'
+    r'(\[.*\])?)(.*?)\s*$',
     IGNORECASE)
+PARSE_CACHE_SIZE = 1024
+
+DiceSpec = namedtuple('DiceSpec', 'num_dice max_value operators annotation')
+ConstantSpec = namedtuple('ConstantSpec', 'value annotation')
+OperatorSpec = namedtuple('OperatorSpec', 'op annotation')
+CommentSpec = namedtuple('CommentSpec', 'comment')
+
+
+class DiceRNG:
+    """Serves die rolls from blocks of uniform integers generated ahead of time, one block per die size.
+    Seeding it gives a reproducible sequence of rolls."""
+    BLOCK_SIZE = 1024
+    MAX_BUFFERS = 64  # the most die sizes to hold blocks for at once
+    MAX_BLOCK_VALUE = 2 ** 62  # larger dice are rolled one at a time
+
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        self.state = numpy.random.RandomState(seed)
+        self.fallback = random.Random(seed)
+        self.buffers = {}  # dict of die size -> list of ints
+
+    def randint(self, max_value):
+        """Returns a random int from 1 to max_value inclusive."""
+        try:
+            return self.buffers[max_value].pop()
+        except (KeyError, IndexError):
+            if max_value > self.MAX_BLOCK_VALUE:
+                return self.fallback.randint(1, max_value)
+            if max_value not in self.buffers and len(self.buffers) >= self.MAX_BUFFERS:
+                self.buffers.clear()
+            self.buffers[max_value] = self.randints(max_value, self.BLOCK_SIZE).tolist()
+            return self.buffers[max_value].pop()
+
+    def randints(self, max_value, size):
+        """Returns an array of the given shape of random ints from 1 to max_value inclusive."""
+        return self.state.randint(1, max_value + 1, size, dtype=numpy.int64)
+
+
+_rng = DiceRNG()
+
+
+def get_rng():
+    """Returns the DiceRNG that all dice are rolled with."""
+    return _rng
+
+
+def set_rng(rng):
+    """Replaces the source of die rolls. rng must provide randint(max_value) and randints(max_value, size), as
+    DiceRNG does."""
+    global _rng
+    _rng = rng
+
+
+def seed_rng(seed=None):
+    """Reseeds the source of die rolls, for reproducible rolls in tests and benchmarks."""
+    _rng.seed(seed)
 
 
 def list_get(index, default, l):
@@ -34,12 +98,48 @@ def list_get(index, default, l):
     return a
 
 
-def roll(rollStr, adv: int = 0, rollFor='', inline=False, double=False, show_blurbs=True, **kwargs):
+def roll(rollStr, adv: int = 0, rollFor='', inline=False, double=False, show_blurbs=True, total_only=False, **kwargs):
     roller = Roll()
-    result = roller.roll(rollStr, adv, rollFor, inline, double, show_blurbs, **kwargs)
+    result = roller.roll(rollStr, adv, rollFor, inline, double, show_blurbs, total_only, **kwargs)
     return result
 
 
+def roll_many(rollStr, iterations: int, adv: int = 0, rollFor='', inline=False, show_blurbs=True):
+    """Rolls a roll string many times, parsing it only once.
+    Dice groups whose operators can be applied as array operations (k, p, mi, ma) are drawn for every iteration
+    at once; groups that need sequential semantics (rr, ro, ra, e) are rolled one iteration at a time.
+    :returns list - a list of DiceResults, one per iteration."""
+    try:
+        program = compile_roll(rollStr, adv)
+    except Exception as ex:
+        return [invalid_result(rollStr, ex) for _ in range(iterations)]
+
+    columns = []
+    try:
+        for spec in program:
+            if isinstance(spec, DiceSpec):
+                if get_batch_operators(spec.operators) is not None:
+                    columns.append(roll_batch(spec, iterations))
+                else:
+                    columns.append([Roll().roll_dice(spec) for _ in range(iterations)])
+            elif isinstance(spec, ConstantSpec):
+                columns.append([Constant(value=spec.value, annotation=spec.annotation) for _ in range(iterations)])
+            elif isinstance(spec, OperatorSpec):
+                columns.append([Operator(op=spec.op, annotation=spec.annotation) for _ in range(iterations)])
+            else:
+                columns.append([Comment(spec.comment) for _ in range(iterations)])
+    except Exception as ex:
+        return [invalid_result(rollStr, ex) for _ in range(iterations)]
+
+    results = []
+    for parts in zip(*columns) if columns else ([] for _ in range(iterations)):
+        try:
+            results.append(Roll(list(parts)).get_result(adv, rollFor, inline, show_blurbs))
+        except Exception as ex:
+            results.append(invalid_result(rollStr, ex))
+    return results
+
+
 def get_roll_comment(rollStr):
     """Returns: A two-tuple (dice without comment, comment)"""
     try:
@@ -62,6 +162,166 @@ def get_roll_comment(rollStr):
     return rollStr, ''
 
 
+def compile_roll(rollStr, adv: int = 0):
+    """Parses a roll string into an immutable dice program, reusing the cached program if one exists.
+    :param rollStr: The roll string to parse.
+    :param adv: 1 for advantage, -1 for disadvantage, 0 otherwise.
+    :returns tuple - a tuple of DiceSpec, ConstantSpec, OperatorSpec, and CommentSpec."""
+    return _compile_roll(rollStr.strip(), int(adv))
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _compile_roll(rollStr, adv):
+    if '**' in rollStr:
+        raise errors.InvalidArgument("Exponents are currently disabled.")
+    program = []
+    # split roll string into XdYoptsSel [comment] or Op
+    # set remainder to comment
+    dice_set = re.split('([-+*/().=])', rollStr)
+    dice_set = _join_decimals([d for d in dice_set if not d in (None, '')])
+    log.debug("Found dice set: " + str(dice_set))
+    for index, dice in enumerate(dice_set):
+        match = DICE_PATTERN.match(dice)
+        log.debug("Found dice group: " + str(match.groups()))
+        # check if it's dice
+        if match.group(1):
+            program.append(parse_dice(dice.replace(match.group(5), ''), adv))
+        # or a constant
+        elif match.group(2):
+            value = Fraction(match.group(2)) if '.' in match.group(2) else int(match.group(2))
+            program.append(ConstantSpec(value, match.group(4) or ''))
+        # or an operator
+        elif not match.group(5):
+            program.append(OperatorSpec(match.group(3) or '', match.group(4) or ''))
+
+        if match.group(5):
+            program.append(CommentSpec(match.group(5) + ''.join(dice_set[index + 1:])))
+            break
+    return tuple(program)
+
+
+def _join_decimals(dice_set):
+    """Joins the pieces a decimal constant is split into, like '1', '.', '5', back into one piece."""
+    joined = []
+    for piece in dice_set:
+        if joined and piece == '.' and re.match(r'^\s*\d*$', joined[-1]):
+            joined[-1] += piece
+        elif joined and re.match(r'^\s*\d*\.$', joined[-1]) and piece[:1].isdigit():
+            joined[-1] += piece
+        else:
+            joined.append(piece)
+    return joined
+
+
+def parse_dice(dice, adv: int = 0):
+    """Parses a single XdYoptsSel [annotation] group.
+    :returns DiceSpec"""
+    # splits dice and comments
+    split = re.match(r'^([^\[\]]*?)\s*(\[.*\])?\s*$', dice)
+    dice = split.group(1).strip()
+    annotation = split.group(2)
+    # Recognizes dice
+    obj = re.findall(r'\d+', dice)
+    obj = [int(x) for x in obj]
+    numArgs = len(obj)
+
+    ops = []
+    if numArgs == 1:
+        if not dice.startswith('d'):
+            raise errors.InvalidArgument('Please pass in the value of the dice.')
+        numDice = 1
+        diceVal = obj[0]
+        if adv != 0 and diceVal == 20:
+            numDice = 2
+            ops = ['k', 'h1'] if adv == 1 else ['k', 'l1']
+    elif numArgs == 2:
+        numDice = obj[0]
+        diceVal = obj[-1]
+        if adv != 0 and diceVal == 20:
+            ops = ['k', 'h' + str(numDice)] if adv == 1 else ['k', 'l' + str(numDice)]
+            numDice = numDice * 2
+    else:  # split into xdy and operators
+        numDice = obj[0]
+        diceVal = obj[1]
+        dice = re.split(r'(\d+d\d+)', dice)[-1]
+        ops = VALID_OPERATORS_2.split(dice)
+        ops = [a for a in ops if a is not None]
+
+    # dice repair/modification
+    if numDice > 300 or diceVal < 1:
+        raise errors.InvalidArgument('Too many dice rolled.')
+
+    return DiceSpec(numDice, diceVal, tuple(ops), annotation if annotation is not None else '')
+
+
+def _divide(left, right):
+    if isinstance(right, (int, Fraction)) and right == 0:
+        raise errors.InvalidArgument("division by zero")
+    if isinstance(left, int) and isinstance(right, int):
+        return Fraction(left, right)
+    return left / right
+
+
+BINARY_OPERATORS = {'+': operator.add, '-': operator.sub, '*': operator.mul, '/': _divide}
+UNARY_OPERATORS = {'+': operator.pos, '-': operator.neg}
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2}
+
+
+def evaluate(tokens):
+    """Evaluates a sequence of values and operator strings, respecting precedence and parentheses.
+    Division is exact - it is up to the caller to floor the result.
+    :param tokens: An iterable of values (ints, or anything that supports arithmetic) and operators.
+    :returns The value of the expression.
+    :raises SyntaxError if the expression is malformed."""
+    tokens = [t for t in tokens if not (isinstance(t, str) and not t)]
+    value, index = _evaluate_expression(tokens, 0, 1)
+    if index != len(tokens):
+        raise SyntaxError("Unexpected token in roll.")
+    return value
+
+
+def _evaluate_expression(tokens, index, min_precedence):
+    left, index = _evaluate_operand(tokens, index)
+    while index < len(tokens) and isinstance(tokens[index], str):
+        op = tokens[index]
+        if PRECEDENCE.get(op, 0) < min_precedence:
+            break
+        right, index = _evaluate_expression(tokens, index + 1, PRECEDENCE[op] + 1)
+        left = BINARY_OPERATORS[op](left, right)
+    return left, index
+
+
+def _evaluate_operand(tokens, index):
+    if index >= len(tokens):
+        raise SyntaxError("Unexpected end of roll.")
+    token = tokens[index]
+    if not isinstance(token, str):
+        return token, index + 1
+    if token in UNARY_OPERATORS:
+        value, index = _evaluate_operand(tokens, index + 1)
+        return UNARY_OPERATORS[token](value), index
+    if token == '(':
+        value, index = _evaluate_expression(tokens, index + 1, 1)
+        if index >= len(tokens) or tokens[index] != ')':
+            raise SyntaxError("Unclosed parenthesis in roll.")
+        return value, index + 1
+    raise SyntaxError("Unexpected token in roll.")
+
+
+def parse_cache_info():
+    """Returns the hit/miss statistics of the compiled dice program cache.
+    :returns CacheInfo - a (hits, misses, maxsize, currsize) namedtuple."""
+    return _compile_roll.cache_info()
+
+
+def invalid_result(rollStr, ex):
+    """Returns the DiceResult for a roll that raised an exception."""
+    if not isinstance(ex, (SyntaxError, KeyError, errors.AvraeException)):
+        log.error('Error in roll() caused by roll {}:'.format(rollStr))
+        traceback.print_exc()
+    return DiceResult(verbose_result="Invalid input: {}".format(ex))
+
+
 class Roll(object):
     def __init__(self, parts=None):
         if parts is None:
@@ -77,149 +337,101 @@ class Roll(object):
         return crit
 
     def get_total(self):
-        """Returns: int"""
-        return numexpr.evaluate(''.join(p.get_eval() for p in self.parts if not isinstance(p, Comment)))
+        """Returns: int, or Fraction if the roll divides"""
+        return evaluate(p.get_value() for p in self.parts if not isinstance(p, Comment))
 
     # # Dice Roller
-    def roll(self, rollStr, adv: int = 0, rollFor='', inline=False, double=False, show_blurbs=True, **kwargs):
+    def roll(self, rollStr, adv: int = 0, rollFor='', inline=False, double=False, show_blurbs=True, total_only=False,
+             **kwargs):
         try:
-            if '**' in rollStr:
-                raise errors.InvalidArgument("Exponents are currently disabled.")
             self.parts = []
-            # split roll string into XdYoptsSel [comment] or Op
-            # set remainder to comment
-            # parse each, returning a SingleDiceResult
-            dice_set = re.split('([-+*/().=])', rollStr)
-            dice_set = [d for d in dice_set if not d in (None, '')]
-            log.debug("Found dice set: " + str(dice_set))
-            for index, dice in enumerate(dice_set):
-                match = DICE_PATTERN.match(dice)
-                log.debug("Found dice group: " + str(match.groups()))
-                # check if it's dice
-                if match.group(1):
-                    roll = self.roll_one(dice.replace(match.group(5), ''), adv)
-                    self.parts.append(roll)
-                # or a constant
-                elif match.group(2):
-                    self.parts.append(Constant(value=int(match.group(2)), annotation=match.group(4)))
-                # or an operator
-                elif not match.group(5):
-                    self.parts.append(Operator(op=match.group(3), annotation=match.group(4)))
-
-                if match.group(5):
-                    self.parts.append(Comment(match.group(5) + ''.join(dice_set[index + 1:])))
-                    break
-
-            # calculate total
-            crit = self.get_crit()
-            try:
-                total = self.get_total()
-            except SyntaxError:
-                raise errors.InvalidArgument("No dice found to roll.")
-            rolled = ' '.join(str(res) for res in self.parts if not isinstance(res, Comment))
-            if rollFor is '':
-                rollFor = ''.join(str(c) for c in self.parts if isinstance(c, Comment))
-            # return final solution
-            if not inline:
-                # Builds end result while showing rolls
-                reply = ' '.join(
-                    str(res) for res in self.parts if not isinstance(res, Comment)) + '\n**Total:** ' + str(
-                    floor(total))
-                skeletonReply = reply
-                rollFor = rollFor if rollFor is not '' else 'Result'
-                reply = '**{}:** '.format(rollFor) + reply
-                if show_blurbs:
-                    if adv == 1:
-                        reply += '\n**Rolled with Advantage**'
-                    elif adv == -1:
-                        reply += '\n**Rolled with Disadvantage**'
-                    if crit == 1:
-                        critStr = "\n_**Critical Hit!**_  "
-                        reply += critStr
-                    elif crit == 2:
-                        critStr = "\n_**Critical Fail!**_  "
-                        reply += critStr
-            else:
-                # Builds end result while showing rolls
-                reply = ' '.join(str(res) for res in self.parts if not isinstance(res, Comment)) + ' = `' + str(
-                    floor(total)) + '`'
-                skeletonReply = reply
-                rollFor = rollFor if rollFor is not '' else 'Result'
-                reply = '**{}:** '.format(rollFor) + reply
-                if show_blurbs:
-                    if adv == 1:
-                        reply += '\n**Rolled with Advantage**'
-                    elif adv == -1:
-                        reply += '\n**Rolled with Disadvantage**'
-                    if crit == 1:
-                        critStr = "\n_**Critical Hit!**_  "
-                        reply += critStr
-                    elif crit == 2:
-                        critStr = "\n_**Critical Fail!**_  "
-                        reply += critStr
-            reply = re.sub(' +', ' ', reply)
-            skeletonReply = re.sub(' +', ' ', str(skeletonReply))
-            return DiceResult(result=int(floor(total)), verbose_result=reply, crit=crit, rolled=rolled,
-                              skeleton=skeletonReply, raw_dice=self)
+            for spec in compile_roll(rollStr, adv):
+                if isinstance(spec, DiceSpec):
+                    self.parts.append(self.roll_dice(spec))
+                elif isinstance(spec, ConstantSpec):
+                    self.parts.append(Constant(value=spec.value, annotation=spec.annotation))
+                elif isinstance(spec, OperatorSpec):
+                    self.parts.append(Operator(op=spec.op, annotation=spec.annotation))
+                else:
+                    self.parts.append(Comment(spec.comment))
+
+            return self.get_result(adv, rollFor, inline, show_blurbs, total_only)
         except Exception as ex:
-            if not isinstance(ex, (SyntaxError, KeyError, errors.AvraeException)):
-                log.error('Error in roll() caused by roll {}:'.format(rollStr))
-                traceback.print_exc()
-            return DiceResult(verbose_result="Invalid input: {}".format(ex))
+            return invalid_result(rollStr, ex)
+
+    def get_result(self, adv: int = 0, rollFor='', inline=False, show_blurbs=True, total_only=False):
+        """Totals the rolled parts. The result's text is rendered when it is first used, or never if total_only.
+        :returns DiceResult"""
+        # calculate total
+        crit = self.get_crit()
+        try:
+            total = self.get_total()
+        except SyntaxError:
+            raise errors.InvalidArgument("No dice found to roll.")
+        if total_only:
+            return DiceResult(result=int(floor(total)), crit=crit, raw_dice=self)
+        return DiceResult(result=int(floor(total)), crit=crit, raw_dice=self,
+                          render=lambda: self.render(total, crit, adv, rollFor, inline, show_blurbs))
+
+    def render(self, total, crit, adv: int = 0, rollFor='', inline=False, show_blurbs=True):
+        """Renders the rolled parts.
+        :returns tuple - (verbose result, skeleton, rolled)"""
+        rolled = ' '.join(str(res) for res in self.parts if not isinstance(res, Comment))
+        if rollFor == '':
+            rollFor = ''.join(str(c) for c in self.parts if isinstance(c, Comment))
+        # return final solution
+        if not inline:
+            # Builds end result while showing rolls
+            reply = rolled + '\n**Total:** ' + str(floor(total))
+            skeletonReply = reply
+            rollFor = rollFor if rollFor != '' else 'Result'
+            reply = '**{}:** '.format(rollFor) + reply
+            if show_blurbs:
+                if adv == 1:
+                    reply += '\n**Rolled with Advantage**'
+                elif adv == -1:
+                    reply += '\n**Rolled with Disadvantage**'
+                if crit == 1:
+                    critStr = "\n_**Critical Hit!**_  "
+                    reply += critStr
+                elif crit == 2:
+                    critStr = "\n_**Critical Fail!**_  "
+                    reply += critStr
+        else:
+            # Builds end result while showing rolls
+            reply = rolled + ' = `' + str(floor(total)) + '`'
+            skeletonReply = reply
+            rollFor = rollFor if rollFor != '' else 'Result'
+            reply = '**{}:** '.format(rollFor) + reply
+            if show_blurbs:
+                if adv == 1:
+                    reply += '\n**Rolled with Advantage**'
+                elif adv == -1:
+                    reply += '\n**Rolled with Disadvantage**'
+                if crit == 1:
+                    critStr = "\n_**Critical Hit!**_  "
+                    reply += critStr
+                elif crit == 2:
+                    critStr = "\n_**Critical Fail!**_  "
+                    reply += critStr
+        reply = re.sub(' +', ' ', reply)
+        skeletonReply = re.sub(' +', ' ', str(skeletonReply))
+        return reply, skeletonReply, rolled
 
     def roll_one(self, dice, adv: int = 0):
-        result = SingleDiceGroup()
-        result.rolled = []
-        # splits dice and comments
-        split = re.match(r'^([^\[\]]*?)\s*(\[.*\])?\s*$', dice)
-        dice = split.group(1).strip()
-        annotation = split.group(2)
-        result.annotation = annotation if annotation is not None else ''
-        # Recognizes dice
-        obj = re.findall('\d+', dice)
-        obj = [int(x) for x in obj]
-        numArgs = len(obj)
-
-        ops = []
-        if numArgs == 1:
-            if not dice.startswith('d'):
-                raise errors.InvalidArgument('Please pass in the value of the dice.')
-            numDice = 1
-            diceVal = obj[0]
-            if adv is not 0 and diceVal == 20:
-                numDice = 2
-                ops = ['k', 'h1'] if adv is 1 else ['k', 'l1']
-        elif numArgs == 2:
-            numDice = obj[0]
-            diceVal = obj[-1]
-            if adv is not 0 and diceVal == 20:
-                ops = ['k', 'h' + str(numDice)] if adv is 1 else ['k', 'l' + str(numDice)]
-                numDice = numDice * 2
-        else:  # split into xdy and operators
-            numDice = obj[0]
-            diceVal = obj[1]
-            dice = re.split('(\d+d\d+)', dice)[-1]
-            ops = VALID_OPERATORS_2.split(dice)
-            ops = [a for a in ops if a is not None]
-
-        # dice repair/modification
-        if numDice > 300 or diceVal < 1:
-            raise errors.InvalidArgument('Too many dice rolled.')
-
-        result.max_value = diceVal
-        result.num_dice = numDice
-        result.operators = ops
+        return self.roll_dice(parse_dice(dice, adv))
+
+    def roll_dice(self, spec):
+        """Rolls a single compiled dice group.
+        :param spec: The DiceSpec to roll.
+        :returns SingleDiceGroup"""
+        result = SingleDiceGroup(num_dice=spec.num_dice, max_value=spec.max_value, annotation=spec.annotation,
+                                 operators=list(spec.operators))
+        numDice = spec.num_dice
+        ops = result.operators
 
         for _ in range(numDice):
-            try:
-                tempdice = SingleDice()
-                tempdice.value = random.randint(1, diceVal)
-                tempdice.rolls = [tempdice.value]
-                tempdice.max_value = diceVal
-                tempdice.kept = True
-                result.rolled.append(tempdice)
-            except:
-                result.rolled.append(SingleDice())
+            result.roll_die()
 
         if ops is not None:
 
@@ -254,15 +466,15 @@ class Roll(object):
                 if op == 'ro':
                     reroll_once += parse_selectors([list_get(index + 1, 0, ops)], result)
                 if op == 'mi':
-                    _min = list_get(index + 1, 0, ops)
-                    for r in result.rolled:
-                        if r.value < int(_min):
-                            r.update(int(_min))
+                    _min = int(list_get(index + 1, 0, ops))
+                    for i, value in enumerate(result.values):
+                        if value < _min:
+                            result.update(i, _min)
                 if op == 'ma':
-                    _max = list_get(index + 1, 0, ops)
-                    for r in result.rolled:
-                        if r.value > int(_max):
-                            r.update(int(_max))
+                    _max = int(list_get(index + 1, 0, ops))
+                    for i, value in enumerate(result.values):
+                        if value > _max:
+                            result.update(i, _max)
                 if op == 'ra':
                     to_reroll_add += parse_selectors([list_get(index + 1, 0, ops)], result)
                 if op == 'e':
@@ -288,74 +500,102 @@ class SingleDiceGroup(Part):
                  operators=None):
         if operators is None:
             operators = []
-        if rolled is None:
-            rolled = []
         self.num_dice = num_dice
         self.max_value = max_value
-        self.rolled = rolled  # list of SingleDice
+        # dice are stored column-wise: die i shows values[i], and history[i] holds every value it has shown if it
+        # has been changed since it was rolled
+        self.values = []  # list of ints
+        self.kept = []  # list of bools
+        self.exploded = []  # list of bools
+        self.history = {}  # dict of int -> list of ints
         self.annotation = annotation
         self.result = result
         self.operators = operators
+        for die in rolled or ():
+            self.add_die(die.value, die.kept, die.exploded)
+            if len(die.rolls) > 1:
+                self.history[len(self.values) - 1] = list(die.rolls)
+
+    @property
+    def rolled(self):
+        """Returns:
+        list - a SingleDice view of each die in the group."""
+        return [DiceView(self, i) for i in range(len(self.values))]
+
+    def add_die(self, value, kept=True, exploded=False):
+        self.values.append(value)
+        self.kept.append(kept)
+        self.exploded.append(exploded)
+
+    def roll_die(self):
+        try:
+            value = _rng.randint(self.max_value)
+        except ValueError:
+            value = 0
+        self.add_die(value)
+
+    def update(self, index, new_value):
+        self.history.setdefault(index, [self.values[index]]).append(new_value)
+        self.values[index] = new_value
+
+    def rolls(self, index):
+        """Returns:
+        list - every value the die at index has shown (for X -> Y -> Z)."""
+        return self.history.get(index) or [self.values[index]]
 
     def keep(self, rolls_to_keep):
         if rolls_to_keep is None: return
-        for _roll in self.rolled:
-            if not _roll.value in rolls_to_keep:
-                _roll.kept = False
-            elif _roll.kept:
-                rolls_to_keep.remove(_roll.value)
+        for i, value in enumerate(self.values):
+            if value not in rolls_to_keep:
+                self.kept[i] = False
+            elif self.kept[i]:
+                rolls_to_keep.remove(value)
 
     def reroll(self, rerollList, max_iterations=1000, greedy=False, keep_rerolled=False, unique=False):
+        """Rerolls (or, if keep_rerolled, explodes) kept dice whose values are in rerollList, then the dice that adds.
+        Dice are checked in passes - the original dice, then the dice the first pass added, and so on - and no new
+        pass starts once more than max_iterations dice have been checked. Unless greedy, each entry in rerollList
+        is used up by the first die it matches."""
         if not rerollList: return  # don't reroll nothing - minor optimization
         if unique:
             rerollList = list(set(rerollList))  # remove duplicates
         if len(rerollList) > 100:
             raise OverflowError("Too many dice to reroll (max 100)")
-        last_index = 0
-        count = 0
-        should_continue = True
-        while should_continue:  # let's only iterate 250 times for sanity
-            should_continue = False
-            if any(d.value in set(rerollList) for d in self.rolled[last_index:] if d.kept and not d.exploded):
-                should_continue = True
-            to_extend = []
-            for r in self.rolled[last_index:]:  # no need to recheck everything
-                count += 1
-                if count > max_iterations:
-                    should_continue = False
-                if r.value in rerollList and r.kept and not r.exploded:
-                    try:
-                        tempdice = SingleDice()
-                        tempdice.value = random.randint(1, self.max_value)
-                        tempdice.rolls = [tempdice.value]
-                        tempdice.max_value = self.max_value
-                        tempdice.kept = True
-                        to_extend.append(tempdice)
-                        if not keep_rerolled:
-                            r.drop()
-                        else:
-                            r.explode()
-                    except:
-                        to_extend.append(SingleDice())
-                        if not keep_rerolled:
-                            r.drop()
-                        else:
-                            r.explode()
-                    if not greedy:
-                        rerollList.remove(r.value)
-            last_index = len(self.rolled)
-            self.rolled.extend(to_extend)
+        reroll_set = frozenset(rerollList)
+        remaining = None if greedy else Counter(rerollList)  # entries left to use up
+        values, kept, exploded = self.values, self.kept, self.exploded
+        start = 0
+        while True:
+            end = len(values)
+            for index in range(start, end):
+                if not kept[index] or exploded[index] or values[index] not in reroll_set:
+                    continue
+                if remaining is not None:
+                    if not remaining[values[index]]:
+                        continue
+                    remaining[values[index]] -= 1
+                if keep_rerolled:
+                    exploded[index] = True
+                else:
+                    kept[index] = False
+                self.roll_die()
+            if end == len(values) or end > max_iterations:
+                break
+            start = end
 
     def get_total(self):
         """Returns:
         int - The total value of the dice."""
-        return sum(r.value for r in self.rolled if r.kept)
+        return sum(value for value, kept in zip(self.values, self.kept) if kept)
 
     def get_eval(self):
         return str(self.get_total())
 
+    def get_value(self):
+        return self.get_total()
+
     def get_num_kept(self):
-        return sum(1 for r in self.rolled if r.kept)
+        return sum(self.kept)
 
     def get_crit(self):
         """Returns:
@@ -369,7 +609,9 @@ class SingleDiceGroup(Part):
 
     def __str__(self):
         return "{0.num_dice}d{0.max_value}{1} ({2}) {0.annotation}".format(
-            self, ''.join(self.operators), ', '.join(str(r) for r in self.rolled))
+            self, ''.join(self.operators), ', '.join(
+                format_die(self.rolls(i), self.max_value, self.kept[i], self.exploded[i])
+                for i in range(len(self.values))))
 
     def to_dict(self):
         return {'type': 'dice', 'dice': [d.to_dict() for d in self.rolled], 'annotation': self.annotation,
@@ -377,6 +619,91 @@ class SingleDiceGroup(Part):
                 'text': str(self), 'num_dice': self.num_dice, 'dice_size': self.max_value, 'operators': self.operators}
 
 
+BATCH_OPERATORS = ('k', 'p', 'mi', 'ma')
+BATCH_SELECTOR = re.compile(r'^[hl<>]?\d+$')
+
+
+def get_batch_operators(ops):
+    """Returns a list of (operator, selector) pairs if a dice group's operators can be applied to many rolls at
+    once, or None if the group needs to be rolled sequentially."""
+    pairs = []
+    for index, op in enumerate(ops):
+        if op not in VALID_OPERATORS_ARRAY:
+            continue
+        selector = list_get(index + 1, '', ops)
+        if op not in BATCH_OPERATORS or not BATCH_SELECTOR.match(selector):
+            return None
+        if pairs and op in ('k', 'p') and pairs[-1][0] == op:  # repeated keeps share one selector pool
+            return None
+        pairs.append((op, selector))
+    return pairs
+
+
+def roll_batch(spec, iterations):
+    """Rolls a dice group many times as one array.
+    The group's operators must be supported by get_batch_operators(). Groups with numbers too large for an int64
+    array are rolled one iteration at a time.
+    :returns list - a list of SingleDiceGroups, one per iteration."""
+    selectors = [selector.lstrip('hl<>') for _, selector in get_batch_operators(spec.operators)]
+    if max([spec.max_value] + [int(s) for s in selectors]) > DiceRNG.MAX_BLOCK_VALUE:
+        return [Roll().roll_dice(spec) for _ in range(iterations)]
+
+    size = (iterations, spec.num_dice)
+    values = _rng.randints(spec.max_value, size)
+    kept = numpy.ones(size, dtype=bool)
+    history = [values]
+
+    for op, selector in get_batch_operators(spec.operators):
+        if op in ('mi', 'ma'):
+            bound = int(selector)
+            values = numpy.maximum(values, bound) if op == 'mi' else numpy.minimum(values, bound)
+            history.append(values)
+        else:
+            kept = _batch_keep(values, kept, selector, inverse=op == 'p')
+
+    out = []
+    value_rows = [h.tolist() for h in history]
+    for i, kept_row in enumerate(kept.tolist()):
+        group = SingleDiceGroup(num_dice=spec.num_dice, max_value=spec.max_value, annotation=spec.annotation,
+                                operators=list(spec.operators))
+        group.values = value_rows[-1][i]
+        group.kept = kept_row
+        group.exploded = [False] * spec.num_dice
+        for j in range(spec.num_dice if len(value_rows) > 1 else 0):
+            rolls = [value_rows[0][i][j]]
+            for h in value_rows[1:]:
+                if h[i][j] != rolls[-1]:
+                    rolls.append(h[i][j])
+            if len(rolls) > 1:
+                group.history[j] = rolls
+        out.append(group)
+    return out
+
+
+def _batch_keep(values, kept, selector, inverse=False):
+    """Applies a k (or p, if inverse) selector to a 2D array of rolls.
+    Matches SingleDiceGroup.keep(): ties between equal values are resolved in favour of the earlier die."""
+    if selector[0] in 'hl':
+        num = int(selector[1:])
+        highest = selector[0] == 'h'
+        if inverse:  # dropping the highest N is keeping the lowest (kept - N)
+            num = kept.sum(axis=1, keepdims=True) - num
+            highest = not highest
+        sort_key = numpy.where(kept, -values if highest else values, numpy.iinfo(values.dtype).max)
+        order = numpy.argsort(sort_key, axis=1, kind='stable')
+        rank = numpy.empty_like(order)
+        numpy.put_along_axis(rank, order, numpy.arange(values.shape[1])[None, :], axis=1)
+        return kept & (rank < num)
+
+    if selector[0] == '>':
+        mask = values > int(selector[1:])
+    elif selector[0] == '<':
+        mask = values < int(selector[1:])
+    else:
+        mask = values == int(selector)
+    return kept & (~mask if inverse else mask)
+
+
 class SingleDice:
     def __init__(self, value: int = 0, max_value: int = 0, kept: bool = True, exploded: bool = False):
         self.value = value
@@ -396,15 +723,7 @@ class SingleDice:
         self.rolls.append(new_value)
 
     def __str__(self):
-        formatted_rolls = [str(r) for r in self.rolls]
-        if int(formatted_rolls[-1]) == self.max_value or int(formatted_rolls[-1]) == 1:
-            formatted_rolls[-1] = '**' + formatted_rolls[-1] + '**'
-        if self.exploded:
-            formatted_rolls[-1] = '__' + formatted_rolls[-1] + '__'
-        if self.kept:
-            return ' -> '.join(formatted_rolls)
-        else:
-            return '~~' + ' -> '.join(formatted_rolls) + '~~'
+        return format_die(self.rolls, self.max_value, self.kept, self.exploded)
 
     def __repr__(self):
         return "<SingleDice object: value={0.value}, max_value={0.max_value}, kept={0.kept}, rolls={0.rolls}>".format(
@@ -415,19 +734,80 @@ class SingleDice:
                 'rolls': self.rolls, 'exploded': self.exploded}
 
 
+class DiceView(SingleDice):
+    """A SingleDice that reads and writes one die of a SingleDiceGroup."""
+
+    def __init__(self, group, index):
+        self.group = group
+        self.index = index
+
+    @property
+    def value(self):
+        return self.group.values[self.index]
+
+    @value.setter
+    def value(self, value):
+        self.group.values[self.index] = value
+
+    @property
+    def kept(self):
+        return self.group.kept[self.index]
+
+    @kept.setter
+    def kept(self, value):
+        self.group.kept[self.index] = value
+
+    @property
+    def exploded(self):
+        return self.group.exploded[self.index]
+
+    @exploded.setter
+    def exploded(self, value):
+        self.group.exploded[self.index] = value
+
+    @property
+    def max_value(self):
+        return self.group.max_value
+
+    @property
+    def rolls(self):
+        return self.group.rolls(self.index)
+
+    def update(self, new_value):
+        self.group.update(self.index, new_value)
+
+
+def format_die(rolls, max_value, kept, exploded):
+    formatted_rolls = [str(r) for r in rolls]
+    if int(formatted_rolls[-1]) == max_value or int(formatted_rolls[-1]) == 1:
+        formatted_rolls[-1] = '**' + formatted_rolls[-1] + '**'
+    if exploded:
+        formatted_rolls[-1] = '__' + formatted_rolls[-1] + '__'
+    if kept:
+        return ' -> '.join(formatted_rolls)
+    else:
+        return '~~' + ' -> '.join(formatted_rolls) + '~~'
+
+
 class Constant(Part):
     def __init__(self, value: int = 0, annotation: str = ""):
         self.value = value
         self.annotation = annotation if annotation is not None else ''
 
     def __str__(self):
-        return "{0.value} {0.annotation}".format(self)
+        return "{0} {1.annotation}".format(self.get_eval(), self)
 
     def get_eval(self):
+        if isinstance(self.value, Fraction):  # a decimal constant, written back as a decimal
+            return str(Decimal(self.value.numerator) / Decimal(self.value.denominator))
         return str(self.value)
 
+    def get_value(self):
+        return self.value
+
     def to_dict(self):
-        return {'type': 'constant', 'value': self.value, 'annotation': self.annotation}
+        value = float(self.value) if isinstance(self.value, Fraction) else self.value
+        return {'type': 'constant', 'value': value, 'annotation': self.annotation}
 
 
 class Operator(Part):
@@ -441,6 +821,9 @@ class Operator(Part):
     def get_eval(self):
         return self.op
 
+    def get_value(self):
+        return self.op
+
     def to_dict(self):
         return {'type': 'operator', 'value': self.op, 'annotation': self.annotation}
 
@@ -459,26 +842,26 @@ class Comment(Part):
 def parse_selectors(opts, res, greedy=False, inverse=False):
     """Returns a list of ints."""
     for o in range(len(opts)):
-        if opts[o][0] is 'h':
-            opts[o] = nlargest(int(opts[o].split('h')[1]), (d.value for d in res.rolled if d.kept))
-        elif opts[o][0] is 'l':
-            opts[o] = nsmallest(int(opts[o].split('l')[1]), (d.value for d in res.rolled if d.kept))
-        elif opts[o][0] is '>':
+        if opts[o][0] == 'h':
+            opts[o] = nlargest(int(opts[o].split('h')[1]), (v for v, k in zip(res.values, res.kept) if k))
+        elif opts[o][0] == 'l':
+            opts[o] = nsmallest(int(opts[o].split('l')[1]), (v for v, k in zip(res.values, res.kept) if k))
+        elif opts[o][0] == '>':
             if greedy:
                 opts[o] = list(range(int(opts[o].split('>')[1]) + 1, res.max_value + 1))
             else:
-                opts[o] = [d.value for d in res.rolled if d.value > int(opts[o].split('>')[1])]
-        elif opts[o][0] is '<':
+                opts[o] = [v for v in res.values if v > int(opts[o].split('>')[1])]
+        elif opts[o][0] == '<':
             if greedy:
                 opts[o] = list(range(1, int(opts[o].split('<')[1])))
             else:
-                opts[o] = [d.value for d in res.rolled if d.value < int(opts[o].split('<')[1])]
+                opts[o] = [v for v in res.values if v < int(opts[o].split('<')[1])]
     out = []
     for o in opts:
         if isinstance(o, list):
             out.extend(int(l) for l in o)
         elif not greedy:
-            out.extend(int(o) for a in res.rolled if a.value is int(o) and a.kept)
+            out.extend(int(o) for v, k in zip(res.values, res.kept) if v == int(o) and k)
         else:
             out.append(int(o))
 
@@ -486,11 +869,11 @@ def parse_selectors(opts, res, greedy=False, inverse=False):
         return out
 
     inverse_out = []
-    for rolled in res.rolled:
-        if rolled.kept and rolled.value in out:
-            out.remove(rolled.value)
-        elif rolled.kept:
-            inverse_out.append(rolled.value)
+    for value, kept in zip(res.values, res.kept):
+        if kept and value in out:
+            out.remove(value)
+        elif kept:
+            inverse_out.append(value)
     return inverse_out
 
 
@@ -498,14 +881,50 @@ class DiceResult:
     """Class to hold the output of a dice roll."""
 
     def __init__(self, result: int = 0, verbose_result: str = '', crit: int = 0, rolled: str = '', skeleton: str = '',
-                 raw_dice: Roll = None):
+                 raw_dice: Roll = None, render=None):
         self.plain = result
         self.total = result
-        self.result = verbose_result
         self.crit = crit
-        self.rolled = rolled
-        self.skeleton = skeleton if skeleton is not '' else verbose_result
         self.raw_dice = raw_dice  # Roll
+        self._result = verbose_result
+        self._rolled = rolled
+        self._skeleton = skeleton if skeleton != '' else verbose_result
+        self._render = render  # callable returning (verbose_result, skeleton, rolled), called on first use
+
+    def _rendered(self):
+        if self._render is not None:
+            self._result, self._skeleton, self._rolled = self._render()
+            self._render = None
+
+    @property
+    def result(self):
+        self._rendered()
+        return self._result
+
+    @result.setter
+    def result(self, value):
+        self._rendered()
+        self._result = value
+
+    @property
+    def rolled(self):
+        self._rendered()
+        return self._rolled
+
+    @rolled.setter
+    def rolled(self, value):
+        self._rendered()
+        self._rolled = value
+
+    @property
+    def skeleton(self):
+        self._rendered()
+        return self._skeleton
+
+    @skeleton.setter
+    def skeleton(self, value):
+        self._rendered()
+        self._skeleton = value
 
     def __str__(self):
         return self.result
@@ -517,35 +936,43 @@ class DiceResult:
         """Gets the most simplified version of the roll string."""
         if self.raw_dice is None:
             return "0"
-        parts = []  # list of (part, annotation)
-        last_part = ""
+        parts = []  # list of (values, annotation)
+        last_part = []
         for p in self.raw_dice.parts:
-            if isinstance(p, SingleDiceGroup):
-                last_part += str(p.get_total())
-            else:
-                last_part += str(p)
-            if not isinstance(p, Comment) and p.annotation:
+            if isinstance(p, Comment):
+                continue
+            last_part.append(p.get_value())
+            if p.annotation:
                 parts.append((last_part, p.annotation))
-                last_part = ""
+                last_part = []
         if last_part:
             parts.append((last_part, ""))
 
-        to_roll = ""
+        to_total = []
         last_annotation = ""
         out = ""
-        for numbers, annotation in parts:
-            if annotation and annotation != last_annotation and to_roll:
-                out += f"{roll(to_roll).total:+} {last_annotation}"
-                to_roll = ""
+        for values, annotation in parts:
+            if annotation and annotation != last_annotation and to_total:
+                out += f"{_consolidated_total(to_total):+} {last_annotation}"
+                to_total = []
             if annotation:
                 last_annotation = annotation
-            to_roll += numbers
-        if to_roll:
-            out += f"{roll(to_roll).total:+} {last_annotation}"
+            to_total += values
+        if to_total:
+            out += f"{_consolidated_total(to_total):+} {last_annotation}"
         out = out.strip('+ ')
         return out
 
 
+def _consolidated_total(values):
+    """Totals one annotation group of a consolidated roll. A group that cannot be totalled on its own (such as one
+    starting with "*") counts as 0, like an invalid roll."""
+    try:
+        return int(floor(evaluate(values)))
+    except Exception:
+        return 0
+
+
 if __name__ == '__main__':
     while True:
         print(roll(input().strip()))
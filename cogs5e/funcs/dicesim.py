@@ -0,0 +1,383 @@
+"""
+Monte Carlo simulation of roll strings.
+Trials are rolled in vectorized chunks that mirror roll_dice(): every trial's dice are a row of parallel arrays, and
+operators are applied with the same selector pools, flush order and iteration limits as a live roll.
+"""
+import math
+import time
+
+import numpy
+
+from cogs5e.funcs.dice import BATCH_SELECTOR, ConstantSpec, DiceRNG, DiceSpec, OperatorSpec, Roll, compile_roll, \
+    evaluate, get_rng
+from cogs5e.funcs.dicestats import _operator_groups
+from cogs5e.models.errors import InvalidArgument
+
+DEFAULT_TRIALS = 100000
+MAX_TRIALS = 1000000
+MIN_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 25000
+SAMPLE_CHUNK_SIZE = 10  # the first chunk of a roll string with a group rolled one trial at a time
+TIME_LIMIT = 2  # seconds of simulation before returning whatever trials have finished
+MAX_ITERATIONS = 1000  # matches roll_dice()
+MAX_REROLL_LIST = 100  # matches roll_dice()
+MAX_TABLE_CELLS = 1000000  # the most entries in one array of per-trial value counts (8 MB)
+MIN_TABLE_ROWS = 100  # groups that fit fewer trials than this in a count table are rolled one trial at a time
+
+
+class Simulation:
+    """The outcome of simulating a roll string many times."""
+
+    def __init__(self, totals, invalid=0):
+        self.totals = numpy.sort(totals)
+        self.invalid = invalid  # trials that would have failed to roll
+
+    @property
+    def trials(self):
+        return len(self.totals)
+
+    @property
+    def min(self):
+        return int(self.totals[0])
+
+    @property
+    def max(self):
+        return int(self.totals[-1])
+
+    def mean(self):
+        return float(self.totals.mean())
+
+    def stdev(self):
+        return float(self.totals.std(ddof=1)) if self.trials > 1 else 0.
+
+    def confidence_interval(self, z=1.96):
+        """Returns the (low, high) bounds of the mean at the given z-score (95% by default)."""
+        margin = z * self.stdev() / math.sqrt(self.trials)
+        return self.mean() - margin, self.mean() + margin
+
+    def percentile(self, p):
+        """Returns the smallest value whose cumulative frequency is at least p (0-100)."""
+        index = max(math.ceil(self.trials * p / 100) - 1, 0)
+        return int(self.totals[min(index, self.trials - 1)])
+
+    def at_least(self, dc):
+        """Returns the fraction of trials with a value greater than or equal to dc."""
+        return (self.trials - numpy.searchsorted(self.totals, dc)) / self.trials
+
+    def at_least_interval(self, dc, z=1.96):
+        """Returns the Wilson score bounds of at_least(dc)."""
+        n = self.trials
+        p = self.at_least(dc)
+        center = (p + z ** 2 / (2 * n)) / (1 + z ** 2 / n)
+        margin = z * math.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / (1 + z ** 2 / n)
+        return max(center - margin, 0.), min(center + margin, 1.)
+
+    def histogram(self, bins=10):
+        """Returns a list of (low, high, fraction) buckets covering the simulated totals."""
+        width = max(math.ceil((self.max - self.min + 1) / bins), 1)
+        edges = numpy.arange(self.min, self.max + width + 1, width)
+        counts = numpy.histogram(self.totals, bins=edges)[0]
+        return [(int(edges[i]), int(edges[i + 1]) - 1, count / self.trials) for i, count in enumerate(counts)]
+
+    def __repr__(self):
+        return '<Simulation trials={} mean={:.2f} min={} max={}>'.format(self.trials, self.mean(), self.min, self.max)
+
+
+def simulate(rollStr, adv: int = 0, trials: int = DEFAULT_TRIALS, time_limit: float = TIME_LIMIT):
+    """Simulates a roll string's total.
+    Blocks until the trials finish or the time limit passes, so this should be run in an executor.
+    :param rollStr: The roll string.
+    :param adv: 1 for advantage, -1 for disadvantage, 0 otherwise.
+    :param trials: The number of trials to run (at most MAX_TRIALS).
+    :param time_limit: The number of seconds after which to stop rolling trials.
+    :returns Simulation"""
+    program = compile_roll(rollStr, adv)
+    trials = min(max(trials, 1), MAX_TRIALS)
+    deadline = time.monotonic() + time_limit
+    results = []
+    invalid = 0
+    done = 0
+    groups = [spec for spec in program if isinstance(spec, DiceSpec)]
+    for spec in groups:
+        _check_selectors(spec.operators)
+    # start small, so a slow roll string is caught by the time limit early
+    sampled = any(_sampled(spec) for spec in groups)
+    chunk = SAMPLE_CHUNK_SIZE if sampled else MIN_CHUNK_SIZE
+    while done < trials:
+        size = min(chunk, trials - done)
+        start = time.monotonic()
+        totals, failed = simulate_program(program, size, deadline)
+        results.append(totals[~failed])
+        invalid += int(failed.sum())
+        done += len(totals)
+        now = time.monotonic()
+        if now > deadline:
+            break
+        # grow the next chunk, but only as far as the time left fits at this chunk's cost per trial
+        fits = int((deadline - now) * len(totals) / (now - start)) if now > start else MAX_CHUNK_SIZE
+        chunk = max(min(chunk * 2, MAX_CHUNK_SIZE, fits), 1)
+    totals = numpy.concatenate(results)
+    if not len(totals):
+        raise InvalidArgument("This roll fails every time it is rolled.")
+    return Simulation(totals, invalid)
+
+
+def simulate_program(program, trials, deadline=None):
+    """Simulates a compiled dice program (see compile_roll()).
+    :param deadline: The time.monotonic() after which groups rolled one trial at a time stop, so that fewer trials
+                     may be returned.
+    :returns tuple - an array of totals and an array flagging trials that would have failed to roll."""
+    tokens = []
+    failed = numpy.zeros(trials, dtype=bool)
+    for spec in program:
+        if isinstance(spec, DiceSpec):
+            totals, group_failed = simulate_group(spec, trials, deadline)
+            trials = len(totals)
+            tokens.append(totals)
+            failed = failed[:trials] | group_failed
+        elif isinstance(spec, ConstantSpec):
+            tokens.append(spec.value)
+        elif isinstance(spec, OperatorSpec):
+            tokens.append(spec.op)
+    tokens = [token[:trials] if isinstance(token, numpy.ndarray) else token for token in tokens]
+    try:
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            total = evaluate(tokens)
+    except SyntaxError:
+        raise InvalidArgument("No dice found to roll.")
+    total = numpy.broadcast_to(numpy.asarray(total, dtype=float), (trials,))
+    if not numpy.isfinite(total).all():
+        raise InvalidArgument("division by zero")
+    return numpy.floor(total).astype(numpy.int64), failed
+
+
+def simulate_group(spec, trials, deadline=None):
+    """Rolls a dice group once per trial. Selector operators count dice by value in tables as wide as the largest
+    value, so a group with large values is rolled in as many trials at a time as keep the tables small, or one trial
+    at a time with the live roller.
+    :param deadline: The time.monotonic() after which to stop rolling one trial at a time.
+    :returns tuple - an array of the group's totals and an array flagging trials that would have failed to roll."""
+    _check_selectors(spec.operators)
+    if spec.num_dice and spec.max_value < 1:
+        raise InvalidArgument("This roll fails every time it is rolled.")
+    if _reroll_list_length(spec) > MAX_REROLL_LIST:  # checked before roll_dice() would build the list
+        raise InvalidArgument("This roll fails every time it is rolled.")
+    domain = _domain(spec)
+    if domain > DiceRNG.MAX_BLOCK_VALUE:
+        raise InvalidArgument("This roll's numbers are too large to simulate.")
+    if _sampled(spec):
+        return sample_group(spec, trials, deadline)
+    rows = MAX_TABLE_CELLS // (domain + 1) if _uses_tables(spec) else trials
+
+    totals, failed = [], []
+    for start in range(0, trials, rows):
+        group = DiceTrials(spec, min(rows, trials - start))
+        group.apply(spec.operators)
+        totals.append(group.total())
+        failed.append(group.failed)
+    return numpy.concatenate(totals), numpy.concatenate(failed)
+
+
+def sample_group(spec, trials, deadline=None):
+    """Rolls a dice group once per trial with roll_dice(), stopping between trials once the deadline passes.
+    :returns tuple - an array of the group's totals and an array flagging trials that failed to roll, for at least
+             one trial."""
+    totals = numpy.zeros(trials, dtype=numpy.int64)
+    failed = numpy.zeros(trials, dtype=bool)
+    for trial in range(trials):
+        try:
+            totals[trial] = Roll().roll_dice(spec).get_total()
+        except OverflowError:  # too many dice to reroll
+            failed[trial] = True
+        if deadline is not None and time.monotonic() > deadline:
+            return totals[:trial + 1], failed[:trial + 1]
+    return totals, failed
+
+
+def _uses_tables(spec):
+    return any(op not in ('mi', 'ma') for op, _ in _operator_groups(spec.operators))
+
+
+def _sampled(spec):
+    """Returns whether a dice group has too large values to roll in count tables."""
+    return _uses_tables(spec) and MAX_TABLE_CELLS // (_domain(spec) + 1) < MIN_TABLE_ROWS
+
+
+def _reroll_list_length(spec):
+    """Returns the most entries the range selectors of one reroll or explode operator list, which roll_dice() builds
+    in full."""
+    longest = 0
+    for op, selectors in _operator_groups(spec.operators):
+        if op not in ('rr', 'e'):
+            continue
+        length = 0
+        for selector in selectors:
+            if selector[0] == '<':
+                length += max(int(selector[1:]) - 1, 0)
+            elif selector[0] == '>':
+                length += max(spec.max_value - int(selector[1:]), 0)
+        longest = max(longest, length)
+    return longest
+
+
+def _check_selectors(operators):
+    for op, selectors in _operator_groups(operators):
+        for selector in selectors:
+            if not BATCH_SELECTOR.match(selector):
+                raise InvalidArgument(f"Invalid selector: `{selector}`")
+
+
+def _domain(spec):
+    """Returns the largest number a dice group's dice or selectors use."""
+    return max([spec.max_value] + [int(s.lstrip('hl<>')) for _, selectors in _operator_groups(spec.operators)
+                                   for s in selectors])
+
+
+class DiceTrials:
+    """One dice group rolled once per trial. Row i holds trial i's dice in roll order; rows are padded to the same
+    width with dice flagged invalid."""
+
+    def __init__(self, spec, trials):
+        if spec.num_dice and spec.max_value < 1:
+            raise InvalidArgument("This roll fails every time it is rolled.")
+        self.max_value = spec.max_value
+        self.domain = _domain(spec)
+        self.rows = numpy.arange(trials)
+        self.values = get_rng().randints(max(spec.max_value, 1), (trials, spec.num_dice))
+        self.valid = numpy.ones((trials, spec.num_dice), dtype=bool)
+        self.kept = self.valid.copy()
+        self.exploded = numpy.zeros((trials, spec.num_dice), dtype=bool)
+        self.width = spec.num_dice  # columns in use; the arrays grow ahead of it as dice are added
+        self.failed = numpy.zeros(trials, dtype=bool)
+
+    def total(self):
+        return numpy.where(self.kept, self.values, 0).sum(axis=1)
+
+    def apply(self, operators):
+        _check_selectors(operators)
+        for op, selectors in _operator_groups(operators):
+            if op in ('mi', 'ma'):
+                bound = int(selectors[0])
+                clamp = numpy.maximum if op == 'mi' else numpy.minimum
+                self.values = numpy.where(self.valid, clamp(self.values, bound), self.values)
+            elif op == 'k':
+                self.keep(self.selected(selectors)[0])
+            elif op == 'p':
+                self.keep(sum(self.inverse(self.selected([s])[0]) for s in selectors))
+            elif op == 'rr':
+                self.reroll(*self.selected(selectors, greedy=True), greedy=True)
+            elif op == 'ro':
+                self.reroll(*self.selected(selectors), max_iterations=1)
+            elif op == 'ra':
+                counts, _ = self.selected(selectors)
+                counts = numpy.minimum(counts, 1)
+                self.reroll(counts, counts.sum(axis=1), max_iterations=1, keep_rerolled=True)
+            elif op == 'e':
+                self.reroll(*self.selected(selectors, greedy=True), greedy=True, keep_rerolled=True)
+
+    # selectors
+    def count_values(self, mask):
+        """Returns an array of how many masked dice in each trial show each value."""
+        counts = numpy.zeros((len(self.rows), self.domain + 1), dtype=int)
+        for column in range(self.width):
+            counts[self.rows, self.values[:, column]] += mask[:, column]
+        return counts
+
+    def selected(self, selectors, greedy=False):
+        """Builds the selector pool parse_selectors() would, as per-trial value counts.
+        :returns tuple - (counts, the number of entries in each trial's pool)."""
+        counts = numpy.zeros((len(self.rows), self.domain + 1), dtype=int)
+        length = numpy.zeros(len(self.rows), dtype=int)
+        for selector in selectors:
+            kind = selector[0] if selector[0] in 'hl<>' else ''
+            num = int(selector[len(kind):])
+            if kind in ('h', 'l'):
+                kept_values = numpy.where(self.kept, self.values, -1 if kind == 'h' else self.domain + 1)
+                order = numpy.argsort(-kept_values if kind == 'h' else kept_values, axis=1, kind='stable')
+                ranks = numpy.empty_like(order)
+                numpy.put_along_axis(ranks, order, numpy.arange(order.shape[1])[None, :], axis=1)
+                mask = self.kept & (ranks < num)
+                counts += self.count_values(mask)
+                length += mask.sum(axis=1)
+            elif kind in ('<', '>'):
+                if greedy:
+                    low, high = (1, num - 1) if kind == '<' else (num + 1, self.max_value)
+                    counts[:, max(low, 0):min(high, self.domain) + 1] += 1
+                    length += max(high - low + 1, 0)
+                else:
+                    mask = self.valid & ((self.values < num) if kind == '<' else (self.values > num))
+                    counts += self.count_values(mask)
+                    length += mask.sum(axis=1)
+            elif greedy:
+                if num <= self.domain:
+                    counts[:, num] += 1
+                length += 1
+            else:
+                mask = self.kept & (self.values == num)
+                counts += self.count_values(mask)
+                length += mask.sum(axis=1)
+        return counts, length
+
+    def inverse(self, counts):
+        """Returns the pool of kept dice left over once a pool is removed from them, as with inverse selectors."""
+        counts = counts.copy()
+        inverse = numpy.zeros_like(counts)
+        for column in range(self.width):
+            value = self.values[:, column]
+            listed = counts[self.rows, value] > 0
+            kept = self.kept[:, column]
+            counts[self.rows, value] -= kept & listed
+            inverse[self.rows, value] += kept & ~listed
+        return inverse
+
+    # operators
+    def keep(self, counts):
+        counts = counts.copy()
+        for column in range(self.width):
+            value = self.values[:, column]
+            self.kept[:, column] &= counts[self.rows, value] > 0
+            counts[self.rows, value] -= self.kept[:, column]
+
+    def reroll(self, counts, length, max_iterations=MAX_ITERATIONS, greedy=False, keep_rerolled=False):
+        """Rerolls dice in the pool pass by pass, as SingleDiceGroup.reroll() does: each pass looks only at the dice
+        added by the last one, and non-greedy pools are used up as they match."""
+        self.failed |= length > MAX_REROLL_LIST
+        active = length > 0
+        iterations = numpy.zeros(len(self.rows), dtype=int)
+        start = 0
+        while active.any():
+            end = self.width
+            eligible = self.kept[:, start:end] & ~self.exploded[:, start:end] & active[:, None]
+            if greedy:
+                selected = eligible & (counts[self.rows[:, None], self.values[:, start:end]] > 0)
+            else:
+                selected = numpy.zeros_like(eligible)
+                for column in range(end - start):
+                    value = self.values[:, start + column]
+                    selected[:, column] = eligible[:, column] & (counts[self.rows, value] > 0)
+                    counts[self.rows, value] -= selected[:, column]
+            iterations += self.valid[:, start:end].sum(axis=1)
+            if keep_rerolled:
+                self.exploded[:, start:end] |= selected
+            else:
+                self.kept[:, start:end] &= ~selected
+            added = selected.sum(axis=1)
+            self.add_dice(added)
+            active &= (added > 0) & (iterations <= max_iterations)
+            start = end
+
+    def add_dice(self, added):
+        num = added.max() if len(added) else 0
+        if not num:
+            return
+        start, end = self.width, self.width + num
+        if end > self.values.shape[1]:  # grow geometrically, so long chains of explosions stay linear
+            extra = max(end, 2 * self.values.shape[1]) - self.values.shape[1]
+            self.values, self.valid, self.kept, self.exploded = (
+                numpy.concatenate((a, numpy.zeros((len(self.rows), extra), dtype=a.dtype)), axis=1)
+                for a in (self.values, self.valid, self.kept, self.exploded))
+        valid = numpy.arange(num)[None, :] < added[:, None]
+        self.values[:, start:end] = numpy.where(valid, get_rng().randints(self.max_value, valid.shape), 0)
+        self.valid[:, start:end] = valid
+        self.kept[:, start:end] = valid
+        self.width = end
@@ -0,0 +1,315 @@
+"""
+Exact probability distributions of roll strings.
+Dice groups are built from per-die distributions; keep highest/lowest is solved with a dynamic program over
+order statistics, and groups are combined with the same evaluator that totals live rolls.
+"""
+import math
+from collections import defaultdict
+from fractions import Fraction
+from functools import lru_cache
+
+from cogs5e.funcs.dice import ConstantSpec, DiceSpec, OperatorSpec, VALID_OPERATORS_ARRAY, compile_roll, evaluate, \
+    list_get
+from cogs5e.models.errors import InvalidArgument, NoExactDistribution
+
+MAX_SUPPORT = 100000  # the most distinct values a distribution may hold
+MAX_KEEP_COMPLEXITY = 10000000  # roughly a second of work in _keep_extreme()
+DISTRIBUTION_CACHE_SIZE = 256
+
+
+class Distribution:
+    """An exact discrete probability distribution, held as integer weights over a common denominator."""
+
+    def __init__(self, weights, denominator=None):
+        self.weights = weights  # dict of value -> int
+        self.denominator = denominator if denominator is not None else sum(weights.values())
+        self._sorted = None
+
+    @classmethod
+    def constant(cls, value):
+        return cls({value: 1}, 1)
+
+    @classmethod
+    def uniform(cls, size):
+        return cls({v: 1 for v in range(1, size + 1)}, size)
+
+    # arithmetic
+    def _map(self, func):
+        weights = defaultdict(int)
+        for value, weight in self.weights.items():
+            weights[func(value)] += weight
+        return Distribution(dict(weights), self.denominator)
+
+    def _combine(self, other, func):
+        if not isinstance(other, Distribution):
+            return self._map(lambda v: func(v, other))
+        if len(self.weights) * len(other.weights) > MAX_SUPPORT * 10:
+            raise NoExactDistribution("This roll is too complex to compute exactly.")
+        weights = defaultdict(int)
+        for value, weight in self.weights.items():
+            for other_value, other_weight in other.weights.items():
+                weights[func(value, other_value)] += weight * other_weight
+        if len(weights) > MAX_SUPPORT:
+            raise NoExactDistribution("This roll is too complex to compute exactly.")
+        return Distribution(dict(weights), self.denominator * other.denominator)
+
+    def __add__(self, other):
+        return self._combine(other, lambda a, b: a + b)
+
+    def __radd__(self, other):
+        return self._combine(other, lambda a, b: b + a)
+
+    def __sub__(self, other):
+        return self._combine(other, lambda a, b: a - b)
+
+    def __rsub__(self, other):
+        return self._combine(other, lambda a, b: b - a)
+
+    def __mul__(self, other):
+        return self._combine(other, lambda a, b: a * b)
+
+    def __rmul__(self, other):
+        return self._combine(other, lambda a, b: b * a)
+
+    def __truediv__(self, other):
+        if (other == 0) if not isinstance(other, Distribution) else (0 in other.weights):
+            raise InvalidArgument("division by zero")
+        return self._combine(other, lambda a, b: Fraction(a) / b)
+
+    def __rtruediv__(self, other):
+        if 0 in self.weights:
+            raise InvalidArgument("division by zero")
+        return self._combine(other, lambda a, b: Fraction(b) / a)
+
+    def __neg__(self):
+        return self._map(lambda v: -v)
+
+    def __pos__(self):
+        return self
+
+    def floor(self):
+        """Returns the distribution of the floor of this distribution's values, as roll totals are floored."""
+        return self._map(math.floor)
+
+    # statistics
+    def items(self):
+        """Returns a sorted list of (value, probability) pairs."""
+        if self._sorted is None:
+            self._sorted = [(v, Fraction(w, self.denominator)) for v, w in sorted(self.weights.items()) if w]
+        return self._sorted
+
+    @property
+    def min(self):
+        return self.items()[0][0]
+
+    @property
+    def max(self):
+        return self.items()[-1][0]
+
+    def mean(self):
+        return Fraction(sum(v * w for v, w in self.weights.items()), self.denominator)
+
+    def variance(self):
+        mean = self.mean()
+        return Fraction(sum((v - mean) ** 2 * w for v, w in self.weights.items()), self.denominator)
+
+    def stdev(self):
+        return math.sqrt(self.variance())
+
+    def percentile(self, p):
+        """Returns the smallest value whose cumulative probability is at least p (0-100)."""
+        target = Fraction(p) / 100
+        cumulative = 0
+        for value, probability in self.items():
+            cumulative += probability
+            if cumulative >= target:
+                return value
+        return self.max
+
+    def at_least(self, dc):
+        """Returns the probability of a value greater than or equal to dc."""
+        return sum((probability for value, probability in self.items() if value >= dc), Fraction(0))
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __repr__(self):
+        return '<Distribution mean={:.2f} min={} max={}>'.format(float(self.mean()), self.min, self.max)
+
+
+def get_distribution(rollStr, adv: int = 0):
+    """Gets the exact distribution of a roll string's total.
+    :param rollStr: The roll string.
+    :param adv: 1 for advantage, -1 for disadvantage, 0 otherwise.
+    :returns Distribution
+    :raises NoExactDistribution if the roll uses operators that cannot be solved exactly."""
+    return program_distribution(compile_roll(rollStr, adv))
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def program_distribution(program):
+    """Gets the distribution of a compiled dice program (see compile_roll())."""
+    tokens = []
+    for spec in program:
+        if isinstance(spec, DiceSpec):
+            tokens.append(dice_distribution(spec.num_dice, spec.max_value, spec.operators))
+        elif isinstance(spec, ConstantSpec):
+            tokens.append(spec.value)
+        elif isinstance(spec, OperatorSpec):
+            tokens.append(spec.op)
+    try:
+        total = evaluate(tokens)
+    except SyntaxError:
+        raise InvalidArgument("No dice found to roll.")
+    if not isinstance(total, Distribution):
+        total = Distribution.constant(total)
+    return total.floor()
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def dice_distribution(num_dice, max_value, operators=()):
+    """Gets the distribution of the total of a single dice group.
+    Supports mi/ma, a single leading ro, k/p with a literal, < or > selector, and one keep highest/lowest.
+    :raises NoExactDistribution if the group's operators have no supported closed form."""
+    die = {v: 1 for v in range(1, max_value + 1)}  # kept value -> weight
+    dropped = 0  # weight of the die having been dropped
+    denominator = max_value
+    rerolled = False
+    any_dropped = False
+    order_keep = None  # (highest, num to keep)
+
+    for op, selectors in _operator_groups(operators):
+        if op in ('mi', 'ma'):
+            bound = _int_selector(selectors[0])
+            clamp = (lambda v: max(v, bound)) if op == 'mi' else (lambda v: min(v, bound))
+            clamped = defaultdict(int)
+            for value, weight in die.items():
+                clamped[clamp(value)] += weight
+            die = dict(clamped)
+            continue
+        if order_keep is not None or len(selectors) > 1:
+            raise NoExactDistribution(f"The `{op}` operator cannot be computed exactly here.")
+        selector = selectors[0]
+        if op == 'ro':
+            if rerolled or any_dropped:
+                raise NoExactDistribution("Only one reroll before any keep can be computed exactly.")
+            selected = _selected_values(selector, max_value)
+            selected_weight = sum(w for v, w in die.items() if v in selected)
+            die = {v: w * max_value for v, w in die.items() if v not in selected}
+            for v in range(1, max_value + 1):
+                die[v] = die.get(v, 0) + selected_weight
+            dropped *= max_value
+            denominator *= max_value
+            rerolled = True
+        elif op in ('k', 'p'):
+            if selector[:1] in ('h', 'l'):
+                if any_dropped:
+                    raise NoExactDistribution("Keeping highest or lowest after dropping dice cannot be computed "
+                                              "exactly.")
+                num = _int_selector(selector[1:])
+                highest = selector[0] == 'h'
+                if op == 'p':  # dropping the highest N is keeping the lowest (dice - N)
+                    num = num_dice - num
+                    highest = not highest
+                order_keep = (highest, num)
+            else:
+                selected = _selected_values(selector, max_value)
+                keep = (lambda v: v in selected) if op == 'k' else (lambda v: v not in selected)
+                dropped += sum(w for v, w in die.items() if not keep(v))
+                die = {v: w for v, w in die.items() if keep(v)}
+                any_dropped = True
+        else:
+            raise NoExactDistribution(f"The `{op}` operator cannot be computed exactly.")
+
+    if order_keep is not None:
+        highest, num = order_keep
+        weights = _keep_extreme(die, num_dice, num, highest)
+        return Distribution(weights, denominator ** num_dice)
+
+    if dropped:
+        die[0] = die.get(0, 0) + dropped
+    return _sum_iid(Distribution(die, denominator), num_dice)
+
+
+def _operator_groups(operators):
+    """Groups a dice group's operators the way roll_dice() applies them: consecutive uses of the same operator share
+    one selector pool.
+    :returns list - a list of (operator, [selectors])."""
+    groups = []
+    for index, op in enumerate(operators):
+        if op not in VALID_OPERATORS_ARRAY:
+            continue
+        selector = list_get(index + 1, '', operators)
+        if groups and groups[-1][0] == op and op not in ('mi', 'ma'):
+            groups[-1][1].append(selector)
+        else:
+            groups.append((op, [selector]))
+    return groups
+
+
+def _int_selector(selector):
+    try:
+        return int(selector)
+    except ValueError:
+        raise InvalidArgument(f"Invalid selector: `{selector}`")
+
+
+def _selected_values(selector, max_value):
+    """Returns the set of die values a literal, < or > selector matches."""
+    if selector[:1] == '>':
+        return set(range(_int_selector(selector[1:]) + 1, max_value + 1))
+    elif selector[:1] == '<':
+        return set(range(1, _int_selector(selector[1:])))
+    elif selector[:1] in ('h', 'l'):
+        raise NoExactDistribution("Highest/lowest selectors can only be computed exactly with `k` and `p`.")
+    return {_int_selector(selector)}
+
+
+def _sum_iid(die, num_dice):
+    """Returns the distribution of the sum of num_dice independent copies of a distribution."""
+    result = Distribution.constant(0)
+    power = die
+    while num_dice:
+        if num_dice & 1:
+            result = result + power
+        num_dice >>= 1
+        if num_dice:
+            power = power + power
+    return result
+
+
+@lru_cache(maxsize=None)
+def _binomial(n, k):
+    return math.factorial(n) // (math.factorial(k) * math.factorial(n - k))
+
+
+def _keep_extreme(die, num_dice, num_kept, highest=True):
+    """Returns the weights of the sum of the num_kept highest (or lowest) of num_dice independent dice.
+    Walks the die's values from best to worst, tracking (dice assigned, kept sum); once enough dice are kept, the
+    rest of the dice may take any worse value."""
+    total_weight = sum(die.values())
+    if num_kept <= 0:
+        return {0: total_weight ** num_dice}
+    num_kept = min(num_kept, num_dice)
+    if len(die) * num_dice ** 2 * num_kept * max(die) > MAX_KEEP_COMPLEXITY:
+        raise NoExactDistribution("Too many dice to keep highest or lowest exactly.")
+
+    result = defaultdict(int)
+    states = {(0, 0): 1}
+    remaining_weight = total_weight
+    for value in sorted(die, reverse=highest):
+        weight = die[value]
+        remaining_weight -= weight  # weight of the values worse than this one
+        next_states = defaultdict(int)
+        for (assigned, kept_sum), ways in states.items():
+            free = num_dice - assigned
+            for count in range(free + 1):
+                new_ways = ways * _binomial(free, count) * weight ** count
+                new_assigned = assigned + count
+                new_sum = kept_sum + min(count, num_kept - assigned) * value
+                if new_assigned >= num_kept:
+                    result[new_sum] += new_ways * remaining_weight ** (num_dice - new_assigned)
+                else:
+                    next_states[(new_assigned, new_sum)] += new_ways
+        states = next_states
+    return {v: w for v, w in result.items() if w}
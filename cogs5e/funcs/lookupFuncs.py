@@ -3,7 +3,6 @@ Created on Jan 13, 2017
 
 @author: andrew
 """
-import itertools
 import json
 import logging
 
@@ -15,6 +14,7 @@ from cogs5e.models.monster import Monster
 from cogs5e.models.race import Race
 from cogs5e.models.spell import Spell
 from utils.functions import parse_data_entry, search_and_select, search
+from utils.searchindex import SearchIndex
 
 HOMEBREW_EMOJI = "<:homebrew:434140566834511872>"
 HOMEBREW_ICON = "https://avrae.io/assets/img/homebrew.png"
@@ -49,6 +49,8 @@ class Compendium:
             self.monster_mash = [Monster.from_data(m) for m in self.monsters]
         with open('./res/spells.json', 'r') as f:
             self.spells = [Spell.from_data(r) for r in json.load(f)]
+        self.monster_index = SearchIndex(self.monster_mash, lambda e: e.name)
+        self.spell_index = SearchIndex(self.spells, lambda e: e.name)
         with open('./res/items.json', 'r') as f:
             _items = json.load(f)
             self.items = [i for i in _items if i.get('type') is not '$']
@@ -86,11 +88,12 @@ async def select_monster_full(ctx, name, cutoff=5, return_key=False, pm=False, m
     except NoActiveBrew:
         custom_monsters = []
         bestiary_id = None
-    choices = list(itertools.chain(c.monster_mash, custom_monsters))
+    choices = list(custom_monsters)
     if ctx.guild:
         async for servbestiary in ctx.bot.mdb.bestiaries.find({"server_active": str(ctx.guild.id)}, ['monsters']):
             choices.extend(
                 Monster.from_bestiary(m) for m in servbestiary['monsters'] if servbestiary['_id'] != bestiary_id)
+    choices = c.monster_index.with_entries(choices)
 
     def get_homebrew_formatted_name(monster):
         if monster.source == 'homebrew':
@@ -120,6 +123,7 @@ async def select_spell_full(ctx, name, cutoff=5, return_key=False, pm=False, mes
 
 
 async def get_spell_choices(ctx):
+    """:returns SearchIndex - the compendium's spells, then the active tome's, then the server's tomes'."""
     try:
         tome = await Tome.from_ctx(ctx)
         custom_spells = tome.spells
@@ -127,11 +131,11 @@ async def get_spell_choices(ctx):
     except NoActiveBrew:
         custom_spells = []
         tome_id = None
-    choices = list(itertools.chain(c.spells, custom_spells))
+    choices = list(custom_spells)
     if ctx.guild:
         async for servtome in ctx.bot.mdb.tomes.find({"server_active": str(ctx.guild.id)}, ['spells']):
             choices.extend(Spell.from_dict(s) for s in servtome['spells'] if servtome['_id'] != tome_id)
-    return choices
+    return c.spell_index.with_entries(choices)
 
 
 async def get_castable_spell(ctx, name, choices=None):
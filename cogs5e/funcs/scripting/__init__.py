@@ -1,8 +1,11 @@
 from cogs5e.funcs.scripting.combat import SimpleCombat, SimpleCombatant, SimpleGroup, SimpleEffect
 from cogs5e.funcs.scripting.evaluators import MathEvaluator, ScriptingEvaluator, SpellEvaluator
 from cogs5e.funcs.scripting.functions import DEFAULT_FUNCTIONS, DEFAULT_OPERATORS
-from cogs5e.funcs.scripting.helpers import SCRIPTING_RE, get_aliases, get_gvar_values, get_servaliases, \
-    get_servsnippets, get_snippets, get_uvars, set_uvar, parse_snippets
+from cogs5e.funcs.scripting.helpers import SCRIPTING_RE, get_alias_names, get_aliases, get_gvar_values, \
+    get_servalias_names, get_servaliases, get_servsnippets, get_snippets, get_uvars, invalidate_alias_names, \
+    invalidate_gvar, invalidate_snippets, prefetch_gvars, set_uvar, parse_snippets
+from cogs5e.funcs.scripting.templates import AliasTemplate, ScriptTemplate, get_alias_template
+from cogs5e.funcs.scripting.pool import run_parse, script_pool
 
 # does no one find this weird?
 
@@ -7,24 +7,36 @@ from utils.argparser import ParsedArguments
 
 
 class SimpleCombat:
+    """A script's view of a combat. Combatants are wrapped when a script first reads them, and only the combatants
+    a script changes are committed."""
+
     def __init__(self, combat, me):
         self._combat: Combat = combat
 
-        self.combatants = [SimpleCombatant(c) for c in self._combat.get_combatants()]
+        self._combatants = None
+        self._changed = {}  # changed Combatant -> its name before it changed
+        self._all_changed = False
         if me:
-            self.me = SimpleCombatant(me, False)
+            self.me = SimpleCombatant(me, False, self)
         else:
             self.me = None
         self.round_num = self._combat.round_num
         self.turn_num = self._combat.turn_num
+
+    @property
+    def combatants(self):
+        if self._combatants is None:
+            self._combatants = [SimpleCombatant(c, combat=self) for c in self._combat.get_combatants()]
+        return self._combatants
+
+    @property
+    def current(self):
         current = self._combat.current_combatant
         if current:
             if isinstance(current, CombatantGroup):
-                self.current = SimpleGroup(current)
-            else:
-                self.current = SimpleCombatant(current)
-        else:
-            self.current = None
+                return SimpleGroup(current, self)
+            return SimpleCombatant(current, combat=self)
+        return None
 
     @classmethod
     async def from_ctx(cls, ctx):
@@ -38,13 +50,13 @@ class SimpleCombat:
     def get_combatant(self, name):
         combatant = self._combat.get_combatant(name, False)
         if combatant:
-            return SimpleCombatant(combatant)
+            return SimpleCombatant(combatant, combat=self)
         return None
 
     def get_group(self, name):
         group = self._combat.get_group(name, strict=False)
         if group:
-            return SimpleGroup(group)
+            return SimpleGroup(group, self)
         return None
 
     # private functions
@@ -53,54 +65,98 @@ class SimpleCombat:
         if not me:
             return
         me._character = character  # set combatant character instance
-        self.me = SimpleCombatant(me, False)
+        self.me = SimpleCombatant(me, False, self)
+
+    def func_set_changed(self, combatant=None):
+        """Marks a combatant as changed, or the whole combat if combatant is None."""
+        if combatant is None:
+            self._all_changed = True
+        elif combatant not in self._changed:
+            self._changed[combatant] = combatant.name
 
     async def func_commit(self):
-        await self._combat.commit()
+        """Commits what scripts changed, if anything."""
+        if self._all_changed:
+            await self._combat.commit()
+        elif self._changed:
+            await self._combat.commit_combatants(self._changed)
 
     def __str__(self):
         return str(self._combat)
 
 
 class SimpleCombatant:
-    def __init__(self, combatant: Combatant, hidestats=True):
+    """A script's view of a combatant, which reads through to the combatant. Stats of a private combatant are None
+    unless it is the script's own."""
+
+    def __init__(self, combatant: Combatant, hidestats=True, combat=None):
         self._combatant = combatant
         self._hidden = hidestats and self._combatant.isPrivate
+        self._combat = combat
         self.type = "combatant"
 
-        if not self._hidden:
-            self.ac = self._combatant.ac
-            if self._combatant.hp is not None:
-                self.hp = self._combatant.hp - (self._combatant.temphp or 0)
-            else:
-                self.hp = None
-            self.maxhp = self._combatant.hpMax
-            self.initmod = self._combatant.initMod
-            self.temphp = self._combatant.temphp
-            self.resists = self._combatant.resists
-            self.attacks = self._combatant.attacks
-        else:
-            self.ac = None
-            self.hp = None
-            self.maxhp = None
-            self.initmod = None
-            self.temphp = None
-            self.resists = None
-            self.attacks = None
-        self.init = self._combatant.init
-        self.name = self._combatant.name
-        self.note = self._combatant.notes
-        self.effects = [SimpleEffect(e) for e in self._combatant.get_effects()]
+    @property
+    def ac(self):
+        return None if self._hidden else self._combatant.ac
+
+    @property
+    def hp(self):
+        if self._hidden or self._combatant.hp is None:
+            return None
+        return self._combatant.hp - (self._combatant.temphp or 0)
+
+    @property
+    def maxhp(self):
+        return None if self._hidden else self._combatant.hpMax
+
+    @property
+    def initmod(self):
+        return None if self._hidden else self._combatant.initMod
+
+    @property
+    def temphp(self):
+        return None if self._hidden else self._combatant.temphp
+
+    @property
+    def resists(self):
+        return None if self._hidden else self._combatant.resists
+
+    @property
+    def attacks(self):
+        return None if self._hidden else self._combatant.attacks
+
+    @property
+    def init(self):
+        return self._combatant.init
+
+    @property
+    def name(self):
+        return self._combatant.name
+
+    @property
+    def note(self):
+        return self._combatant.notes
+
+    @property
+    def effects(self):
+        return [SimpleEffect(e, self._combat) for e in self._combatant.get_effects()]
+
+    @property
+    def ratio(self):
         if self._combatant.hp is not None and self._combatant.hpMax:
-            self.ratio = (self._combatant.hp - (self._combatant.temphp or 0)) / self._combatant.hpMax
-        else:
-            self.ratio = 0
-        self.level = self._combatant.spellcasting.casterLevel
+            return (self._combatant.hp - (self._combatant.temphp or 0)) / self._combatant.hpMax
+        return 0
+
+    @property
+    def level(self):
+        return self._combatant.spellcasting.casterLevel
 
     def set_hp(self, newhp: int):
+        self._set_changed()
         self._combatant.set_hp(int(newhp))
 
     def mod_hp(self, mod: int, overheal: bool = False):
+        self._set_changed()
         self._combatant.mod_hp(mod, overheal)
 
     def hp_str(self):
@@ -151,42 +207,50 @@ class SimpleCombatant:
     def set_ac(self, ac: int):
         if not isinstance(ac, int) and ac is not None:
             raise ValueError("AC must be an integer or None.")
+        self._set_changed()
         self._combatant.ac = ac
 
     def set_maxhp(self, maxhp: int):
         if not isinstance(maxhp, int) and maxhp is not None:
             raise ValueError("Max HP must be an integer or None.")
+        self._set_changed()
         self._combatant.hpMax = maxhp
 
     def set_thp(self, thp: int):
         if not isinstance(thp, int):
             raise ValueError("Temp HP must be an integer.")
+        self._set_changed()
         self._combatant.temphp = thp
 
     def set_init(self, init: int):
         if not isinstance(init, int):
             raise ValueError("Initiative must be an integer.")
+        self._set_changed()
         self._combatant.init = init
 
     def set_name(self, name: str):
         if not name:
             raise ValueError("Combatants must have a name.")
+        self._set_changed(any(e.parent or e.children for e in self._combatant.get_effects()))  # renames relatives
         self._combatant.name = str(name)
 
     def set_note(self, note: str):
         if note is not None:
             note = str(note)
+        self._set_changed()
         self._combatant.notes = note
 
     def get_effect(self, name: str):
         effect = self._combatant.get_effect(name)
         if effect:
-            return SimpleEffect(effect)
+            return SimpleEffect(effect, self._combat)
         return None
 
     def add_effect(self, name: str, args: str, duration: int = -1, concentration: bool = False, parent=None,
                    end: bool = False):
         existing = self._combatant.get_effect(name, True)
+        # concentration, parents and children link effects on other combatants
+        self._set_changed(concentration or parent or (existing and (existing.parent or existing.children)))
         if existing:
             existing.remove()
         effectObj = Effect.new(self._combatant.combat, self._combatant, duration=duration, name=name, effect_args=args,
@@ -198,17 +262,30 @@ class SimpleCombatant:
     def remove_effect(self, name: str):
         effect = self._combatant.get_effect(name)
         if effect:
+            self._set_changed(effect.parent or effect.children)
             effect.remove()
 
+    def _set_changed(self, others=False):
+        """Marks this combatant as changed, or the whole combat if the change can reach other combatants."""
+        if self._combat is not None:
+            self._combat.func_set_changed(None if others else self._combatant)
+
     def __str__(self):
         return str(self._combatant)
 
 
 class SimpleGroup:
-    def __init__(self, group: CombatantGroup):
+    def __init__(self, group: CombatantGroup, combat=None):
         self._group = group
+        self._combat = combat
         self.type = "group"
-        self.combatants = [SimpleCombatant(c) for c in self._group.get_combatants()]
+        self._combatants = None
+
+    @property
+    def combatants(self):
+        if self._combatants is None:
+            self._combatants = [SimpleCombatant(c, combat=self._combat) for c in self._group.get_combatants()]
+        return self._combatants
 
     def get_combatant(self, name):
         combatant = next((c for c in self.combatants if name.lower() in c.name.lower()), None)
@@ -221,17 +298,34 @@ class SimpleGroup:
 
 
 class SimpleEffect:
-    def __init__(self, effect: Effect):
+    def __init__(self, effect: Effect, combat=None):
         self._effect = effect
+        self._combat = combat
+
+    @property
+    def name(self):
+        return self._effect.name
+
+    @property
+    def duration(self):
+        return self._effect.duration
+
+    @property
+    def remaining(self):
+        return self._effect.remaining
+
+    @property
+    def effect(self):
+        return self._effect.effect
 
-        self.name = self._effect.name
-        self.duration = self._effect.duration
-        self.remaining = self._effect.remaining
-        self.effect = self._effect.effect
-        self.conc = self._effect.concentration
+    @property
+    def conc(self):
+        return self._effect.concentration
 
     def __str__(self):
         return str(self._effect)
 
     def set_parent(self, parent):
+        if self._combat is not None:
+            self._combat.func_set_changed()  # changes this effect's combatant and the parent's
         self._effect.set_parent(parent._effect)
@@ -1,6 +1,8 @@
 import ast
+import asyncio
 import copy
 import re
+from functools import lru_cache
 from math import ceil, floor
 
 import simpleeval
@@ -10,11 +12,92 @@ from cogs5e.funcs.dice import roll
 from cogs5e.models.errors import EvaluationError, FunctionRequiresCharacter, InvalidArgument
 from .combat import SimpleCombat
 from .functions import DEFAULT_FUNCTIONS, DEFAULT_OPERATORS
-from .helpers import MAX_ITER_LENGTH, SCRIPTING_RE, get_uvars, update_uvars
+from .helpers import MAX_ITER_LENGTH, SCRIPTING_RE, get_uvars, load_gvar, load_uvars, update_uvars
+from .templates import Block, ScriptTemplate
 
 if 'format_map' not in simpleeval.DISALLOW_METHODS:
     simpleeval.DISALLOW_METHODS.append('format_map')
 
+AST_CACHE_SIZE = 4096
+LIVE_NAMES = frozenset(('combat', 'get_gvar'))  # names that need state only the bot process has
+
+
+@lru_cache(maxsize=AST_CACHE_SIZE)
+def parse_statement(expr):
+    """Parses the first statement of an expression.
+    The node is shared by every evaluator that evaluates the same text, so it must never be modified.
+    :param expr: The stripped expression."""
+    return ast.parse(expr).body[0]
+
+
+def ast_cache_info():
+    """Returns the hit/miss statistics of the parsed expression cache.
+    :returns CacheInfo - a (hits, misses, maxsize, currsize) namedtuple."""
+    return parse_statement.cache_info()
+
+
+@lru_cache(maxsize=AST_CACHE_SIZE)
+def block_requirements(expr):
+    """Finds what a {{}} block needs from outside its evaluator.
+    :returns tuple - (frozenset of the live names it refers to, frozenset of the gvars it loads by literal name)"""
+    try:
+        tree = parse_statement(expr.strip())
+    except Exception:  # the evaluator reports what is wrong with the block, as an empty or too deeply nested one
+        return frozenset(), frozenset()
+    names = set()
+    gvars = set()
+    literal_calls = set()
+    for node in ast.walk(tree):  # breadth first, so a call is seen before its function's name
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'get_gvar' \
+                and len(node.args) == 1 and not node.keywords and isinstance(node.args[0], ast.Str):
+            gvars.add(node.args[0].s)
+            literal_calls.add(id(node.func))
+        elif isinstance(node, ast.Name) and node.id in LIVE_NAMES and id(node) not in literal_calls:
+            names.add(node.id)
+    return frozenset(names), frozenset(gvars)
+
+
+def script_requirements(content):
+    """:returns tuple - (the live names a script refers to, the gvars it loads by literal name)"""
+    if isinstance(content, ScriptTemplate):
+        blocks = [s.double for s in content.segments if isinstance(s, Block) and s.double]
+    else:
+        blocks = [m.group(1) for m in SCRIPTING_RE.finditer(content) if m.group(1)]
+    names = set()
+    gvars = set()
+    for block in blocks:
+        block_names, block_gvars = block_requirements(block)
+        names.update(block_names)
+        gvars.update(block_gvars)
+    return names, gvars
+
+
+class LazyNames(dict):
+    """A dict of names that calls a loader the first time a name is missing, which may add more names."""
+
+    def __init__(self, names, loader):
+        super(LazyNames, self).__init__(names)
+        self.loader = loader
+
+    def _load(self):
+        """:returns bool - whether the loader ran."""
+        if self.loader is None:
+            return False
+        loader, self.loader = self.loader, None
+        loader()
+        return True
+
+    def __missing__(self, key):
+        if self._load():
+            return self[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return super(LazyNames, self).__contains__(key) or (self._load() and super(LazyNames, self).__contains__(key))
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
 
 class MathEvaluator(SimpleEval):
     """Evaluator with basic math functions exposed."""
@@ -40,6 +123,10 @@ class MathEvaluator(SimpleEval):
             names['spell'] = (character.get_spell_ab() - character.get_prof_bonus())
         return cls(names=names)
 
+    def eval(self, expr):
+        self.expr = expr
+        return self._eval(parse_statement(expr.strip()).value)
+
     def parse(self, string):
         """Parses a dicecloud-formatted string (evaluating text in {})."""
         return re.sub(r'(?<!\\){(.+?)}', lambda m: str(self.eval(m.group(1))), string)
@@ -56,6 +143,7 @@ class ScriptingEvaluator(EvalWithCompoundTypes):
         if names is None:
             names = DEFAULT_NAMES.copy()
         super(ScriptingEvaluator, self).__init__(operators, functions, names)
+        self.names = LazyNames(self.names, self._load_uvars)  # uvars are loaded when a missing name is looked up
 
         self.nodes.update({
             ast.JoinedStr: self._eval_joinedstr,  # f-string
@@ -101,19 +189,25 @@ class ScriptingEvaluator(EvalWithCompoundTypes):
 
         self.ctx = ctx
         self.character_changed = False
-        self.combat_changed = False
         self.uvars_changed = set()
+        self.uvars_loaded = False
+        self.profile = None
 
     @classmethod
-    async def new(cls, ctx):
+    async def new(cls, ctx, script=None):
+        """Creates an evaluator. Uvars are loaded the first time a script looks up a name it does not have, and
+        combat the first time it calls combat().
+        :param script: The script the evaluator will run, if known. If it calls combat(), combat is loaded now."""
         inst = cls(ctx)
-        uvars = await get_uvars(ctx)
-        inst.names.update(uvars)
-        inst._cache['uvars'].update(uvars)
-        inst._cache['combat'] = await SimpleCombat.from_ctx(ctx)
+        if script is not None and 'combat' in script_requirements(script)[0]:
+            inst._set_combat(await SimpleCombat.from_ctx(ctx))
         return inst
 
     async def with_character(self, character):
+        return self.set_character(character)
+
+    def set_character(self, character):
+        """Exposes a character's cvars and functions to scripts."""
         self.names.update(character.get_cvars())
         self.names.update(character.get_stat_vars())
         self.names['spell'] = character.get_spell_ab() - character.get_prof_bonus()
@@ -242,14 +336,47 @@ class ScriptingEvaluator(EvalWithCompoundTypes):
 
         return self
 
+    def _add_uvars(self, uvars):
+        self.uvars_loaded = True
+        self.names.loader = None
+        for name, value in uvars.items():  # cvars and anything the script set take priority
+            self.names.setdefault(name, value)
+            self._cache['uvars'].setdefault(name, value)
+
+    def _load_uvars(self):
+        """Loads the author's uvars. Blocks, so it is only called while a script is running."""
+        if not self.uvars_loaded:
+            self._add_uvars(load_uvars(self.ctx))
+
+    async def load_uvars(self):
+        """Loads the author's uvars now, if they are not loaded yet."""
+        if not self.uvars_loaded:
+            self._add_uvars(await get_uvars(self.ctx))
+
+    def _set_combat(self, combat):
+        self._cache['combat'] = combat
+        if combat and 'character' in self._cache:
+            combat.func_set_character(self._cache['character'])
+
     async def run_commits(self):
         if self.character_changed and 'character' in self._cache:
             await self._cache['character'].commit(self.ctx)
-        if self.combat_changed and 'combat' in self._cache and self._cache['combat']:
-            await self._cache['combat'].func_commit()
+        if 'combat' in self._cache and self._cache['combat']:
+            await self._cache['combat'].func_commit()  # writes only what the script changed
         if self.uvars_changed and 'uvars' in self._cache and self._cache['uvars']:
             await update_uvars(self.ctx, self._cache['uvars'], self.uvars_changed)
 
+    def start_profile(self, profile):
+        """Records what evaluating each block costs in a ScriptProfile.
+        :type profile: cogs5e.funcs.scripting.profiler.ScriptProfile"""
+        self.profile = profile
+        if profile.count_nodes:
+            self._eval = self._counted_eval
+        for name in ('roll', 'vroll'):
+            if name in self.functions:
+                self.functions[name] = profile.counted(self.functions[name])
+        return self
+
     # helpers
     def needs_char(self, *args, **kwargs):
         raise FunctionRequiresCharacter()  # no. bad.
@@ -261,20 +388,25 @@ class ScriptingEvaluator(EvalWithCompoundTypes):
         return name in self.names
 
     def combat(self):
-        if not 'combat' in self._cache:
+        if not 'combat' in self._cache:  # scripts run in an executor thread, so wait for the bot's loop to load it
+            future = asyncio.run_coroutine_threadsafe(SimpleCombat.from_ctx(self.ctx), self.ctx.bot.loop)
+            self._set_combat(future.result())
+        if not self._cache['combat']:
             return None
-        self.combat_changed = True
         return self._cache['combat']
 
     def uvar_exists(self, name):
+        self._load_uvars()
         return self.exists(name) and name in self._cache['uvars']
 
     def get_gvar(self, name):
         if name not in self._cache['gvars']:
-            result = self.ctx.bot.mdb.gvars.delegate.find_one({"key": name})
+            if self.profile is not None:
+                self.profile.gvars += 1
+            result = load_gvar(self.ctx, name)
             if result is None:
                 return None
-            self._cache['gvars'][name] = result['value']
+            self._cache['gvars'][name] = result
         return self._cache['gvars'][name]
 
     def set_uvar(self, name, val: str):
@@ -289,6 +421,7 @@ class ScriptingEvaluator(EvalWithCompoundTypes):
             self.set_uvar(name, val)
 
     def delete_uvar(self, name):
+        self._load_uvars()
         if name in self._cache['uvars']:
             del self._cache['uvars'][name]
             self.uvars_changed.add(name)
@@ -308,28 +441,30 @@ class ScriptingEvaluator(EvalWithCompoundTypes):
 
     # evaluation
     def parse(self, string, double_curly=None, curly=None, ltgt=None):
-        """Parses a scripting string (evaluating text in {{}})."""
+        """Parses a scripting string (evaluating text in {{}}).
+        :param string: The string to parse, or a ScriptTemplate of it (see templates.py)."""
         ops = r"([-+*/().<>=])"
 
-        def evalrepl(match):
-            if match.group(1):  # {{}}
+        def evalblock(text, double_text, ltgt_text, curly_text):
+            if double_text:  # {{}}
                 double_func = double_curly or self.eval
-                evalresult = double_func(match.group(1))
-            elif match.group(2):  # <>
-                if re.match(r'<a?([@#]|:.+:)[&!]{0,2}\d+>', match.group(0)):  # ignore mentions
-                    return match.group(0)
-                out = match.group(2)
+                evalresult = double_func(double_text)
+            elif ltgt_text:  # <>
+                if re.match(r'<a?([@#]|:.+:)[&!]{0,2}\d+>', text):  # ignore mentions
+                    return text
                 ltgt_func = ltgt or (lambda s: str(self.names.get(s, s)))
-                evalresult = ltgt_func(out)
-            elif match.group(3):  # {}
-                varstr = match.group(3)
+                evalresult = ltgt_func(ltgt_text)
+            elif curly_text:  # {}
+                varstr = curly_text
 
                 def default_curly_func(s):
                     curlyout = ""
                     for substr in re.split(ops, s):
                         temp = substr.strip()
                         curlyout += str(self.names.get(temp, temp)) + " "
-                    return str(roll(curlyout).total)
+                    if self.profile is not None:
+                        self.profile.rolls += 1
+                    return str(roll(curlyout, total_only=True).total)
 
                 curly_func = curly or default_curly_func
                 evalresult = curly_func(varstr)
@@ -337,8 +472,14 @@ class ScriptingEvaluator(EvalWithCompoundTypes):
                 evalresult = None
             return str(evalresult) if evalresult is not None else ''
 
+        if self.profile is not None:
+            evalblock = self.profile.timed(evalblock, self)
+
         try:
-            output = re.sub(SCRIPTING_RE, evalrepl, string)  # evaluate
+            if isinstance(string, ScriptTemplate):
+                output = ''.join(s if isinstance(s, str) else evalblock(*s) for s in string.segments)
+            else:
+                output = re.sub(SCRIPTING_RE, lambda m: evalblock(m.group(0), *m.groups()), string)  # evaluate
         except Exception as ex:
             raise EvaluationError(ex)
 
@@ -353,7 +494,7 @@ class ScriptingEvaluator(EvalWithCompoundTypes):
         self.expr = expr
 
         # and evaluate:
-        expression = ast.parse(expr.strip()).body[0]
+        expression = parse_statement(expr.strip())
         if isinstance(expression, ast.Expr):
             return self._eval(expression.value)
         elif isinstance(expression, ast.Assign):
@@ -362,6 +503,10 @@ class ScriptingEvaluator(EvalWithCompoundTypes):
             raise TypeError("Unknown ast body type")
 
     # private magic
+    def _counted_eval(self, node):
+        self.profile.nodes += 1
+        return EvalWithCompoundTypes._eval(self, node)
+
     def _eval_assign(self, node):
         names = node.targets[0]
         values = node.value
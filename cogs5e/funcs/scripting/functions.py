@@ -13,7 +13,7 @@ from cogs5e.models.errors import AvraeException
 
 
 def simple_roll(rollStr):
-    return roll(rollStr).total
+    return roll(rollStr, total_only=True).total
 
 
 class SimpleRollResult:
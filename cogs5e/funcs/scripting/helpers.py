@@ -1,20 +1,57 @@
 import re
 import shlex
+import threading
 
+import cachetools
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from cogs5e.models.errors import UvarWriteError
 from utils.argparser import argquote
+from utils.dataloader import get_loader
 
 SCRIPTING_RE = re.compile(r'(?<!\\)(?:(?:{{(.+?)}})|(?:<([^\s]+)>)|(?:(?<!{){(.+?)}))')
 MAX_ITER_LENGTH = 10000
+GVAR_CACHE_SIZE = 1024
+GVAR_CACHE_TTL = 60  # seconds - other processes only see a gvar edit once their copy expires
+
+# gvar key -> value, or None if there is no such gvar; shared by every evaluator in the process
+gvar_cache = cachetools.TTLCache(GVAR_CACHE_SIZE, GVAR_CACHE_TTL)
+gvar_cache_lock = threading.Lock()  # evaluators run in executor threads
+ALIAS_INDEX_SIZE = 4096
+ALIAS_INDEX_TTL = 60  # seconds - other processes only see an alias edit once their copy expires
+
+# (collection name, owner or server id) -> frozenset of alias names; lets messages that are not aliases skip the db
+alias_index = cachetools.TTLCache(ALIAS_INDEX_SIZE, ALIAS_INDEX_TTL)
+SNIPPET_CACHE_SIZE = 4096
+SNIPPET_CACHE_TTL = 60  # seconds - other processes only see a snippet edit once their copy expires
+
+# (collection name, owner or server id) -> {snippet name: snippet}; shared by every command in the process
+snippet_cache = cachetools.TTLCache(SNIPPET_CACHE_SIZE, SNIPPET_CACHE_TTL)
 
 
 async def get_uvars(ctx):
+    """Gets a user's uvars. The dict is shared by everything in the message that loads them, so do not modify it."""
+    return await get_loader(ctx).load(('uvars', str(ctx.author.id)), _load_uvars, ctx)
+
+
+async def _load_uvars(ctx):
     uvars = {}
-    async for uvar in ctx.bot.mdb.uvars.find({"owner": str(ctx.author.id)}):
+    async for uvar in ctx.bot.mdb.uvars.find({"owner": str(ctx.author.id)}, ['name', 'value']):
+        uvars[uvar['name']] = uvar['value']
+    return uvars
+
+
+def load_uvars(ctx):
+    """Gets a user's uvars. Blocks."""
+    uvars = {}
+    for uvar in ctx.bot.mdb.uvars.delegate.find({"owner": str(ctx.author.id)}, ['name', 'value']):
         uvars[uvar['name']] = uvar['value']
     return uvars
 
 
 async def set_uvar(ctx, name, value):
+    get_loader(ctx).invalidate(('uvars', str(ctx.author.id)))
     await ctx.bot.mdb.uvars.update_one(
         {"owner": str(ctx.author.id), "name": name},
         {"$set": {"value": value}},
@@ -22,15 +59,32 @@ async def set_uvar(ctx, name, value):
 
 
 async def update_uvars(ctx, uvar_dict, changed=None):
+    """Saves a user's uvars in one bulk write: changed uvars that are in uvar_dict are upserted, and the rest of the
+    changed uvars are deleted.
+    :param changed: The names of the uvars to save, or None to save all of uvar_dict.
+    :returns BulkWriteResult, or None if there was nothing to save.
+    :raises UvarWriteError if any of the writes failed."""
     if changed is None:
-        for name, value in uvar_dict.items():
-            await set_uvar(ctx, name, value)
-    else:
-        for name in changed:
-            if name in uvar_dict:
-                await set_uvar(ctx, name, uvar_dict[name])
-            else:
-                await ctx.bot.mdb.uvars.delete_one({"owner": str(ctx.author.id), "name": name})
+        changed = uvar_dict.keys()
+    owner = str(ctx.author.id)
+    requests = []
+    names = []
+    for name in changed:
+        if name in uvar_dict:
+            requests.append(UpdateOne({"owner": owner, "name": name}, {"$set": {"value": uvar_dict[name]}},
+                                      upsert=True))
+        else:
+            requests.append(DeleteOne({"owner": owner, "name": name}))
+        names.append(name)
+    if not requests:
+        return None
+
+    get_loader(ctx).invalidate(('uvars', owner))
+    try:
+        return await ctx.bot.mdb.uvars.bulk_write(requests, ordered=False)  # each name is written at most once
+    except BulkWriteError as e:
+        failed = [names[error['index']] for error in e.details.get('writeErrors', [])]
+        raise UvarWriteError(failed, e.details)
 
 
 async def get_gvar_values(ctx):
@@ -40,6 +94,40 @@ async def get_gvar_values(ctx):
     return gvars
 
 
+async def prefetch_gvars(ctx, keys):
+    """Loads any of the given gvars that are not cached with a single query."""
+    with gvar_cache_lock:
+        missing = [k for k in keys if k not in gvar_cache]
+    if not missing:
+        return
+    found = dict.fromkeys(missing)
+    async for gvar in ctx.bot.mdb.gvars.find({"key": {"$in": missing}}, ['key', 'value']):
+        found[gvar['key']] = gvar['value']
+    with gvar_cache_lock:
+        gvar_cache.update(found)
+
+
+def load_gvar(ctx, key):
+    """Gets the value of a gvar from the cache, or from the database if it is not cached. Blocks.
+    :returns str - the value, or None if the gvar does not exist."""
+    if not isinstance(key, str):
+        result = ctx.bot.mdb.gvars.delegate.find_one({"key": key})
+        return result['value'] if result is not None else None
+    with gvar_cache_lock:
+        if key in gvar_cache:
+            return gvar_cache[key]
+    result = ctx.bot.mdb.gvars.delegate.find_one({"key": key}, ['value'])
+    value = result['value'] if result is not None else None
+    with gvar_cache_lock:
+        gvar_cache[key] = value
+    return value
+
+
+def invalidate_gvar(key):
+    with gvar_cache_lock:
+        gvar_cache.pop(key, None)
+
+
 async def get_aliases(ctx):
     aliases = {}
     async for alias in ctx.bot.mdb.aliases.find({"owner": str(ctx.author.id)}):
@@ -54,6 +142,33 @@ async def get_servaliases(ctx):
     return servaliases
 
 
+async def _get_alias_names(bot, collection, field, _id):
+    key = (collection, _id)
+    names = alias_index.get(key)
+    if names is None:
+        names = frozenset([a['name'] async for a in bot.mdb[collection].find({field: _id}, ['name'])])
+        alias_index[key] = names
+    return names
+
+
+async def get_alias_names(bot, owner_id):
+    """Gets the names of a user's aliases. Cached per process."""
+    return await _get_alias_names(bot, 'aliases', 'owner', owner_id)
+
+
+async def get_servalias_names(bot, server_id):
+    """Gets the names of a server's aliases. Cached per process."""
+    return await _get_alias_names(bot, 'servaliases', 'server', server_id)
+
+
+def invalidate_alias_names(owner_id=None, server_id=None):
+    """Drops a user's or server's alias names from the cache, after their aliases change."""
+    if owner_id is not None:
+        alias_index.pop(('aliases', owner_id), None)
+    if server_id is not None:
+        alias_index.pop(('servaliases', server_id), None)
+
+
 async def get_snippets(ctx):
     snippets = {}
     async for snippet in ctx.bot.mdb.snippets.find({"owner": str(ctx.author.id)}):
@@ -69,6 +184,23 @@ async def get_servsnippets(ctx):
     return servsnippets
 
 
+async def _get_snippet_map(bot, collection, field, _id):
+    key = (collection, _id)
+    snippets = snippet_cache.get(key)
+    if snippets is None:
+        snippets = {s['name']: s['snippet'] async for s in bot.mdb[collection].find({field: _id}, ['name', 'snippet'])}
+        snippet_cache[key] = snippets
+    return snippets
+
+
+def invalidate_snippets(owner_id=None, server_id=None):
+    """Drops a user's or server's snippets from the cache, after their snippets change."""
+    if owner_id is not None:
+        snippet_cache.pop(('snippets', owner_id), None)
+    if server_id is not None:
+        snippet_cache.pop(('servsnippets', server_id), None)
+
+
 async def parse_snippets(args: str, ctx) -> str:
     """
     Parses user and server snippets.
@@ -77,10 +209,17 @@ async def parse_snippets(args: str, ctx) -> str:
     :return: The string, with snippets replaced.
     """
     tempargs = shlex.split(args)
-    snippets = await get_servsnippets(ctx)
-    snippets.update(await get_snippets(ctx))
+    if not tempargs:  # nothing could be a snippet
+        return ""
+    snippets = await _get_snippet_map(ctx.bot, 'snippets', 'owner', str(ctx.author.id))
+    if ctx.guild:
+        servsnippets = await _get_snippet_map(ctx.bot, 'servsnippets', 'server', str(ctx.guild.id))
+    else:
+        servsnippets = {}
+    if snippets.keys().isdisjoint(tempargs) and servsnippets.keys().isdisjoint(tempargs):  # no argument is a snippet
+        return " ".join(argquote(arg) if ' ' in arg else arg for arg in tempargs)
     for index, arg in enumerate(tempargs):  # parse snippets
-        snippet_value = snippets.get(arg)
+        snippet_value = snippets[arg] if arg in snippets else servsnippets.get(arg)
         if snippet_value:
             tempargs[index] = snippet_value
         elif ' ' in arg:
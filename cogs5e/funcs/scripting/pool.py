@@ -0,0 +1,245 @@
+"""
+Evaluates scripts in a pool of worker processes, so that a runaway alias cannot hold a thread and the GIL of the bot.
+Disabled unless the SCRIPT_POOL_WORKERS environment variable is set.
+
+A worker gets a snapshot of everything the script can read - its names, uvars, character and gvars - and returns
+the output along with what the script changed, which is committed as usual by the caller. Scripts that need live
+state (combat, or gvars loaded by a computed name) and live characters still run in a thread.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import sys
+import time
+import types
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cogs5e.funcs.dice import seed_rng
+from cogs5e.models.errors import AvraeException, EvaluationError, ScriptTimeout
+from .evaluators import ScriptingEvaluator, script_requirements
+from .helpers import gvar_cache, gvar_cache_lock, load_gvar, prefetch_gvars
+from .profiler import ScriptProfile
+
+log = logging.getLogger(__name__)
+
+SCRIPT_POOL_WORKERS = int(os.environ.get("SCRIPT_POOL_WORKERS", 0))  # 0 disables the pool
+SCRIPT_POOL_QUEUE_SIZE = 64  # most scripts queued or running in the pool at once; the rest run in threads
+SCRIPT_CPU_LIMIT = 2  # seconds of CPU time a script may use in a worker
+SCRIPT_WALL_LIMIT = 10  # seconds to wait for a worker, in case it is stuck somewhere the CPU limit cannot interrupt
+
+
+class ScriptPool:
+    """A bounded pool of processes to evaluate scripts in."""
+
+    def __init__(self, workers=SCRIPT_POOL_WORKERS, queue_size=SCRIPT_POOL_QUEUE_SIZE):
+        if workers and sys.version_info < (3, 7):
+            log.warning("The script pool needs Python 3.7 or later; scripts will run in threads.")
+            workers = 0
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = None
+        self.in_flight = 0
+        self.metrics = Counter()
+
+    def eligible(self, evaluator, content):
+        """:returns frozenset - the gvars to send with the script, or None if it cannot run in the pool."""
+        if type(evaluator) is not ScriptingEvaluator:
+            return None
+        character = evaluator._cache.get('character')
+        if character is not None and character.live:
+            return None
+        names, gvars = script_requirements(content)
+        if names:
+            return None
+        return gvars
+
+    async def parse(self, evaluator, content):
+        """Runs evaluator.parse(content) in the pool, applying what the script changed to the evaluator.
+        :returns str - the output, or None if the script has to run in this process instead."""
+        if not self.workers:
+            return None
+        gvars = self.eligible(evaluator, content)
+        if gvars is None:
+            self.metrics['ineligible'] += 1
+            return None
+        if self.in_flight >= self.queue_size:
+            self.metrics['queue_full'] += 1
+            return None
+
+        await prefetch_gvars(evaluator.ctx, gvars)
+        await evaluator.load_uvars()  # the worker cannot load them on demand
+        try:
+            job = pickle.dumps(make_job(evaluator, content, gvars))
+        except Exception:  # something in the script's names that cannot be sent to a worker
+            self.metrics['ineligible'] += 1
+            return None
+
+        self.in_flight += 1
+        self.metrics['peak_in_flight'] = max(self.metrics['peak_in_flight'], self.in_flight)
+        self.metrics['submitted'] += 1
+        start = time.monotonic()
+        try:
+            if self.executor is None:
+                self.executor = self.new_executor()
+            executor = self.executor
+            try:
+                future = asyncio.get_event_loop().run_in_executor(executor, evaluate_job, job)
+                result = await asyncio.wait_for(future, SCRIPT_WALL_LIMIT)
+            except asyncio.TimeoutError:
+                log.warning("A script worker is stuck; restarting the pool.")
+                self.metrics['timeouts'] += 1
+                self.discard(executor)
+                raise EvaluationError(ScriptTimeout())
+            except BrokenProcessPool:
+                log.warning("A script worker died; restarting the pool.")
+                self.metrics['broken'] += 1
+                self.discard(executor)
+                raise EvaluationError(ScriptTimeout("This alias crashed while running."))
+        finally:
+            self.in_flight -= 1
+            self.metrics['total_time'] += time.monotonic() - start
+        self.metrics['completed'] += 1
+
+        apply_result(evaluator, result)
+        if result['error'] is not None:
+            if isinstance(result['error'], ScriptTimeout):
+                self.metrics['timeouts'] += 1
+            raise EvaluationError(result['error'])
+        return result['output']
+
+    def new_executor(self):
+        """Starts workers from a fresh process rather than forking the bot, whose threads may hold locks that the
+        fork would copy held."""
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method),
+                                   initializer=_init_worker)
+
+    def discard(self, executor):
+        """Stops using an executor and kills its workers, since a stuck worker would otherwise keep its place in the
+        pool forever. Other scripts still running in it fail as crashed."""
+        if self.executor is executor:
+            self.executor = None
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False)
+
+    def stats(self):
+        """:returns str - the pool's metrics, for display."""
+        if not self.workers:
+            return "The script pool is disabled."
+        completed = self.metrics['completed']
+        avg = self.metrics['total_time'] / completed * 1000 if completed else 0
+        return (f"{self.workers} workers, {self.in_flight}/{self.queue_size} in flight "
+                f"(peak {self.metrics['peak_in_flight']})\n"
+                f"{self.metrics['submitted']} submitted, {completed} completed ({avg:.1f}ms avg), "
+                f"{self.metrics['timeouts']} timed out, {self.metrics['broken']} crashed\n"
+                f"{self.metrics['queue_full']} ran in threads because the queue was full, "
+                f"{self.metrics['ineligible']} because they need live state")
+
+
+script_pool = ScriptPool()
+
+
+async def run_parse(evaluator, content):
+    """Runs evaluator.parse(content) in the script pool if it can run there, or in a thread if not."""
+    output = await script_pool.parse(evaluator, content)
+    if output is None:
+        output = await asyncio.get_event_loop().run_in_executor(None, evaluator.parse, content)
+    return output
+
+
+# ==== parent side ====
+def make_job(evaluator, content, gvars):
+    """Snapshots what a script can read."""
+    ctx = evaluator.ctx
+    return {
+        'content': content,
+        'names': dict(evaluator.names),
+        'uvars': evaluator._cache['uvars'],
+        'character': evaluator._cache.get('character'),
+        'gvars': {k: load_gvar(ctx, k) for k in gvars},  # prefetched, so these are cache hits
+        'channel_id': ctx.channel.id,
+        'guild_id': ctx.guild.id if ctx.guild else None,
+        'profile': evaluator.profile.count_nodes if evaluator.profile is not None else None
+    }
+
+
+def apply_result(evaluator, result):
+    """Applies what a script changed in a worker to the evaluator, for run_commits()."""
+    evaluator._cache['uvars'] = result['uvars']
+    evaluator.uvars_changed = result['uvars_changed']
+    if result['character'] is not None:
+        evaluator._cache['character'].character = result['character']
+        evaluator.character_changed = True
+    profile = result['profile']
+    if profile is not None and evaluator.profile is not None:
+        evaluator.profile.blocks.extend(profile.blocks)
+        evaluator.profile.nodes += profile.nodes
+        evaluator.profile.rolls += profile.rolls
+        evaluator.profile.gvars += profile.gvars
+
+
+# ==== worker side ====
+def _init_worker():
+    """Prepares a freshly started worker."""
+    seed_rng()  # workers forked from one forkserver would otherwise share its rolls
+    with gvar_cache_lock:
+        gvar_cache.clear()
+    signal.signal(signal.SIGPROF, _on_cpu_limit)
+
+
+def _on_cpu_limit(signum, frame):
+    raise ScriptTimeout()
+
+
+def _picklable_error(error):
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        if isinstance(error, AvraeException):
+            return AvraeException(str(error))
+        return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+def evaluate_job(job):
+    """Evaluates a pickled script snapshot (see make_job()) in a worker.
+    :returns dict - the output (or error) and everything the script changed."""
+    job = pickle.loads(job)
+    ctx = types.SimpleNamespace(channel=types.SimpleNamespace(id=job['channel_id']),
+                                guild=types.SimpleNamespace(id=job['guild_id']) if job['guild_id'] else None)
+    evaluator = ScriptingEvaluator(ctx)
+    evaluator.uvars_loaded = True  # they are in the snapshot
+    if job['character'] is not None:
+        evaluator.set_character(job['character'])
+    evaluator.names.update(job['names'])
+    evaluator._cache['uvars'].update(job['uvars'])
+    with gvar_cache_lock:
+        gvar_cache.update(job['gvars'])
+    if job['profile'] is not None:
+        evaluator.start_profile(ScriptProfile(count_nodes=job['profile']))
+
+    output = error = None
+    signal.setitimer(signal.ITIMER_PROF, SCRIPT_CPU_LIMIT)
+    try:
+        output = evaluator.parse(job['content'])
+    except EvaluationError as e:
+        error = e.original
+    except ScriptTimeout as e:  # the limit was hit as parse() returned
+        error = e
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+
+    return {
+        'output': output,
+        'error': _picklable_error(error) if error is not None else None,
+        'uvars': evaluator._cache['uvars'],
+        'uvars_changed': evaluator.uvars_changed,
+        'character': evaluator._cache['character'].character if evaluator.character_changed else None,
+        'profile': evaluator.profile
+    }
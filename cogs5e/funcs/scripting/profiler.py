@@ -0,0 +1,121 @@
+"""
+Execution profiles of scripts, for finding the aliases that cost the most to run.
+Time, loops, rolls and gvar loads are cheap to record, so every alias run records them. Counting evaluated nodes
+adds a call to every node, so it is only done for a sample of runs and for !alias profile.
+"""
+import random
+import time
+from collections import Counter, defaultdict
+
+NODE_SAMPLE_RATE = 0.05  # the fraction of alias runs that count evaluated nodes
+STATS_DUMP_INTERVAL = 3600  # seconds
+BLOCK_TEXT_LENGTH = 40  # how much of a block's text to keep
+
+
+class BlockProfile:
+    """The cost of evaluating one {{}}, <> or {} block."""
+    __slots__ = ('text', 'nodes', 'loops', 'rolls', 'gvars', 'time')
+
+    def __init__(self, text, nodes, loops, rolls, gvars, time_):
+        self.text = text
+        self.nodes = nodes
+        self.loops = loops
+        self.rolls = rolls
+        self.gvars = gvars
+        self.time = time_
+
+
+class ScriptProfile:
+    """The cost of one script run, block by block. Filled in by a ScriptingEvaluator (see start_profile())."""
+
+    def __init__(self, count_nodes=None):
+        if count_nodes is None:
+            count_nodes = random.random() < NODE_SAMPLE_RATE
+        self.count_nodes = count_nodes
+        self.blocks = []
+        self.nodes = 0
+        self.rolls = 0
+        self.gvars = 0
+
+    def timed(self, evalblock, evaluator):
+        """Wraps a block evaluation function to record what each block costs."""
+
+        def timed_evalblock(text, *groups):
+            nodes, loops, rolls, gvars = self.nodes, evaluator._loops, self.rolls, self.gvars
+            start = time.perf_counter()
+            try:
+                return evalblock(text, *groups)
+            finally:
+                self.blocks.append(BlockProfile(text[:BLOCK_TEXT_LENGTH], self.nodes - nodes,
+                                                evaluator._loops - loops, self.rolls - rolls, self.gvars - gvars,
+                                                time.perf_counter() - start))
+
+        return timed_evalblock
+
+    def counted(self, func):
+        """Wraps a rolling function to count its calls."""
+
+        def counted_func(*args, **kwargs):
+            self.rolls += 1
+            return func(*args, **kwargs)
+
+        return counted_func
+
+    def totals(self):
+        """:returns Counter - the run's total cost."""
+        totals = Counter(runs=1, loops=sum(b.loops for b in self.blocks), rolls=self.rolls, gvars=self.gvars,
+                         time=sum(b.time for b in self.blocks))
+        if self.count_nodes:
+            totals.update(node_runs=1, nodes=self.nodes)
+        return totals
+
+    def breakdown(self, limit=15):
+        """:returns str - a table of the most expensive blocks, followed by the totals."""
+        lines = [f"{'block':<{BLOCK_TEXT_LENGTH}} {'ms':>8} {'nodes':>7} {'loops':>6} {'rolls':>5} {'gvars':>5}"]
+        for block in sorted(self.blocks, key=lambda b: b.time, reverse=True)[:limit]:
+            nodes = block.nodes if self.count_nodes else '-'
+            lines.append(f"{block.text.replace(chr(10), ' '):<{BLOCK_TEXT_LENGTH}} {block.time * 1000:>8.2f} "
+                         f"{nodes:>7} {block.loops:>6} {block.rolls:>5} {block.gvars:>5}")
+        if len(self.blocks) > limit:
+            lines.append(f"... and {len(self.blocks) - limit} more blocks")
+        totals = self.totals()
+        lines.append(f"{len(self.blocks)} blocks in {totals['time'] * 1000:.2f}ms: "
+                     f"{self.nodes if self.count_nodes else '-'} nodes, {totals['loops']} loops, "
+                     f"{totals['rolls']} rolls, {totals['gvars']} gvar loads")
+        return '\n'.join(lines)
+
+
+class ProfileStats:
+    """Running totals of alias profiles, by alias name and by server, since they were last reset."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Drops the totals, so that they only ever hold the aliases and servers of one dump interval."""
+        self.aliases = defaultdict(Counter)
+        self.servers = defaultdict(Counter)
+
+    def record(self, alias, server, profile):
+        totals = profile.totals()
+        self.aliases[alias].update(totals)
+        self.servers[server].update(totals)
+
+    def top(self, group='aliases', by='time', limit=10):
+        """:returns list - the (name, totals) pairs with the highest total of a stat."""
+        stats = self.aliases if group == 'aliases' else self.servers
+        return sorted(stats.items(), key=lambda i: i[1][by], reverse=True)[:limit]
+
+    def format(self, group='aliases', by='time', limit=10):
+        label = 'alias' if group == 'aliases' else 'server'
+        lines = [f"{label:<24} {'runs':>7} {'total s':>9} {'avg ms':>8} {'avg nodes':>10} {'loops':>8} "
+                 f"{'rolls':>7} {'gvars':>6}"]
+        for name, totals in self.top(group, by, limit):
+            avg_nodes = f"{totals['nodes'] / totals['node_runs']:.0f}" if totals['node_runs'] else '-'
+            lines.append(f"{str(name)[:24]:<24} {totals['runs']:>7} {totals['time']:>9.2f} "
+                         f"{totals['time'] / totals['runs'] * 1000:>8.2f} {avg_nodes:>10} {totals['loops']:>8} "
+                         f"{totals['rolls']:>7} {totals['gvars']:>6}")
+        return '\n'.join(lines)
+
+
+profile_stats = ProfileStats()
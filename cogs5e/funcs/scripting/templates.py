@@ -0,0 +1,190 @@
+"""
+Precompiled alias bodies.
+An alias body is scanned once for its argument slots (%1%, &1&, %*%, &*& and &ARGS&) and for the {{}}, <> and {}
+blocks that the scripting evaluator replaces. Running the alias then fills the slots and evaluates the blocks in
+order, instead of rewriting the body with str.replace and rescanning it with SCRIPTING_RE.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from utils.argparser import argquote, argsplit
+from .helpers import SCRIPTING_RE
+
+TEMPLATE_CACHE_SIZE = 1024
+SLOT_RE = re.compile(r'(?=(%\*%|&\*&|&ARGS&|%\d+%|&\d+&))')  # finds overlapping slots too
+SLOT_MARKERS = (0xE000, 0xF8FF)  # private use characters that stand in for slots while the body is scanned
+UNSAFE_CHARS = re.compile(r'[{}<>%&\\\n]')  # argument text with these could change how the body is scanned
+SLOT_CHARS = frozenset('%&*0123456789ARGS')  # the characters slots are made of
+SLOT_TEXT = re.compile(r'^[*\dARGS]+$')  # a value that could make up the inside of a slot
+
+Block = namedtuple('Block', 'text double ltgt curly')  # a {{}}, <> or {} block, with its SCRIPTING_RE groups
+
+
+class ScriptTemplate:
+    """A scripting string already split into literal text and blocks. ScriptingEvaluator.parse() accepts these in
+    place of a string."""
+
+    def __init__(self, segments):
+        self.segments = segments  # list of str or Block
+
+    def __str__(self):
+        return ''.join(s if isinstance(s, str) else s.text for s in self.segments)
+
+
+class AliasTemplate:
+    """A compiled alias body."""
+
+    def __init__(self, body):
+        self.body = body
+        self.keys = set()  # the slots that appear in the body
+        self.joinable = set()  # slots between characters that, with the right value, could form a new slot
+        self.segments = []  # list of str or Block, or None where a segment has slots to fill
+        self.slotted = []  # list of (index in segments, block kind or None, list of str or slot key)
+        self.compiled = self._compile()
+        self.gvars = find_gvars(body)  # gvars the alias loads by a literal name, to fetch before it runs
+
+    def _compile(self):
+        """Splits the body into segments.
+        :returns bool - False if the body's slots overlap, or a slot sits inside a <> block; either way filling
+        slots in place would not match rewriting the whole body."""
+        spans = [(m.start(), m.start() + len(m.group(1))) for m in SLOT_RE.finditer(self.body)]
+        if any(start < last_end for (_, last_end), (start, _) in zip(spans, spans[1:])):
+            return False
+        if len(spans) > SLOT_MARKERS[1] - SLOT_MARKERS[0] or \
+                any(SLOT_MARKERS[0] <= ord(c) <= SLOT_MARKERS[1] for c in self.body):
+            return False
+
+        slots = [self.body[start:end] for start, end in spans]
+        self.keys = set(slots)
+        for slot, (start, end) in zip(slots, spans):
+            if self.body[start - 1:start] in SLOT_CHARS and self.body[end:end + 1] in SLOT_CHARS:
+                self.joinable.add(slot)
+        marked = []
+        last_end = 0
+        for i, (start, end) in enumerate(spans):
+            marked.append(self.body[last_end:start])
+            marked.append(chr(SLOT_MARKERS[0] + i))
+            last_end = end
+        marked.append(self.body[last_end:])
+        marked = ''.join(marked)
+
+        def pieces(text):
+            out = []
+            last = 0
+            for i, c in enumerate(text):
+                if SLOT_MARKERS[0] <= ord(c) <= SLOT_MARKERS[1]:
+                    out.append(text[last:i])
+                    out.append(slots[ord(c) - SLOT_MARKERS[0]])
+                    last = i + 1
+            out.append(text[last:])
+            return [p for p in out if p]
+
+        last_end = 0
+        for match in SCRIPTING_RE.finditer(marked):
+            if match.start() > last_end:
+                self._add_segment(None, pieces(marked[last_end:match.start()]))
+            kind = 1 if match.group(1) else 2 if match.group(2) else 3
+            block = pieces(match.group(0))
+            if kind == 2 and any(p in self.keys for p in block):
+                return False
+            self._add_segment(kind, block)
+            last_end = match.end()
+        if last_end < len(marked):
+            self._add_segment(None, pieces(marked[last_end:]))
+        return True
+
+    def _add_segment(self, kind, pieces):
+        if not any(p in self.keys for p in pieces):  # nothing to fill, so it can be built now
+            self.segments.append(make_segment(kind, ''.join(pieces)))
+        else:
+            self.slotted.append((len(self.segments), kind, pieces))
+            self.segments.append(None)
+
+    def fill(self, prefix, rawargs):
+        """Fills the body's slots with a message's arguments.
+        :param prefix: The server's command prefix.
+        :param rawargs: The text after the alias name.
+        :returns ScriptTemplate - the filled alias, or None if the arguments need the body to be rewritten and
+        rescanned as a whole."""
+        if not self.compiled or UNSAFE_CHARS.search(prefix) or UNSAFE_CHARS.search(rawargs):
+            return None
+        values, remaining = slot_values(self.keys, rawargs, argsplit(rawargs))
+        if '' in values.values():  # an empty slot could join up the text around it
+            return None
+        if any(SLOT_TEXT.match(values.get(slot, '')) for slot in self.joinable):
+            return None  # rewriting slot by slot could form a new slot out of the value and the text around it
+
+        segments = self.segments[:]
+        for index, kind, pieces in self.slotted:
+            segments[index] = make_segment(kind, ''.join([values.get(p, p) for p in pieces]))
+        segments.insert(0, prefix)
+        segments.append(f" {' '.join(map(argquote, remaining))}")
+
+        # the rewritten body is stripped before it is scanned
+        while segments and isinstance(segments[0], str):
+            segments[0] = segments[0].lstrip()
+            if segments[0]:
+                break
+            segments.pop(0)
+        while segments and isinstance(segments[-1], str):
+            segments[-1] = segments[-1].rstrip()
+            if segments[-1]:
+                break
+            segments.pop()
+        return ScriptTemplate(segments)
+
+
+def make_segment(kind, text):
+    """:returns str or Block - literal text, or a block of the given kind (its SCRIPTING_RE group)."""
+    if kind is None:
+        return text
+    return Block(text, text[2:-2] if kind == 1 else None, text[1:-1] if kind == 2 else None,
+                 text[1:-1] if kind == 3 else None)
+
+
+def find_gvars(script):
+    """Finds the gvars a script loads with a literal name, as script_requirements() does, leaving out names that
+    still have argument slots to fill.
+    :returns frozenset - the gvar keys."""
+    from .evaluators import script_requirements  # evaluators imports this module
+    return frozenset(key for key in script_requirements(script)[1] if not SLOT_RE.search(key))
+
+
+def slot_values(keys, rawargs, args):
+    """Works out what each slot in an alias is replaced with, and which arguments are left over to append.
+    :returns tuple - (dict of slot -> text, list of leftover arguments)"""
+    values = {}
+    tempargs = args[:]
+    if '%*%' in keys:
+        values['%*%'] = argquote(rawargs) if ' ' in rawargs else rawargs
+        tempargs = []
+    if '&*&' in keys:
+        values['&*&'] = rawargs.replace("\"", "\\\"").replace("'", "\\'")
+        tempargs = []
+    if '&ARGS&' in keys:
+        values['&ARGS&'] = str(tempargs)
+        tempargs = []
+    for index, value in enumerate(args):
+        key = '%{}%'.format(index + 1)
+        to_remove = False
+        if key in keys:
+            values[key] = argquote(value) if ' ' in value else value
+            to_remove = True
+        key = '&{}&'.format(index + 1)
+        if key in keys:
+            values[key] = value.replace("\"", "\\\"").replace("'", "\\'")
+            to_remove = True
+        if to_remove:
+            try:
+                tempargs.remove(value)
+            except ValueError:
+                pass
+    return values, tempargs
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def get_alias_template(body):
+    """Gets the compiled template of an alias body, compiling it on first use.
+    :returns AliasTemplate"""
+    return AliasTemplate(body)
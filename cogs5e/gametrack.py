@@ -284,7 +284,7 @@ class GameTrack(commands.Cog):
         choices = await get_spell_choices(ctx)
         for spell_ in character.get_raw_spells():
             if isinstance(spell_, str):
-                spell, strict = search(c.spells, spell_, lambda sp: sp.name)
+                spell, strict = search(c.spell_index, spell_, lambda sp: sp.name)
                 if spell is None or not strict:
                     continue
                 spells_known[str(spell.level)] = spells_known.get(str(spell.level), []) + [spell.name]
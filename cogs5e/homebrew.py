@@ -9,6 +9,7 @@ from cogs5e.models.errors import NoActiveBrew, NoSelectionElements
 from cogs5e.models.homebrew.bestiary import Bestiary, bestiary_from_critterdb, select_bestiary
 from cogs5e.models.homebrew.pack import Pack, select_pack
 from cogs5e.models.homebrew.tome import Tome, select_tome
+from utils.dataloader import get_loader
 from utils.functions import confirm
 
 BREWER_ROLES = ("server brewer", "dragonspeaker")
@@ -79,6 +80,7 @@ class Homebrew(commands.Cog):
 
         if resp:
             await self.bot.mdb.bestiaries.delete_one({"critterdb_id": bestiary.id})
+            get_loader(ctx).invalidate(('bestiary', str(ctx.author.id)))
             return await ctx.send('{} has been deleted.'.format(bestiary.name))
         else:
             return await ctx.send("OK, cancelling.")
@@ -314,7 +314,7 @@ class InitTracker(commands.Cog):
         group = args.last('group')
         controller = str(ctx.author.id)
         private = args.last('h', type_=bool)
-        bonus = roll(bonus).total
+        bonus = roll(bonus, total_only=True).total
 
         combat = await Combat.from_ctx(ctx)
 
@@ -826,7 +826,7 @@ class InitTracker(commands.Cog):
             damage = a['damage'] if a['damage'] is not None else 'no'
             if a['attackBonus'] is not None:
                 try:
-                    bonus = roll(a['attackBonus']).total
+                    bonus = roll(a['attackBonus'], total_only=True).total
                 except:
                     bonus = a['attackBonus']
                 tempAttacks.append(f"**{a['name']}:** +{bonus} To Hit, {damage} damage.")
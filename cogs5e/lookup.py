@@ -15,6 +15,7 @@ from cogs5e.models.embeds import EmbedWithAuthor, add_homebrew_footer
 from cogs5e.models.errors import NoActiveBrew
 from cogs5e.models.homebrew.pack import Pack
 from utils import checks
+from utils.dataloader import get_loader
 from utils.functions import ABILITY_MAP, generate_token, get_positivity, parse_data_entry, search_and_select
 
 CLASS_RESOURCE_MAP = {'slots': "Spell Slots",  # a weird one - see fighter
@@ -54,7 +55,7 @@ class Lookup(commands.Cog):
     @commands.command(aliases=['status'])
     async def condition(self, ctx, *, name: str):
         """Looks up a condition."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
 
         destination = ctx.author if pm else ctx.channel
@@ -72,7 +73,7 @@ class Lookup(commands.Cog):
     @commands.command()
     async def rule(self, ctx, *, name: str):
         """Looks up a rule."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
 
         destination = ctx.author if pm else ctx.channel
@@ -94,7 +95,7 @@ class Lookup(commands.Cog):
     @commands.command()
     async def feat(self, ctx, *, name: str):
         """Looks up a feat."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
         destination = ctx.author if pm else ctx.channel
 
@@ -118,7 +119,7 @@ class Lookup(commands.Cog):
     @commands.command()
     async def racefeat(self, ctx, *, name: str):
         """Looks up a racial feature."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
         destination = ctx.author if pm else ctx.channel
 
@@ -138,7 +139,7 @@ class Lookup(commands.Cog):
     @commands.command()
     async def race(self, ctx, *, name: str):
         """Looks up a race."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
         destination = ctx.author if pm else ctx.channel
 
@@ -164,7 +165,7 @@ class Lookup(commands.Cog):
     @commands.command()
     async def classfeat(self, ctx, *, name: str):
         """Looks up a class feature."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
         destination = ctx.author if pm else ctx.channel
 
@@ -184,7 +185,7 @@ class Lookup(commands.Cog):
     @commands.command(name='class')
     async def _class(self, ctx, name: str, level: int = None):
         """Looks up a class, or all features of a certain level."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
         destination = ctx.author if pm else ctx.channel
 
@@ -256,7 +257,7 @@ class Lookup(commands.Cog):
     @commands.command()
     async def subclass(self, ctx, name: str):
         """Looks up a subclass."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
         destination = ctx.author if pm else ctx.channel
 
@@ -282,7 +283,7 @@ class Lookup(commands.Cog):
     @commands.command()
     async def background(self, ctx, *, name: str):
         """Looks up a background."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
 
         result, metadata = await search_and_select(ctx, c.backgrounds, name, lambda e: e.name, return_metadata=True)
@@ -349,6 +350,7 @@ class Lookup(commands.Cog):
 
         if guild_settings:
             await self.bot.mdb.lookupsettings.update_one({"server": guild_id}, {"$set": guild_settings}, upsert=True)
+            get_loader(ctx).put(('lookupsettings', guild_id), guild_settings)
             await ctx.send("Lookup settings set:\n" + out)
         else:
             await ctx.send("No settings found. Make sure your syntax is correct.")
@@ -396,7 +398,7 @@ class Lookup(commands.Cog):
         """Looks up a monster.
         Generally requires a Game Master role to show full stat block.
         Game Master Roles: GM, DM, Game Master, Dungeon Master"""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
         pm_dm = guild_settings.get("pm_dm", False)
         req_dm_monster = guild_settings.get("req_dm_monster", True)
@@ -531,7 +533,7 @@ class Lookup(commands.Cog):
     @commands.command()
     async def spell(self, ctx, *, name: str):
         """Looks up a spell."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
 
         self.bot.rdb.incr('spells_looked_up_life')
@@ -594,7 +596,7 @@ class Lookup(commands.Cog):
     @commands.command(name='item')
     async def item_lookup(self, ctx, *, name):
         """Looks up an item."""
-        guild_settings = await self.get_settings(ctx.guild)
+        guild_settings = await self.get_settings(ctx)
         pm = guild_settings.get("pm_result", False)
 
         self.bot.rdb.incr('items_looked_up_life')
@@ -721,10 +723,13 @@ class Lookup(commands.Cog):
         else:
             await ctx.send(embed=embed)
 
-    async def get_settings(self, guild):
-        settings = {}  # default PM settings
-        if guild is not None:
-            settings = await self.bot.mdb.lookupsettings.find_one({"server": str(guild.id)})
+    async def get_settings(self, ctx):
+        if ctx.guild is None:
+            return {}  # default PM settings
+        return await get_loader(ctx).load(('lookupsettings', str(ctx.guild.id)), self._load_settings, ctx.guild)
+
+    async def _load_settings(self, guild):
+        settings = await self.bot.mdb.lookupsettings.find_one({"server": str(guild.id)})
         return settings or {}
 
     async def add_training_data(self, lookup_type, query, result_name, metadata=None):
@@ -15,7 +15,6 @@
  'overrides': {},
  'cvars': {}}
 """
-import asyncio
 import logging
 import random
 import re
@@ -24,11 +23,12 @@ import MeteorClient
 import discord
 
 from cogs5e.funcs.dice import roll
-from cogs5e.funcs.scripting import ScriptingEvaluator
+from cogs5e.funcs.scripting import ScriptingEvaluator, run_parse
 from cogs5e.models.caster import Spellcaster, Spellcasting
 from cogs5e.models.dicecloud.client import DicecloudClient
 from cogs5e.models.errors import ConsumableNotFound, CounterOutOfBounds, InvalidArgument, InvalidSpellLevel, \
     NoCharacter, NoReset, OutdatedSheet
+from utils.dataloader import get_loader
 from utils.functions import get_selection
 
 log = logging.getLogger(__name__)
@@ -57,9 +57,16 @@ class Character(Spellcaster):
 
     @classmethod
     async def from_ctx(cls, ctx):
-        active_character = await ctx.bot.mdb.characters.find_one({"owner": str(ctx.author.id), "active": True})
+        active_character = await get_loader(ctx).load(('character', str(ctx.author.id)), cls._load_active, ctx)
         if active_character is None:
             raise NoCharacter()
+        return active_character
+
+    @classmethod
+    async def _load_active(cls, ctx):
+        active_character = await ctx.bot.mdb.characters.find_one({"owner": str(ctx.author.id), "active": True})
+        if active_character is None:
+            return None
         return cls(active_character, active_character['upstream'])
 
     @classmethod
@@ -215,14 +222,17 @@ class Character(Spellcaster):
             self.character['overrides'] = {}
         self.character['overrides'][override] = value
 
-    async def parse_cvars(self, cstr, ctx):
+    async def parse_cvars(self, cstr, ctx, profile=None):
         """Parses cvars.
         :param ctx: The Context the cvar is parsed in.
-        :param cstr: The string to parse.
+        :param cstr: The string to parse, or a ScriptTemplate of it.
+        :param profile: A ScriptProfile to record the cost of evaluation in.
         :returns string - the parsed string."""
-        evaluator = await (await ScriptingEvaluator.new(ctx)).with_character(self)
+        evaluator = await (await ScriptingEvaluator.new(ctx, cstr)).with_character(self)
+        if profile is not None:
+            evaluator.start_profile(profile)
 
-        out = await asyncio.get_event_loop().run_in_executor(None, evaluator.parse, cstr)
+        out = await run_parse(evaluator, cstr)
         await evaluator.run_commits()
 
         return out
@@ -245,7 +255,7 @@ class Character(Spellcaster):
         for substr in re.split(ops, tempout):
             temp = substr.strip()
             out += str(stat_vars.get(temp, temp)) + " "
-        return roll(out).total
+        return roll(out, total_only=True).total
 
     def get_cvar(self, name):
         return self.character.get('cvars', {}).get(name)
@@ -280,6 +290,10 @@ class Character(Spellcaster):
             {"$set": data},
             upsert=True
         )
+        loader = get_loader(ctx)
+        if data['active']:
+            loader.put(('character', str(ctx.author.id)), self)
+        loader.invalidate(('combat', str(ctx.channel.id)))  # its copy of this character is out of date
 
     async def manual_commit(self, bot, author_id):
         data = self.character
@@ -306,6 +320,7 @@ class Character(Spellcaster):
             {"owner": str(ctx.author.id), "upstream": self.id},
             {"$set": {"active": True}}
         )
+        get_loader(ctx).invalidate(('character', str(ctx.author.id)))
 
     def initialize_consumables(self):
         """Initializes a character's consumable counters. Returns self."""
@@ -31,6 +31,11 @@ class InvalidArgument(AvraeException):
     pass
 
 
+class NoExactDistribution(InvalidArgument):
+    """Raised when the exact distribution of a roll cannot be computed."""
+    pass
+
+
 class EvaluationError(AvraeException):
     """Raised when a cvar evaluation causes an error."""
 
@@ -48,6 +53,22 @@ class FunctionRequiresCharacter(AvraeException):
         super().__init__(msg or "This alias requires an active character.")
 
 
+class UvarWriteError(AvraeException):
+    """Raised when some uvars could not be saved."""
+
+    def __init__(self, names, details=None):
+        super().__init__(f"Failed to save uvars: {', '.join(names) or 'unknown'}")
+        self.names = names
+        self.details = details
+
+
+class ScriptTimeout(AvraeException):
+    """Raised when a script runs longer than it is allowed to."""
+
+    def __init__(self, msg=None):
+        super().__init__(msg or "This alias took too long to run.")
+
+
 class OutdatedSheet(AvraeException):
     """Raised when a feature is used that requires an updated sheet."""
 
@@ -4,6 +4,7 @@ import aiohttp
 
 from cogs5e.models.errors import NoActiveBrew, ExternalImportError, NoSelectionElements, SelectionCancelled
 from cogs5e.models.monster import Monster
+from utils.dataloader import get_loader
 from utils.functions import get_selection
 
 log = logging.getLogger(__name__)
@@ -23,9 +24,16 @@ class Bestiary:
 
     @classmethod
     async def from_ctx(cls, ctx):
-        active_bestiary = await ctx.bot.mdb.bestiaries.find_one({"owner": str(ctx.author.id), "active": True})
+        active_bestiary = await get_loader(ctx).load(('bestiary', str(ctx.author.id)), cls._load_active, ctx)
         if active_bestiary is None:
             raise NoActiveBrew()
+        return active_bestiary
+
+    @classmethod
+    async def _load_active(cls, ctx):
+        active_bestiary = await ctx.bot.mdb.bestiaries.find_one({"owner": str(ctx.author.id), "active": True})
+        if active_bestiary is None:
+            return None
         return cls.from_raw(active_bestiary['critterdb_id'], active_bestiary)
 
     def to_dict(self):
@@ -41,6 +49,7 @@ class Bestiary:
             data,
             True
         )
+        get_loader(ctx).invalidate(('bestiary', str(ctx.author.id)))
         return self
 
     async def set_active(self, ctx):
@@ -52,6 +61,7 @@ class Bestiary:
             {"owner": str(ctx.author.id), "critterdb_id": self.id},
             {"$set": {"active": True}}
         )
+        get_loader(ctx).invalidate(('bestiary', str(ctx.author.id)))
         return self
 
     async def toggle_server_active(self, ctx):
@@ -3,6 +3,7 @@ import copy
 from bson import ObjectId
 
 from cogs5e.models.errors import NoActiveBrew
+from utils.dataloader import get_loader
 from utils.functions import search_and_select
 
 
@@ -29,9 +30,16 @@ class Pack:
 
     @classmethod
     async def from_ctx(cls, ctx):
-        active_pack = await ctx.bot.mdb.packs.find_one({"active": str(ctx.author.id)})
+        active_pack = await get_loader(ctx).load(('pack', str(ctx.author.id)), cls._load_active, ctx)
         if active_pack is None:
             raise NoActiveBrew()
+        return active_pack
+
+    @classmethod
+    async def _load_active(cls, ctx):
+        active_pack = await ctx.bot.mdb.packs.find_one({"active": str(ctx.author.id)})
+        if active_pack is None:
+            return None
         return cls.from_dict(active_pack)
 
     @classmethod
@@ -62,6 +70,7 @@ class Pack:
         await ctx.bot.mdb.packs.update_one(
             {"_id": self._id}, data
         )
+        get_loader(ctx).invalidate(('pack', str(ctx.author.id)))
 
     async def set_active(self, ctx):
         await ctx.bot.mdb.packs.update_many(
@@ -72,6 +81,7 @@ class Pack:
             {"_id": self._id},
             {"$push": {"active": str(ctx.author.id)}}
         )
+        get_loader(ctx).invalidate(('pack', str(ctx.author.id)))
 
     async def toggle_server_active(self, ctx):
         """
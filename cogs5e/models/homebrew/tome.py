@@ -2,6 +2,7 @@ from bson import ObjectId
 
 from cogs5e.models.errors import NoActiveBrew
 from cogs5e.models.spell import Spell
+from utils.dataloader import get_loader
 from utils.functions import search_and_select
 
 
@@ -36,9 +37,16 @@ class Tome:
 
     @classmethod
     async def from_ctx(cls, ctx):
-        active_tome = await ctx.bot.mdb.tomes.find_one({"active": str(ctx.author.id)})
+        active_tome = await get_loader(ctx).load(('tome', str(ctx.author.id)), cls._load_active, ctx)
         if active_tome is None:
             raise NoActiveBrew()
+        return active_tome
+
+    @classmethod
+    async def _load_active(cls, ctx):
+        active_tome = await ctx.bot.mdb.tomes.find_one({"active": str(ctx.author.id)})
+        if active_tome is None:
+            return None
         return cls.from_dict(active_tome)
 
     def to_dict_no_spells(self):
@@ -55,6 +63,7 @@ class Tome:
         await ctx.bot.mdb.tomes.update_one(
             {"_id": self.id}, {"$set": data}
         )
+        get_loader(ctx).invalidate(('tome', str(ctx.author.id)))
 
     async def set_active(self, ctx):
         await ctx.bot.mdb.tomes.update_many(
@@ -65,6 +74,7 @@ class Tome:
             {"_id": self.id},
             {"$push": {"active": str(ctx.author.id)}}
         )
+        get_loader(ctx).invalidate(('tome', str(ctx.author.id)))
 
     async def toggle_server_active(self, ctx):
         """
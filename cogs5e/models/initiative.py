@@ -8,6 +8,7 @@ from cogs5e.models.errors import CombatException, CombatNotFound, RequiresContex
     CombatChannelNotFound, NoCombatants, NoCharacter, InvalidArgument
 from utils.argparser import argparse
 from utils.constants import RESIST_TYPES
+from utils.dataloader import get_loader
 from utils.functions import get_selection
 
 COMBAT_TTL = 60 * 60 * 24 * 7  # 1 week TTL
@@ -36,9 +37,16 @@ class Combat:
 
     @classmethod
     async def from_ctx(cls, ctx):
+        combat = await get_loader(ctx).load(('combat', str(ctx.channel.id)), cls._load, ctx)
+        if combat is None:
+            raise CombatNotFound
+        return combat
+
+    @classmethod
+    async def _load(cls, ctx):
         raw = await ctx.bot.mdb.combats.find_one({"channel": str(ctx.channel.id)})
         if raw is None:
-            raise CombatNotFound
+            return None
         return await cls.from_dict(raw, ctx)
 
     @classmethod
@@ -201,7 +209,7 @@ class Combat:
         Rerolls all combatant initiatives.
         """
         for c in self._combatants:
-            c.init = roll(f"1d20+{c.initMod}").total
+            c.init = roll(f"1d20+{c.initMod}", total_only=True).total
         self.sort_combatants()
 
     async def select_combatant(self, name, choice_message=None, select_group=False):
@@ -327,6 +335,48 @@ class Combat:
             {"$set": self.to_dict(), "$currentDate": {"lastchanged": True}},
             upsert=True
         )
+        self._update_loader(self.get_combatants())
+
+    async def commit_combatants(self, changed):
+        """Commits only some combatants to db, and the characters of those that are players. Falls back to a full
+        commit if the combat in the db no longer lines up with this one.
+        :param changed: A dict of the changed Combatants to their names when the combat was loaded."""
+        if not self.ctx:
+            raise RequiresContext
+        query = {"channel": self.channel}
+        update = {}
+        for n, c in enumerate(self._combatants):
+            if isinstance(c, Combatant):
+                if c not in changed:
+                    continue
+                query[f"combatants.{n}.name"] = changed[c]
+            else:
+                if not any(gc in changed for gc in c.get_combatants()):
+                    continue
+                query[f"combatants.{n}.name"] = c.name
+            update[f"combatants.{n}"] = c.to_dict()
+        if not update:
+            return
+
+        for pc in changed:
+            if isinstance(pc, PlayerCombatant):
+                await pc.character.manual_commit(self.ctx.bot, pc.character_owner)
+        result = await self.ctx.bot.mdb.combats.update_one(
+            query,
+            {"$set": update, "$currentDate": {"lastchanged": True}}
+        )
+        if not result.matched_count:  # combatants were added, removed, or reordered since we loaded
+            await self.commit()
+        else:
+            self._update_loader(changed)
+
+    def _update_loader(self, committed):
+        """Makes later loads in this message see the committed combat, and reload the characters it committed."""
+        loader = get_loader(self.ctx)
+        loader.put(('combat', self.channel), self)
+        for pc in committed:
+            if isinstance(pc, PlayerCombatant):
+                loader.invalidate(('character', pc.character_owner))
 
     def get_summary(self, private=False):
         """Returns the generated summary message content."""
@@ -381,6 +431,7 @@ class Combat:
         for c in self._combatants:
             c.on_remove()
         await self.ctx.bot.mdb.combats.delete_one({"channel": self.channel})
+        get_loader(self.ctx).put(('combat', self.channel), None)
 
     def __str__(self):
         return f"Initiative in <#{self.channel}>"
@@ -31,6 +31,7 @@ from cogs5e.sheets.beyond import BeyondSheetParser
 from cogs5e.sheets.dicecloud import DicecloudParser
 from cogs5e.sheets.gsheet import GoogleSheet
 from utils.argparser import argparse
+from utils.dataloader import get_loader
 from utils.functions import a_or_an, auth_and_chan, format_d20, get_positivity, list_get
 from utils.functions import camel_to_title, extract_gsheet_id_from_url, generate_token, search_and_select, verbose_stat
 
@@ -154,7 +155,7 @@ class SheetManager(commands.Cog):
             damage = a['damage'] if a['damage'] is not None else 'no'
             if a['attackBonus'] is not None:
                 try:
-                    bonus = roll(a['attackBonus']).total
+                    bonus = roll(a['attackBonus'], total_only=True).total
                 except:
                     bonus = a['attackBonus']
                 tempAttacks.append(f"**{a['name']}:** +{bonus} To Hit, {damage} damage.")
@@ -591,6 +592,7 @@ class SheetManager(commands.Cog):
             #         await combat.commit()
 
             await self.bot.mdb.characters.delete_one({"owner": str(ctx.author.id), "upstream": char_url})
+            get_loader(ctx).invalidate(('character', str(ctx.author.id)))
             return await ctx.send('{} has been deleted.'.format(name))
         else:
             return await ctx.send("OK, cancelling.")
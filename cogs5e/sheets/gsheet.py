@@ -350,7 +350,7 @@ class GoogleSheet:
             for cell in row:
                 if cell.value and not cell.value in IGNORED_SPELL_VALUES:
                     value = cell.value.strip()
-                    result = search(c.spells, value, lambda sp: sp.name, strict=True)
+                    result = search(c.spell_index, value, lambda sp: sp.name, strict=True)
                     if result and result[0] and result[1]:
                         spells.append({
                             'name': result[0].name,
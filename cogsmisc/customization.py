@@ -13,10 +13,12 @@ from discord.ext import commands
 from discord.ext.commands import BucketType, UserInputError
 
 from cogs5e.funcs import scripting
-from cogs5e.funcs.scripting import ScriptingEvaluator
+from cogs5e.funcs.scripting import ScriptingEvaluator, get_alias_template
+from cogs5e.funcs.scripting.profiler import ScriptProfile, profile_stats
 from cogs5e.models.character import Character
 from cogs5e.models.errors import AvraeException, EvaluationError, NoCharacter
 from utils.argparser import argquote, argsplit
+from utils.dataloader import get_loader
 from utils.functions import auth_and_chan, clean_content, confirm
 
 ALIASER_ROLES = ("server aliaser", "dragonspeaker")
@@ -60,33 +62,31 @@ class Customization(commands.Cog):
         prefix = self.bot.get_server_prefix(message)
         if message.content.startswith(prefix):
             alias = prefix.join(message.content.split(prefix)[1:]).split(' ')[0]
-            if message.guild:
-                command = (await self.bot.mdb.aliases.find_one({"owner": str(message.author.id), "name": alias},
-                                                               ['commands'])) or \
-                          (await self.bot.mdb.servaliases.find_one({"server": str(message.guild.id), "name": alias},
-                                                                   ['commands']))
-            else:
-                command = await self.bot.mdb.aliases.find_one({"owner": str(message.author.id), "name": alias},
-                                                              ['commands'])
+            if alias in self.bot.all_commands:  # aliases cannot shadow built-in commands
+                return
+            command = await self.get_alias_command(message, alias)
             if command:
-                command = command['commands']
                 try:
-                    message.content = self.handle_alias_arguments(command, message)
+                    content = self.handle_alias_arguments(command, message)
+                    message.content = str(content)
                 except UserInputError as e:
                     return await message.channel.send(f"Invalid input: {e}")
                 ctx = Context(self.bot, message)
+                await scripting.prefetch_gvars(ctx, get_alias_template(command).gvars)
                 char = None
                 try:
                     char = await Character.from_ctx(ctx)
                 except NoCharacter:
                     pass
 
+                profile = ScriptProfile()
                 try:
                     if char:
-                        message.content = await char.parse_cvars(message.content, ctx)
+                        message.content = await char.parse_cvars(content, ctx, profile)
                     else:
-                        message.content = await self.parse_no_char(message.content, ctx)
+                        message.content = await self.parse_no_char(content, ctx, profile)
                 except EvaluationError as err:
+                    get_loader(ctx).clear()  # the script may have changed what it loaded without saving it
                     e = err.original
                     if not isinstance(e, AvraeException):
                         tb = ''.join(traceback.format_exception(type(e), e, e.__traceback__, limit=0, chain=False))
@@ -96,14 +96,40 @@ class Customization(commands.Cog):
                             pass
                     return await message.channel.send(err)
                 except Exception as e:
+                    get_loader(ctx).clear()
                     return await message.channel.send(e)
+                finally:
+                    profile_stats.record(alias, str(message.guild.id) if message.guild else 'DM', profile)
                 await self.bot.process_commands(message)
 
+    async def get_alias_command(self, message, alias):
+        """Gets the commands of the user or server alias a message would run.
+        :returns str - the alias's commands, or None if there is no such alias."""
+        command = None
+        owner_id = str(message.author.id)
+        if alias in await scripting.get_alias_names(self.bot, owner_id):
+            command = await self.bot.mdb.aliases.find_one({"owner": owner_id, "name": alias}, ['commands'])
+        if command is None and message.guild:
+            server_id = str(message.guild.id)
+            if alias in await scripting.get_servalias_names(self.bot, server_id):
+                command = await self.bot.mdb.servaliases.find_one({"server": server_id, "name": alias},
+                                                                  ['commands'])
+        return command['commands'] if command else None
+
     def handle_alias_arguments(self, command, message):
         """Takes an alias name, alias value, and message and handles percent-encoded args.
-        Returns: string"""
+        Returns: string, or a ScriptTemplate to parse in its place if the alias's compiled template can be filled"""
         prefix = self.bot.get_server_prefix(message)
         rawargs = " ".join(prefix.join(message.content.split(prefix)[1:]).split(' ')[1:])
+        return self.fill_alias_arguments(command, prefix, rawargs)
+
+    @staticmethod
+    def fill_alias_arguments(command, prefix, rawargs):
+        """Fills an alias's percent-encoded args from the text after its name.
+        Returns: string, or a ScriptTemplate to parse in its place if the alias's compiled template can be filled"""
+        filled = get_alias_template(command).fill(prefix, rawargs)
+        if filled is not None:
+            return filled
         args = argsplit(rawargs)
         tempargs = args[:]
         new_command = command
@@ -135,16 +161,19 @@ class Customization(commands.Cog):
         quoted_args = ' '.join(map(argquote, tempargs))
         return f"{prefix}{new_command} {quoted_args}".strip()
 
-    async def parse_no_char(self, cstr, ctx):
+    async def parse_no_char(self, cstr, ctx, profile=None):
         """
         Parses cvars and whatnot without an active character.
-        :param cstr: The string to parse.
+        :param cstr: The string to parse, or a ScriptTemplate of it.
         :param ctx: The Context to parse the string in.
+        :param profile: A ScriptProfile to record the cost of evaluation in.
         :return: The parsed string.
         :rtype: str
         """
-        evaluator = await ScriptingEvaluator.new(ctx)
-        out = await asyncio.get_event_loop().run_in_executor(None, evaluator.parse, cstr)
+        evaluator = await ScriptingEvaluator.new(ctx, cstr)
+        if profile is not None:
+            evaluator.start_profile(profile)
+        out = await scripting.run_parse(evaluator, cstr)
         await evaluator.run_commits()
         return out
 
@@ -172,6 +201,7 @@ class Customization(commands.Cog):
 
         await self.bot.mdb.aliases.update_one({"owner": str(ctx.author.id), "name": alias_name},
                                               {"$set": {"commands": cmds.lstrip('!')}}, True)
+        scripting.invalidate_alias_names(owner_id=str(ctx.author.id))
         await ctx.send(f'Alias `{ctx.prefix}{alias_name}` added for command:\n`{ctx.prefix}{cmds.lstrip("!")}`')
 
     @alias.command(name='list')
@@ -182,10 +212,40 @@ class Customization(commands.Cog):
         sorted_aliases = sorted(aliases)
         return await ctx.send('Your aliases:\n{}'.format(', '.join(sorted_aliases)))
 
+    @alias.command(name='profile')
+    async def alias_profile(self, ctx, alias_name, *, args=''):
+        """Shows what each part of an alias costs to evaluate.
+        The alias is evaluated with the given arguments, but its command is not run, and changes it makes to your
+        character, combat, or uvars are not saved."""
+        command = await self.get_alias_command(ctx.message, alias_name)
+        if command is None:
+            return await ctx.send('Alias not found.')
+        try:
+            content = self.fill_alias_arguments(command, ctx.prefix, args)
+        except UserInputError as e:
+            return await ctx.send(f"Invalid input: {e}")
+
+        await scripting.prefetch_gvars(ctx, get_alias_template(command).gvars)
+        evaluator = await ScriptingEvaluator.new(ctx, content)
+        try:
+            await evaluator.with_character(await Character.from_ctx(ctx))
+        except NoCharacter:
+            pass
+        profile = ScriptProfile(count_nodes=True)
+        evaluator.start_profile(profile)
+        try:
+            out = await self.bot.loop.run_in_executor(None, evaluator.parse, content)
+        except EvaluationError as err:
+            out = str(err)
+        # no run_commits(): this is a dry run
+
+        await ctx.send(f"```\n{profile.breakdown()}\n```\n**Result**: `{textwrap.shorten(out, 500)}`")
+
     @alias.command(name='delete', aliases=['remove'])
     async def alias_delete(self, ctx, alias_name):
         """Deletes a user alias."""
         result = await self.bot.mdb.aliases.delete_one({"owner": str(ctx.author.id), "name": alias_name})
+        scripting.invalidate_alias_names(owner_id=str(ctx.author.id))
         if not result.deleted_count:
             return await ctx.send('Alias not found.')
         await ctx.send('Alias {} removed.'.format(alias_name))
@@ -201,6 +261,7 @@ class Customization(commands.Cog):
             return await ctx.send("Unconfirmed. Aborting.")
 
         await self.bot.mdb.aliases.delete_many({"owner": str(ctx.author.id)})
+        scripting.invalidate_alias_names(owner_id=str(ctx.author.id))
         return await ctx.send("OK. I have deleted all your aliases.")
 
     @commands.group(invoke_without_command=True, aliases=['serveralias'])
@@ -231,6 +292,7 @@ class Customization(commands.Cog):
 
         await self.bot.mdb.servaliases.update_one({"server": str(ctx.guild.id), "name": alias_name},
                                                   {"$set": {"commands": cmds.lstrip('!')}}, True)
+        scripting.invalidate_alias_names(server_id=str(ctx.guild.id))
         await ctx.send(f'Server alias `{ctx.prefix}{alias_name}` added for command:\n`{ctx.prefix}{cmds.lstrip("!")}`')
 
     @servalias.command(name='list')
@@ -251,6 +313,7 @@ class Customization(commands.Cog):
             return await ctx.send("You do not have permission to edit server aliases. Either __Administrator__ "
                                   "Discord permissions or a role called \"Server Aliaser\" is required.")
         result = await self.bot.mdb.servaliases.delete_one({"server": str(ctx.guild.id), "name": alias_name})
+        scripting.invalidate_alias_names(server_id=str(ctx.guild.id))
         if not result.deleted_count:
             return await ctx.send('Server alias not found.')
         await ctx.send('Server alias {} removed.'.format(alias_name))
@@ -281,6 +344,7 @@ class Customization(commands.Cog):
         if len(snipname) < 2: return await ctx.send("Snippets must be at least 2 characters long!")
         await self.bot.mdb.snippets.update_one({"owner": str(ctx.author.id), "name": snipname},
                                                {"$set": {"snippet": snippet}}, True)
+        scripting.invalidate_snippets(owner_id=str(ctx.author.id))
         await ctx.send('Shortcut {} added for arguments:\n`{}`'.format(snipname, snippet))
 
     @snippet.command(name='list')
@@ -293,6 +357,7 @@ class Customization(commands.Cog):
     async def snippet_delete(self, ctx, snippet_name):
         """Deletes a snippet."""
         result = await self.bot.mdb.snippets.delete_one({"owner": str(ctx.author.id), "name": snippet_name})
+        scripting.invalidate_snippets(owner_id=str(ctx.author.id))
         if not result.deleted_count:
             return await ctx.send('Snippet not found.')
         await ctx.send('Shortcut {} removed.'.format(snippet_name))
@@ -308,6 +373,7 @@ class Customization(commands.Cog):
             return await ctx.send("Unconfirmed. Aborting.")
 
         await self.bot.mdb.snippets.delete_many({"owner": str(ctx.author.id)})
+        scripting.invalidate_snippets(owner_id=str(ctx.author.id))
         return await ctx.send("OK. I have deleted all your snippets.")
 
     @commands.group(invoke_without_command=True)
@@ -332,6 +398,7 @@ class Customization(commands.Cog):
             if len(snipname) < 2: return await ctx.send("Snippets must be at least 2 characters long!")
             await self.bot.mdb.servsnippets.update_one({"server": server_id, "name": snipname},
                                                        {"$set": {"snippet": snippet}}, True)
+            scripting.invalidate_snippets(server_id=server_id)
             await ctx.send('Server snippet {} added for arguments:\n`{}`'.format(snipname, snippet))
         else:
             return await ctx.send("You do not have permission to edit server snippets. Either __Administrator__ "
@@ -355,6 +422,7 @@ class Customization(commands.Cog):
             return await ctx.send("You do not have permission to edit server snippets. Either __Administrator__ "
                                   "Discord permissions or a role called \"Server Aliaser\" is required.")
         result = await self.bot.mdb.servsnippets.delete_one({"server": str(ctx.guild.id), "name": snippet_name})
+        scripting.invalidate_snippets(server_id=str(ctx.guild.id))
         if not result.deleted_count:
             return await ctx.send('Snippet not found.')
         await ctx.send('Server snippet {} removed.'.format(snippet_name))
@@ -393,6 +461,7 @@ class Customization(commands.Cog):
     async def uvar_remove(self, ctx, name):
         """Deletes a uvar from the user."""
         result = await self.bot.mdb.uvars.delete_one({"owner": str(ctx.author.id), "name": name})
+        get_loader(ctx).invalidate(('uvars', str(ctx.author.id)))
         if not result.deleted_count:
             return await ctx.send("Uvar does not exist.")
         await ctx.send('User variable {} removed.'.format(name))
@@ -414,6 +483,7 @@ class Customization(commands.Cog):
             return await ctx.send("Unconfirmed. Aborting.")
 
         await self.bot.mdb.uvars.delete_many({"owner": str(ctx.author.id)})
+        get_loader(ctx).invalidate(('uvars', str(ctx.author.id)))
         return await ctx.send("OK. I have deleted all your uvars.")
 
     @commands.group(invoke_without_command=True, aliases=['gvar'])
@@ -438,6 +508,7 @@ class Customization(commands.Cog):
         data = {'key': name, 'owner': str(ctx.author.id), 'owner_name': str(ctx.author), 'value': value,
                 'editors': []}
         await self.bot.mdb.gvars.insert_one(data)
+        scripting.invalidate_gvar(name)
         await ctx.send(f"Created global variable `{name}`.")
 
     @globalvar.command(name='edit')
@@ -450,6 +521,7 @@ class Customization(commands.Cog):
             return await ctx.send("You are not allowed to edit this variable.")
         else:
             await self.bot.mdb.gvars.update_one({"key": name}, {"$set": {"value": value}})
+            scripting.invalidate_gvar(name)
         await ctx.send(f'Global variable `{name}` edited.')
 
     @globalvar.command(name='editor')
@@ -486,6 +558,7 @@ class Customization(commands.Cog):
         else:
             if await confirm(ctx, f"Are you sure you want to delete `{name}`?"):
                 await self.bot.mdb.gvars.delete_one({"key": name})
+                scripting.invalidate_gvar(name)
             else:
                 return await ctx.send("Ok, cancelling.")
 
@@ -3,11 +3,21 @@ Created on Jul 17, 2017
 
 @author: andrew
 """
+import asyncio
+import logging
 import time
 from collections import Counter
 
 from discord.ext import commands
 
+from cogs5e.funcs.dice import parse_cache_info
+from cogs5e.funcs.scripting.evaluators import ast_cache_info
+from cogs5e.funcs.scripting.pool import script_pool
+from cogs5e.funcs.scripting.profiler import STATS_DUMP_INTERVAL, profile_stats
+from utils.dataloader import loader_stats
+
+log = logging.getLogger(__name__)
+
 
 class Stats(commands.Cog):
     """Statistics about bot usage."""
@@ -18,6 +28,19 @@ class Stats(commands.Cog):
         self.socket_stats = Counter()
         self.socket_bandwidth = Counter()
         self.start_time = time.monotonic()
+        self.bot.loop.create_task(self.dump_alias_stats())
+
+    async def dump_alias_stats(self):
+        try:
+            await self.bot.wait_until_ready()
+            while not self.bot.is_closed():
+                await asyncio.sleep(STATS_DUMP_INTERVAL)
+                if profile_stats.aliases:
+                    log.info(f"Most expensive aliases:\n{profile_stats.format()}\n"
+                             f"Most expensive servers:\n{profile_stats.format('servers')}")
+                profile_stats.reset()
+        except asyncio.CancelledError:
+            pass
 
     async def on_command(self, ctx):
         command = ctx.command.qualified_name
@@ -62,6 +85,37 @@ class Stats(commands.Cog):
         await ctx.send('{0} bytes of socket events observed ({1:.2f}/minute):\n{2}'
                        .format(total, cpm, self.socket_bandwidth))
 
+    @commands.command(hidden=True)
+    async def cachestats(self, ctx):
+        """Shows the hit rates of the roll and script parse caches, and the loads saved by sharing data within a
+        message.
+        This is only for the current session."""
+        out = []
+        for name, info in (('Roll programs', parse_cache_info()), ('Script expressions', ast_cache_info())):
+            lookups = info.hits + info.misses
+            rate = info.hits / lookups if lookups else 0
+            out.append(f"{name}: {info.hits}/{lookups} hits ({rate:.1%}), {info.currsize}/{info.maxsize} cached")
+        saved = ', '.join(f"{kind} {count}" for kind, count in loader_stats.most_common()) or 'none'
+        out.append(f"Loads saved: {saved}")
+        await ctx.send('```\n{}\n```'.format('\n'.join(out)))
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def aliasstats(self, ctx, by='time', limit=10, group='aliases'):
+        """Shows the aliases (or servers, with group "servers") that cost the most to evaluate.
+        Sorts by time, loops, rolls, gvars, or nodes. Nodes are only counted for a sample of runs.
+        This only covers the time since the stats were last dumped to the log, at most an hour."""
+        if by not in ('time', 'loops', 'rolls', 'gvars', 'nodes', 'runs'):
+            return await ctx.send("Sort by one of time, loops, rolls, gvars, nodes, or runs.")
+        await ctx.send('```\n{}\n```'.format(profile_stats.format(group, by, limit)))
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def poolstats(self, ctx):
+        """Shows how busy the script evaluation pool is.
+        This is only for the current session."""
+        await ctx.send('```\n{}\n```'.format(script_pool.stats()))
+
 
 def setup(bot):
     bot.add_cog(Stats(bot))
@@ -13,6 +13,7 @@ from discord.ext import commands
 from discord.ext.commands.errors import CommandInvokeError
 
 from cogs5e.models.errors import AvraeException, EvaluationError
+from utils.dataloader import get_loader
 from utils.functions import discord_trim, gen_error_message, get_positivity
 from utils.redisIO import RedisIO
 
@@ -130,6 +131,7 @@ async def on_resumed():
 async def on_command_error(ctx, error):
     if isinstance(error, commands.CommandNotFound):
         return
+    get_loader(ctx).clear()  # what the command loaded may hold changes it never saved
     log.debug("Error caused by message: `{}`".format(ctx.message.content))
     log.debug('\n'.join(traceback.format_exception(type(error), error, error.__traceback__)))
     if isinstance(error, AvraeException):
@@ -0,0 +1,159 @@
+"""
+Benchmarks the dice engine over a corpus of realistic roll strings, and checks its output against a recording.
+Run from the repository root:
+    python -m test.benchmarks.dice_engine            # time the corpus and compare it to the saved baseline
+    python -m test.benchmarks.dice_engine --save     # save this run as the new baseline
+    python -m test.benchmarks.dice_engine --check    # compare seeded output to the recorded reference output
+    python -m test.benchmarks.dice_engine --record   # record the current output as the reference
+An optimized engine must pass --check: for the same seed, it has to produce the same totals and text.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+from cogs5e.funcs.dice import roll, roll_many, seed_rng
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'dice_engine.json')
+REFERENCE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'dice_engine_reference.json')
+REFERENCE_SEED = 2018
+REFERENCE_ROLLS = 20
+TARGET_TIME = 0.2  # seconds to spend timing each case
+
+# (name, roll string, keyword arguments to roll())
+CORPUS = [
+    ('d20', '1d20', {}),
+    ('d20 advantage', '1d20', {'adv': 1}),
+    ('attack', '1d20+7 Longsword', {}),
+    ('attack inline', '1d20+7', {'inline': True}),
+    ('damage', '2d6+1d8[fire]+4[slashing] Flame Tongue', {}),
+    ('fireball', '8d6[fire]', {}),
+    ('total only', '1d20+5', {'total_only': True}),
+    ('stats', '4d6kh3', {}),
+    ('elven accuracy', '3d20kh1+5', {}),
+    ('disadvantage', '2d20kl1-1', {}),
+    ('great weapon fighting', '2d6ro<3+5', {}),
+    ('halfling luck', '1d20ro1+3', {}),
+    ('reroll', '4d6rr1', {}),
+    ('exploding', '6d6e6', {}),
+    ('reroll and add', '5d10ra10', {}),
+    ('min and max', '10d8mi2ma7', {}),
+    ('arithmetic', '(1d8+4)*2-1d4/2', {}),
+    ('300 dice', '300d6', {}),
+    ('300 exploding', '300d6e6', {}),
+    ('300 reroll and keep', '300d20rr<10kh100', {}),
+]
+
+# (name, roll string, iterations) - run through roll_many(), as !multiroll and !iterroll do
+BATCH_CORPUS = [
+    ('multiroll', '1d20+5', 100),
+    ('stat block', '4d6kh3', 6),
+    ('iterroll sequential', '2d6ro<3+5', 50),
+]
+
+
+def cases():
+    for name, rollStr, kwargs in CORPUS:
+        yield name, lambda r=rollStr, k=kwargs: roll(r, **k)
+    for name, rollStr, iterations in BATCH_CORPUS:
+        yield name, lambda r=rollStr, i=iterations: roll_many(r, i)
+
+
+def render(result):
+    """Forces a result's text to be built, as a caller sending it would."""
+    return [(r.total, r.result) for r in (result if isinstance(result, list) else [result])]
+
+
+def measure(func):
+    """:returns dict - rolls per second and the peak bytes allocated while rolling once."""
+    number = 1
+    while True:
+        elapsed = timeit.timeit(lambda: render(func()), number=number)
+        if elapsed > TARGET_TIME / 5:
+            break
+        number *= 4
+    number = max(int(number * TARGET_TIME / elapsed), 1)
+    best = min(timeit.repeat(lambda: render(func()), number=number, repeat=3))
+
+    tracemalloc.start()
+    render(func())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'ops_per_sec': round(number / best, 1), 'peak_bytes': peak}
+
+
+def benchmark(save=False):
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    print(f"{'case':<24}{'rolls/sec':>12}{'peak KiB':>10}{'vs. baseline':>14}")
+    for name, func in cases():
+        results[name] = measure(func)
+        old = baseline.get(name)
+        change = f"x{results[name]['ops_per_sec'] / old['ops_per_sec']:.2f}" if old else '-'
+        print(f"{name:<24}{results[name]['ops_per_sec']:>12.1f}{results[name]['peak_bytes'] / 1024:>10.1f}"
+              f"{change:>14}")
+
+    if save:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({'python': platform.python_version(), 'results': results}, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {BASELINE_PATH}.")
+
+
+def reference_output():
+    """Returns the output of every case for REFERENCE_SEED.
+    :returns dict - case name -> {'totals': the totals of REFERENCE_ROLLS rolls, 'text': a hash of their text}"""
+    out = {}
+    for name, func in cases():
+        seed_rng(REFERENCE_SEED)
+        rendered = [pair for _ in range(REFERENCE_ROLLS) for pair in render(func())]
+        text = hashlib.sha1('\n'.join(text for _, text in rendered).encode()).hexdigest()
+        out[name] = {'totals': [total for total, _ in rendered], 'text': text}
+    return out
+
+
+def check():
+    """Compares seeded output to the recorded reference output.
+    :returns list - the names of cases whose output differs."""
+    with open(REFERENCE_PATH) as f:
+        reference = json.load(f)
+    current = reference_output()
+    return [name for name in reference if current.get(name) != reference[name]]
+
+
+def record():
+    with open(REFERENCE_PATH, 'w') as f:
+        reference = reference_output()
+        f.write('{\n' + ',\n'.join(f"  {json.dumps(name)}: {json.dumps(reference[name], sort_keys=True)}"
+                                   for name in sorted(reference)) + '\n}\n')  # one line per case
+    print(f"Recorded reference output to {REFERENCE_PATH}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the dice engine.")
+    parser.add_argument('--save', action='store_true', help="save this run as the new baseline")
+    parser.add_argument('--check', action='store_true', help="compare output to the recorded reference output")
+    parser.add_argument('--record', action='store_true', help="record the current output as the reference output")
+    args = parser.parse_args()
+
+    if args.record:
+        return record()
+    if args.check:
+        mismatches = check()
+        if mismatches:
+            print(f"Output differs from the reference for: {', '.join(mismatches)}")
+            sys.exit(1)
+        return print("Output matches the reference.")
+    benchmark(args.save)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Times SingleDiceGroup.reroll() on growing numbers of dice, up to the 300 dice a roll may have, and checks that the
+time per die stays flat.
+Run from the repository root: python -m test.benchmarks.reroll_scaling
+"""
+import sys
+import timeit
+
+from cogs5e.funcs.dice import Roll, seed_rng
+
+DICE_COUNTS = (10, 30, 100, 300)
+OPERATORS = ('rr<6', 'ro1', 'ra6', 'e6', 'rr<6e6')
+MAX_SLOWDOWN = 2  # how much slower per die the largest roll may be than the smallest
+
+
+def time_per_die(num_dice, operators, repeat=5):
+    dice = f"{num_dice}d6{operators}"
+    runs = max(3000 // num_dice, 5)
+    roller = Roll()
+    best = min(timeit.repeat(lambda: roller.roll_one(dice), number=runs, repeat=repeat))
+    return best / runs / num_dice
+
+
+def main():
+    seed_rng(0)
+    ok = True
+    for operators in OPERATORS:
+        times = [time_per_die(n, operators) for n in DICE_COUNTS]
+        slowdown = times[-1] / times[0]
+        ok = ok and slowdown < MAX_SLOWDOWN
+        print(f"{operators:>8}: " + ' | '.join(f"{n}d6: {t * 1e6:.2f}us/die" for n, t in zip(DICE_COUNTS, times))
+              + f" | x{slowdown:.2f}")
+    if not ok:
+        print(f"Time per die grew more than {MAX_SLOWDOWN}x.")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
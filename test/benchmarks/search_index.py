@@ -0,0 +1,97 @@
+"""
+Times searching a synthetic homebrew corpus of up to 50,000 spells: the full scan search() did before, search() on a
+plain list with top-k fuzzy scoring, and a SearchIndex built once, as the compendium's is.
+Run from the repository root: python -m test.benchmarks.search_index
+"""
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from fuzzywuzzy import fuzz, process
+
+from utils.functions import search
+from utils.searchindex import SearchIndex
+
+CORPUS_SIZES = (1000, 5000, 20000, 50000)
+QUERIES = 20
+SYLLABLES = ("ar", "bel", "cor", "dra", "el", "fir", "gor", "hal", "is", "jor", "kal", "lum", "mor", "nex", "or", "pyr",
+             "quel", "ros", "sil", "thar", "um", "vor", "wyn", "xan", "yl", "zor")
+WORDS = ("Blast", "Bolt", "Ward", "Touch", "Storm", "Wall", "Shield", "Curse", "Step", "Sphere", "Hand", "Mark")
+
+
+def make_corpus(size, seed=0):
+    rand = random.Random(seed)
+    names = set()
+    while len(names) < size:
+        word = ''.join(rand.choice(SYLLABLES) for _ in range(rand.randint(2, 4))).title()
+        names.add(f"{word}'s {rand.choice(WORDS)}" if rand.random() < 0.5 else f"{rand.choice(WORDS)} of {word}")
+    return [SimpleNamespace(name=n) for n in sorted(names)]
+
+
+def make_queries(corpus, seed=1):
+    """Names with a typo, so that every search falls through to fuzzy matching, and words in many names."""
+    rand = random.Random(seed)
+    queries = [word.lower() for word in WORDS[:3]]
+    for entry in rand.sample(corpus, QUERIES):
+        name = list(entry.name.lower())
+        i = rand.randrange(len(name) - 1)
+        name[i], name[i + 1] = name[i + 1], name[i]
+        queries.append(''.join(name))
+    return queries
+
+
+def search_before(list_to_search, value, key, cutoff=5, return_key=False):
+    """search() as it was before top-k scoring, for comparison."""
+    result = next((a for a in list_to_search if value.lower() == key(a).lower()), None)
+    if result is None:
+        partial_matches = [a for a in list_to_search if value.lower() in key(a).lower()]
+        if len(partial_matches) > 1 or not partial_matches:
+            names = [key(d) for d in list_to_search]
+            fuzzy_map = {key(d): d for d in list_to_search}
+            fuzzy_results = [r for r in process.extract(value, names, scorer=fuzz.ratio) if r[1] >= cutoff]
+            fuzzy_sum = sum(r[1] for r in fuzzy_results)
+            weighted_results = [(fuzzy_map[r[0]], r[1] / fuzzy_sum) for r in fuzzy_results]
+            weighted_results.extend((match, len(value) / len(key(match))) for match in partial_matches)
+            sorted_weighted = sorted(weighted_results, key=lambda e: e[1], reverse=True)
+            results = []
+            for r in sorted_weighted:
+                if r[0] not in results:
+                    results.append(r[0])
+        else:
+            results = partial_matches
+        return ([key(r) for r in results] if return_key else results), False
+    return (key(result) if return_key else result), True
+
+
+def measure(search_func, corpus, queries):
+    """:returns tuple - (ms per query, the results)"""
+    start = time.perf_counter()
+    results = [search_func(corpus, q, lambda e: e.name, return_key=True) for q in queries]
+    return (time.perf_counter() - start) * 1000 / len(queries), results
+
+
+def main():
+    ok = True
+    print(f"{'entries':>8}{'before':>12}{'top-k':>12}{'index':>12}{'index build':>14}{'same':>8}")
+    for size in CORPUS_SIZES:
+        corpus = make_corpus(size)
+        queries = make_queries(corpus)
+        start = time.perf_counter()
+        index = SearchIndex(corpus, lambda e: e.name)
+        build_time = time.perf_counter() - start
+
+        before_time, before = measure(search_before, corpus, queries)
+        topk_time, topk = measure(search, corpus, queries)
+        index_time, indexed = measure(search, index, queries)
+        ok = ok and before == topk == indexed
+        same = sum(a == b for a, b in zip(before, indexed))
+        print(f"{size:>8}{before_time:>10.1f}ms{topk_time:>10.1f}ms{index_time:>10.1f}ms{build_time * 1000:>12.0f}ms"
+              f"{same:>5}/{len(queries)}")
+    if not ok:
+        print("Top-k scoring or the index found different matches than the full scan.")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
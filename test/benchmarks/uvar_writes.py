@@ -0,0 +1,98 @@
+"""
+Times saving changed uvars with one write per uvar against one bulk write, on a stand-in for a Mongo collection that
+charges a fixed round trip per request.
+Run from the repository root: python -m test.benchmarks.uvar_writes
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from pymongo import DeleteOne, UpdateOne
+from pymongo.results import BulkWriteResult
+
+from cogs5e.funcs.scripting.helpers import update_uvars
+
+ROUND_TRIP = 0.002  # seconds - a Mongo server on the same network
+UVAR_COUNTS = (1, 3, 12, 50)
+
+
+class FakeUvars:
+    """Just enough of a motor collection of uvars, with a fixed round trip per request."""
+
+    def __init__(self, round_trip=ROUND_TRIP):
+        self.round_trip = round_trip
+        self.docs = {}  # (owner, name) -> value
+        self.requests = 0
+
+    async def _request(self):
+        self.requests += 1
+        await asyncio.sleep(self.round_trip)
+
+    def _update(self, filter_, update, upsert):
+        key = (filter_['owner'], filter_['name'])
+        if key in self.docs or upsert:
+            self.docs[key] = update['$set']['value']
+
+    def _delete(self, filter_):
+        self.docs.pop((filter_['owner'], filter_['name']), None)
+
+    async def update_one(self, filter_, update, upsert=False):
+        await self._request()
+        self._update(filter_, update, upsert)
+
+    async def delete_one(self, filter_):
+        await self._request()
+        self._delete(filter_)
+
+    async def bulk_write(self, requests, ordered=True):
+        await self._request()
+        for request in requests:
+            if isinstance(request, UpdateOne):
+                self._update(request._filter, request._doc, request._upsert)
+            elif isinstance(request, DeleteOne):
+                self._delete(request._filter)
+        return BulkWriteResult({'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0,
+                                'upserted': []}, True)
+
+
+def make_ctx(collection):
+    return SimpleNamespace(author=SimpleNamespace(id=1234), bot=SimpleNamespace(mdb=SimpleNamespace(uvars=collection)))
+
+
+async def update_uvars_one_by_one(ctx, uvar_dict, changed):
+    """update_uvars() as it was before bulk writes, for comparison."""
+    for name in changed:
+        if name in uvar_dict:
+            await ctx.bot.mdb.uvars.update_one({"owner": str(ctx.author.id), "name": name},
+                                               {"$set": {"value": uvar_dict[name]}}, True)
+        else:
+            await ctx.bot.mdb.uvars.delete_one({"owner": str(ctx.author.id), "name": name})
+
+
+async def measure(save, count):
+    """:returns tuple - (seconds to save, requests made, the saved uvars)"""
+    collection = FakeUvars()
+    ctx = make_ctx(collection)
+    uvar_dict = {f"var{i}": str(i) for i in range(count)}
+    changed = set(uvar_dict) | {f"deleted{i}" for i in range(count // 3)}
+    start = time.perf_counter()
+    await save(ctx, uvar_dict, changed)
+    return time.perf_counter() - start, collection.requests, collection.docs
+
+
+async def main():
+    ok = True
+    print(f"{'uvars':>6}{'one by one':>14}{'bulk':>10}{'requests':>12}")
+    for count in UVAR_COUNTS:
+        old_time, old_requests, old_docs = await measure(update_uvars_one_by_one, count)
+        new_time, new_requests, new_docs = await measure(update_uvars, count)
+        ok = ok and old_docs == new_docs and new_requests == 1
+        print(f"{count:>6}{old_time * 1000:>12.1f}ms{new_time * 1000:>8.1f}ms{old_requests:>7} -> {new_requests}")
+    if not ok:
+        print("Bulk writes saved different uvars, or took more than one request.")
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if asyncio.get_event_loop().run_until_complete(main()) else 1)
@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+
+from cogs5e.funcs.scripting.helpers import alias_index, get_alias_names, get_servalias_names, \
+    invalidate_alias_names  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    def __init__(self, field, docs):
+        self.field = field
+        self.docs = docs
+        self.queries = 0
+
+    def find(self, query, projection=None):
+        self.queries += 1
+        return FakeCursor(d for d in self.docs if d[self.field] == query[self.field])
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_alias_names():
+    alias_index.clear()
+    aliases = FakeCollection('owner', [{'owner': '1', 'name': 'atk'}, {'owner': '2', 'name': 'heal'}])
+    servaliases = FakeCollection('server', [{'server': '3', 'name': 'status'}])
+    bot = SimpleNamespace(mdb={'aliases': aliases, 'servaliases': servaliases})
+
+    assert run(get_alias_names(bot, '1')) == {'atk'}
+    assert run(get_alias_names(bot, '1')) == {'atk'}
+    assert run(get_alias_names(bot, '4')) == set()
+    assert aliases.queries == 2
+    assert run(get_servalias_names(bot, '3')) == {'status'}
+
+    aliases.docs.append({'owner': '1', 'name': 'save'})
+    invalidate_alias_names(owner_id='1')
+    assert run(get_alias_names(bot, '1')) == {'atk', 'save'}
+    assert aliases.queries == 3
+    assert servaliases.queries == 1
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("discord")
+
+from cogs5e.funcs.scripting.templates import Block, find_gvars, get_alias_template  # noqa: E402
+
+
+def test_fill():
+    template = get_alias_template('attack -t %1% -d {{roll("%2%")}} <name> -b &3&')
+    filled = template.fill('!', 'goblin 1d6 "a b" extra')
+    assert str(filled) == '!attack -t goblin -d {{roll("1d6")}} <name> -b a b extra'
+    assert filled.segments[2] == Block('{{roll("1d6")}}', 'roll("1d6")', None, None)
+    assert filled.segments[4] == Block('<name>', None, 'name', None)
+    assert str(get_alias_template('roll %*% &ARGS&').fill('!', 'a "b c"')) == '!roll "a \\"b c\\"" []'
+    assert str(get_alias_template('echo %1% %2%').fill('!', 'one')) == '!echo one %2%'
+    assert str(get_alias_template('  echo  ').fill('!', '')) == '!  echo'
+
+
+def test_falls_back():
+    assert get_alias_template('echo %1%').fill('!', '{{x}}') is None  # arguments could add blocks
+    assert get_alias_template('echo %1%').fill('!', '""') is None  # empty slot
+    assert get_alias_template('echo <%1%>').fill('!', 'a') is None  # slot inside <>
+    assert get_alias_template('echo %2%1%').fill('!', 'a b') is None  # overlapping slots
+
+
+def test_joined_slots():
+    # rewriting slot by slot, these values join the text around them into new slots
+    assert get_alias_template('&%1%&{c}%1%&2&').fill('!', '2  a') is None  # -> !a{c}2a
+    assert get_alias_template('&ARGS&%3% &%2%&2&').fill('!', '1 2 3') is None  # -> !['1', '2', '3']3 22&
+    assert get_alias_template('a1d20\n<\n%3%%1%%2%').fill('!', '2 3 b') is None  # -> !a1d20\n<\n%332%
+    # values that cannot be part of a slot are still filled in place
+    assert str(get_alias_template('&%1%&{c}%1%&2&').fill('!', 'x  a')) == '!&x&{c}xa'
+
+
+def test_find_gvars():
+    script = 'embed {{a = load_json(get_gvar("abc-123"))}} {{get_gvar(name)}} {{get_gvar(\'%1%\')}} {{get_gvar("}} ' \
+             '{get_gvar("x")} {{[get_gvar(k) for k in ("def",)] + [get_gvar("ghi")]}}'
+    assert find_gvars(script) == {"abc-123", "ghi"}
+    assert get_alias_template(script).gvars == {"abc-123", "ghi"}
+    # only calls the evaluator would prefetch for: one literal argument
+    assert find_gvars('{{get_gvar("a", "b")}} {{get_gvar(key="c")}} {{get_gvar("d&1&")}} {{get_gvar("e")}}') == {"e"}
+
+
+def test_unparsable_blocks():
+    # blocks the evaluator reports an error for compile like any other
+    for block in ('{{ }}', '{{#x}}', '{{1 +}}', '{{' + '1+' * 100000 + '1}}', '{{' + 'not ' * 100000 + '1}}'):
+        template = get_alias_template(f'echo {block} %1%')
+        assert template.gvars == frozenset()
+        assert str(template.fill('!', 'a')) == f'!echo {block} a'
@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("cachetools")
+
+from utils.dataloader import DataLoader, get_loader, loader_stats  # noqa: E402
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def test_load():
+    calls = []
+
+    async def load_character(author_id):
+        calls.append(author_id)
+        return None if author_id == '2' else {'owner': author_id}
+
+    loader = DataLoader()
+    first = run(loader.load(('character', '1'), load_character, '1'))
+    assert run(loader.load(('character', '1'), load_character, '1')) is first
+    assert run(loader.load(('character', '2'), load_character, '2')) is None
+    assert run(loader.load(('character', '2'), load_character, '2')) is None
+    assert calls == ['1', '2']
+    assert loader.saved == 2
+
+    loader.invalidate(('character', '1'))
+    assert run(loader.load(('character', '1'), load_character, '1')) == {'owner': '1'}
+    loader.put(('character', '2'), {'owner': '2'})
+    assert run(loader.load(('character', '2'), load_character, '2')) == {'owner': '2'}
+    assert calls == ['1', '2', '1']
+    assert loader_stats['character'] >= 3
+
+    loader.clear()  # after a command fails
+    assert run(loader.load(('character', '2'), load_character, '2')) is None
+    assert calls == ['1', '2', '1', '2']
+
+
+def test_get_loader():
+    message = SimpleNamespace(id=1234)
+    assert get_loader(SimpleNamespace(message=message)) is get_loader(SimpleNamespace(message=message))
+    assert get_loader(SimpleNamespace(message=SimpleNamespace(id=1235))) is not get_loader(
+        SimpleNamespace(message=message))
+    assert get_loader(SimpleNamespace()) is not get_loader(SimpleNamespace())
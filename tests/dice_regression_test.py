@@ -0,0 +1,6 @@
+from test.benchmarks import dice_engine
+
+
+def test_reference_output():
+    """Seeded rolls must match the recorded output; see test/benchmarks/dice_engine.py to re-record it."""
+    assert dice_engine.check() == []
@@ -1,4 +1,8 @@
-from cogs5e.funcs.dice import roll, DiceResult
+from collections import Counter
+from fractions import Fraction
+
+from cogs5e.funcs.dice import ConstantSpec, DiceRNG, DiceResult, DiceSpec, SingleDice, SingleDiceGroup, compile_roll, \
+    parse_cache_info, roll, roll_many, seed_rng
 
 
 def test_roll():
@@ -57,3 +61,127 @@ def test_randomness():
     # the chance of all of them being equal is 1/1000^100, so this should be safe
     # unless, of course, I broke something horribly
     assert len(set(rolls)) > 1
+
+
+def test_compiled_cache():
+    program = compile_roll("8d6[fire]+4 fireball")
+    assert program[0] == DiceSpec(8, 6, (), '[fire]')
+    assert compile_roll("  8d6[fire]+4 fireball  ") is program
+
+    hits = parse_cache_info().hits
+    r = roll("8d6[fire]+4 fireball")
+    assert parse_cache_info().hits == hits + 1
+    assert 12 <= r.total <= 52
+    assert "fireball" in r.result
+
+    # advantage is part of the key
+    assert compile_roll("1d20", 1) != compile_roll("1d20")
+    assert compile_roll("1d20", 1)[0] == DiceSpec(2, 20, ('k', 'h1'), '')
+
+
+def test_arithmetic():
+    assert roll("2+3*4").total == 14
+    assert roll("(2+3)*4").total == 20
+    assert roll("7/2").total == 3
+    assert roll("-7/2").total == -4
+    assert roll("10-2-3").total == 5
+    assert roll("12/2/3").total == 2
+    assert roll("-(2+3)*-2").total == 10
+    assert roll("1/3*3").total == 1
+    assert roll("1+").total == 0
+    assert "No dice found to roll." in roll("1+").result
+    assert "No dice found to roll." in roll("(1+2").result
+    assert "division by zero" in roll("1/0").result
+
+
+def test_decimal_constants():
+    assert roll("1.5+2").total == 3
+    assert roll("1.5+2").result.startswith("**Result:** 1.5 + 2")
+    assert 0 <= roll("1d20*0.5").total <= 10
+    assert "1d20" in roll("1d20*0.5").result
+    assert roll(".5+1.5").total == 2
+    assert roll("1.05*100").total == 105
+    assert compile_roll("2.5[fire]")[0] == ConstantSpec(Fraction(5, 2), '[fire]')
+
+
+def test_roll_many():
+    results = roll_many("4d6kh3mi2+1d20ro1[bonus] stat", 50, inline=True)
+    assert len(results) == 50
+    for r in results:
+        dice = r.raw_dice.parts[0]
+        assert len([p for p in dice.rolled if p.kept]) == 3
+        assert all(p.value >= 2 for p in dice.rolled)
+        assert 7 <= r.total <= 38
+        assert "stat" in r.result
+
+    results = roll_many("1d20", 20, adv=1)
+    assert all(len(r.raw_dice.parts[0].rolled) == 2 for r in results)
+    assert all(r.total == max(d.value for d in r.raw_dice.parts[0].rolled) for r in results)
+
+    assert all(r.total == 0 for r in roll_many("1+", 3))
+
+    # dice too large for the batch roller are rolled one at a time, like roll() does
+    for roll_str in ("1d99999999999999999999", "2d20kh99999999999999999999", "1d20mi99999999999999999999"):
+        results = roll_many(roll_str, 3)
+        assert len(results) == 3
+        assert all(type(r.total) == type(roll(roll_str).total) for r in results)
+        assert not any("Invalid input" in r.result for r in results)
+
+
+def test_dice_group():
+    group = SingleDiceGroup(num_dice=3, max_value=6,
+                            rolled=[SingleDice(6, 6), SingleDice(3, 6, False), SingleDice(1, 6)])
+    assert group.get_total() == 7
+    assert group.get_num_kept() == 2
+    group.rolled[2].update(2)
+    group.rolled[0].explode()
+    assert group.values == [6, 3, 2]
+    assert str(group) == "3d6 (__**6**__, ~~3~~, 1 -> 2) "
+    assert group.to_dict()['dice'][2] == {'type': 'single_dice', 'value': 2, 'size': 6, 'is_kept': True,
+                                          'rolls': [1, 2], 'exploded': False}
+
+
+def test_reroll_limits():
+    r = roll("1d1e1")
+    assert r.total == 1002
+    assert len(r.raw_dice.parts[0].rolled) == 1002
+    r = roll("4d1rr1")
+    assert r.total == 4
+    assert len(r.raw_dice.parts[0].rolled) == 1008  # the pass that crosses 1000 checks still finishes
+    r = roll("2d1ro1ra1")
+    assert r.total == 3
+    assert "Too many dice to reroll" in roll("300d6ro<5").result
+
+
+def test_lazy_result():
+    r = roll("1d20+5 attack")
+    assert r._render is not None
+    assert r.skeleton.endswith(f"**Total:** {r.total}")
+    assert r.result.startswith("**attack:** 1d20")
+    assert r._render is None
+
+    r = roll("4d6kh3", total_only=True)
+    assert 3 <= r.total <= 18
+    assert r.result == r.skeleton == r.rolled == ''
+    assert "Invalid input" in roll("1/0", total_only=True).result
+
+
+def test_rng():
+    seed_rng(42)
+    first = [roll("10d20e20ro1 + 4d6kh3").result for _ in range(20)]
+    seed_rng(42)
+    assert [roll("10d20e20ro1 + 4d6kh3").result for _ in range(20)] == first
+
+    rng = DiceRNG(0)
+    counts = Counter(rng.randint(6) for _ in range(6000))
+    assert sorted(counts) == [1, 2, 3, 4, 5, 6]
+    assert all(800 < c < 1200 for c in counts.values())
+    assert 1 <= rng.randint(10 ** 30) <= 10 ** 30
+
+
+def test_consolidated():
+    assert roll("1d1[fire]+2d1[cold]-3[acid] 2 hits").consolidated() == "1 [fire]+2 [cold]-3 [acid]"
+    assert roll("3+2d1[fire]+1").consolidated() == "6 [fire]"
+    assert roll("4d1[fire]/3+1d1[fire]").consolidated() == "2 [fire]"
+    assert roll("1d1[a]*2[b]").consolidated() == "1 [a]+0 [b]"
+    assert roll("1/0").consolidated() == "0"
@@ -0,0 +1,77 @@
+import pytest
+
+from cogs5e.funcs.dice import seed_rng
+from cogs5e.funcs.dicesim import MAX_TRIALS, simulate
+from cogs5e.funcs.dicestats import get_distribution
+from cogs5e.models.errors import InvalidArgument
+
+
+def close_to(sim, expected, sigmas=5):
+    return abs(sim.mean() - expected) < sigmas * sim.stdev() / sim.trials ** 0.5 + 1e-9
+
+
+def test_matches_exact():
+    seed_rng(0)
+    for rollStr in ("1d20", "4d6kh3", "2d6ro1+3", "3d8pl1mi2", "(1d4+1)/2"):
+        sim = simulate(rollStr, trials=50000)
+        dist = get_distribution(rollStr)
+        assert close_to(sim, float(dist.mean()))
+        assert dist.min <= sim.min and sim.max <= dist.max
+    assert close_to(simulate("1d20", adv=1), 553 / 40)
+
+
+def test_rerolls():
+    seed_rng(0)
+    assert close_to(simulate("1d6e6"), 4.2)  # 3.5 * 6/5
+    assert close_to(simulate("1d6rr1"), 4)
+    assert close_to(simulate("1d6ra6"), 3.5 + 3.5 / 6)
+    assert simulate("1d6rr<7", trials=100).max <= 6  # every die is rerolled until the iteration limit
+    sim = simulate("1d1e1", trials=100)
+    assert sim.min == sim.max == 1002
+
+
+def test_statistics():
+    sim = simulate("1d1+4", trials=1000)
+    assert sim.trials == 1000
+    assert sim.stdev() == 0
+    assert sim.confidence_interval() == (5, 5)
+    assert sim.at_least(5) == 1 and sim.at_least(6) == 0
+    assert sim.histogram() == [(5, 5, 1)]
+
+
+def test_invalid():
+    with pytest.raises(InvalidArgument):
+        simulate("1d6/0")
+    with pytest.raises(InvalidArgument):
+        simulate("300d6ro<6", trials=1000)  # always rerolls more than 100 dice
+
+
+def test_large_dice():
+    import tracemalloc
+
+    seed_rng(0)
+    tracemalloc.start()
+    try:
+        for rollStr, max_value in (("1d20000e20000", 20000), ("1d1000000e1000000", 1000000), ("4d5000kh3", 15000),
+                                   ("2d1000000000ro1", 2000000000)):
+            sim = simulate(rollStr, trials=5000, time_limit=1)
+            assert sim.trials and 1 <= sim.min and sim.max <= 2 * max_value
+        assert tracemalloc.get_traced_memory()[1] < 100 * 1024 * 1024  # count tables no longer grow with the die
+    finally:
+        tracemalloc.stop()
+    with pytest.raises(InvalidArgument):
+        simulate("1d99999999999999999999")
+
+
+def test_time_limit():
+    import time
+
+    for rollStr in ("300d1000000e1", "1d6e6 + 100d1000000e1", "1d1000000rr<100"):
+        start = time.monotonic()
+        sim = simulate(rollStr, trials=MAX_TRIALS, time_limit=0.5)
+        assert time.monotonic() - start < 1.5
+        assert 0 < sim.trials < MAX_TRIALS
+    start = time.monotonic()
+    with pytest.raises(InvalidArgument):
+        simulate("1d1000000rr<999999", time_limit=0.5)  # every trial would build a list of a million dice to reroll
+    assert time.monotonic() - start < 0.5
@@ -0,0 +1,55 @@
+from fractions import Fraction
+
+import pytest
+
+from cogs5e.funcs.dicestats import dice_distribution, get_distribution
+from cogs5e.models.errors import NoExactDistribution
+
+
+def test_plain_dice():
+    d = get_distribution("1d20")
+    assert d.min == 1 and d.max == 20
+    assert d.mean() == Fraction(21, 2)
+    assert d.at_least(11) == Fraction(1, 2)
+
+    d = get_distribution("8d6[fire]+4 fireball")
+    assert d.mean() == 32
+    assert d.variance() == Fraction(8 * 35, 12)
+    assert d.percentile(50) == 32
+
+
+def test_keep():
+    d = get_distribution("1d20", adv=1)
+    assert d.at_least(20) == 1 - Fraction(19, 20) ** 2
+    assert d.mean() == Fraction(553, 40)
+    assert get_distribution("1d20", adv=-1).at_least(20) == Fraction(1, 400)
+
+    d = get_distribution("4d6kh3")
+    assert d.min == 3 and d.max == 18
+    assert d.mean() == Fraction(15869, 1296)
+    assert get_distribution("4d6pl1").weights == d.weights
+
+    d = dice_distribution(10, 6, ('k', '>6'))
+    assert d.weights == {0: 6 ** 10}
+
+
+def test_modifiers():
+    assert get_distribution("2d6mi3").min == 6
+    assert get_distribution("2d6ma2").max == 4
+    d = get_distribution("1d6ro1")
+    assert d.weights == {1: 1, 2: 7, 3: 7, 4: 7, 5: 7, 6: 7}
+
+
+def test_arithmetic():
+    d = get_distribution("(1d4+1)/2")
+    assert d.weights == {1: 2, 2: 2}
+    assert get_distribution("3+4*(9-2)").weights == {31: 1}
+
+
+def test_unsupported():
+    with pytest.raises(NoExactDistribution):
+        get_distribution("1d6e6")
+    with pytest.raises(NoExactDistribution):
+        get_distribution("4d6rr1")
+    with pytest.raises(NoExactDistribution):
+        get_distribution("4d6kh1kl1")
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+
+from cogs5e.funcs.scripting.profiler import ProfileStats, ScriptProfile  # noqa: E402
+
+
+def run(profile, blocks):
+    """Evaluates fake blocks, each given as (text, nodes, loops, rolls)."""
+    evaluator = SimpleNamespace(_loops=0)
+
+    def evalblock(text, nodes, loops, rolls):
+        profile.nodes += nodes
+        evaluator._loops += loops
+        for _ in range(rolls):
+            profile.counted(lambda: None)()
+        return text
+
+    timed = profile.timed(evalblock, evaluator)
+    return [timed(*block) for block in blocks]
+
+
+def test_profile():
+    profile = ScriptProfile(count_nodes=True)
+    assert run(profile, [("{{a}}", 3, 0, 0), ("{{b}}", 10, 5, 2)]) == ["{{a}}", "{{b}}"]
+    assert [(b.text, b.nodes, b.loops, b.rolls) for b in profile.blocks] == [("{{a}}", 3, 0, 0), ("{{b}}", 10, 5, 2)]
+    totals = profile.totals()
+    assert (totals['runs'], totals['nodes'], totals['loops'], totals['rolls']) == (1, 13, 5, 2)
+    assert "2 blocks" in profile.breakdown()
+
+    unsampled = ScriptProfile(count_nodes=False)
+    run(unsampled, [("{{a}}", 0, 1, 1)])
+    assert 'nodes' not in unsampled.totals()
+
+
+def test_stats():
+    stats = ProfileStats()
+    for count_nodes in (True, False):
+        profile = ScriptProfile(count_nodes=count_nodes)
+        run(profile, [("{{a}}", 4, 2, 1)])
+        stats.record("attack", "1234", profile)
+    profile = ScriptProfile(count_nodes=False)
+    run(profile, [("{{b}}", 0, 100, 0)])
+    stats.record("loop", "DM", profile)
+
+    assert stats.aliases["attack"]['runs'] == 2 and stats.aliases["attack"]['node_runs'] == 1
+    assert [name for name, _ in stats.top(by='loops')] == ["loop", "attack"]
+    assert [name for name, _ in stats.top('servers', by='rolls')] == ["1234", "DM"]
+    assert "attack" in stats.format()
+
+    stats.reset()
+    assert not stats.aliases and not stats.servers
+    assert stats.top() == []
@@ -0,0 +1,92 @@
+import types
+
+import pytest
+
+pytest.importorskip("discord")
+
+from cogs5e.funcs.scripting.combat import SimpleCombat, SimpleCombatant  # noqa: E402
+
+
+class FakeCombatant:
+    def __init__(self, private=False):
+        self.isPrivate = private
+        self.ac = 12
+        self.hp = 10
+        self.temphp = 3
+        self.hpMax = 20
+        self.initMod = 2
+        self.init = 15
+        self.name = "Goblin"
+        self.notes = None
+        self.reads = 0
+
+    @property
+    def attacks(self):
+        self.reads += 1
+        return [{'name': 'Scimitar'}]
+
+    @property
+    def resists(self):
+        self.reads += 1
+        return {'resist': [], 'immune': [], 'vuln': []}
+
+    @property
+    def spellcasting(self):
+        self.reads += 1
+        return types.SimpleNamespace(casterLevel=0)
+
+    def get_effects(self):
+        self.reads += 1
+        return []
+
+    def set_hp(self, hp):
+        self.hp = hp
+
+    def get_effect(self, name, strict=True):
+        return None
+
+
+class FakeCombat:
+    round_num = 1
+    turn_num = 10
+
+    def __init__(self, combatants):
+        self.combatants = combatants
+
+    def get_combatants(self):
+        return self.combatants
+
+
+def test_reads_through():
+    combatant = FakeCombatant()
+    simple = SimpleCombatant(combatant)
+    assert combatant.reads == 0
+    assert simple.hp == 7
+    combatant.hp = 4
+    assert simple.hp == 1
+    assert simple.ratio == 1 / 20
+    assert combatant.reads == 0
+    assert simple.attacks == [{'name': 'Scimitar'}]
+    assert combatant.reads == 1
+
+
+def test_hidden_stats():
+    hidden = SimpleCombatant(FakeCombatant(private=True))
+    assert (hidden.ac, hidden.hp, hidden.maxhp, hidden.initmod, hidden.temphp, hidden.resists, hidden.attacks) \
+           == (None,) * 7
+    assert hidden.name == "Goblin"
+    assert hidden.init == 15
+    assert SimpleCombatant(FakeCombatant(private=True), False).ac == 12
+
+
+def test_changed_combatants():
+    goblin, orc = FakeCombatant(), FakeCombatant()
+    combat = SimpleCombat(FakeCombat([goblin, orc]), None)
+    first, second = combat.combatants
+    assert first.hp == 7
+    first.remove_effect("Poisoned")
+    assert not combat._changed and not combat._all_changed
+    second.set_hp(1)
+    second.set_name("Orc")
+    assert combat._changed == {orc: "Goblin"}
+    assert not combat._all_changed
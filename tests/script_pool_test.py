@@ -0,0 +1,102 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+
+from cogs5e.funcs.scripting import evaluators, pool  # noqa: E402
+from cogs5e.funcs.scripting.evaluators import LazyNames, ScriptingEvaluator, script_requirements  # noqa: E402
+from cogs5e.funcs.scripting.pool import ScriptPool  # noqa: E402
+from cogs5e.funcs.scripting.templates import get_alias_template  # noqa: E402
+from cogs5e.models.errors import EvaluationError  # noqa: E402
+from tests.alias_index_test import run  # noqa: E402
+
+
+def test_requirements():
+    assert script_requirements('{{x + 1}} {combat} <combat>') == (set(), set())
+    assert script_requirements('{{load_json(get_gvar("abc"))}} {{get_gvar("def")}}') == (set(), {"abc", "def"})
+    assert script_requirements('{{get_gvar(name)}}') == ({"get_gvar"}, set())
+    assert script_requirements('{{g = get_gvar}}') == ({"get_gvar"}, set())
+    assert script_requirements('{{c = combat()}}') == ({"combat"}, set())
+    filled = get_alias_template('echo {{%1%}}').fill('!', 'combat()')
+    assert script_requirements(filled) == ({"combat"}, set())
+    assert script_requirements('{{ }} {{#combat()}} {{}}') == (set(), set())  # blocks with no statement
+
+
+def test_lazy_names():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        names.setdefault('a', 2)
+        names['b'] = 3
+
+    names = LazyNames({'a': 1}, loader)
+    assert names['a'] == 1
+    assert not calls
+    assert names['b'] == 3
+    assert names['a'] == 1
+    assert 'c' not in names
+    assert names.get('c') is None
+    assert len(calls) == 1
+
+
+def test_uvar_shadows_function(monkeypatch):
+    calls = []
+
+    def load_uvars(ctx):
+        calls.append(1)
+        return {'floor': 'a uvar'}
+
+    monkeypatch.setattr(evaluators, 'load_uvars', load_uvars)
+    ctx = SimpleNamespace(channel=SimpleNamespace(id=1), guild=None)
+
+    evaluator = ScriptingEvaluator(ctx)
+    assert evaluator.eval('floor(1.5)') == 1  # calls do not load uvars
+    assert not calls
+    assert evaluator.eval('floor') == 'a uvar'
+    assert evaluator.eval('roll') is evaluator.functions['roll']
+    assert len(calls) == 1
+
+    evaluator = ScriptingEvaluator(ctx)
+    evaluator._load_uvars()
+    assert evaluator.eval('floor') == 'a uvar'
+
+
+def test_discard():
+    pool = ScriptPool(workers=1)
+    pool.executor = executor = pool.new_executor()
+    executor.submit(time.sleep, 60)
+    deadline = time.monotonic() + 30
+    while not executor._processes and time.monotonic() < deadline:
+        time.sleep(0.05)
+    processes = list(executor._processes.values())
+    assert processes
+
+    pool.discard(executor)
+    assert pool.executor is None
+    for process in processes:
+        process.join(10)
+        assert not process.is_alive()
+
+
+def test_parse_blocks_without_statements(monkeypatch):
+    async def prefetch_gvars(ctx, gvars):
+        pass
+
+    monkeypatch.setattr(pool, 'prefetch_gvars', prefetch_gvars)
+    evaluator = ScriptingEvaluator(SimpleNamespace(channel=SimpleNamespace(id=1), guild=None))
+    evaluator.uvars_loaded = True
+    script_pool = ScriptPool(workers=1)
+    try:
+        for content in ('{{ }}', '{{#x}}', 'a {{1 + 2}} {{#combat()}}'):
+            assert script_pool.eligible(evaluator, content) == frozenset()
+            with pytest.raises(EvaluationError):  # reported as when run in a thread
+                run(script_pool.parse(evaluator, content))
+            with pytest.raises(EvaluationError):
+                evaluator.parse(content)
+        assert script_pool.metrics['completed'] == 3
+    finally:
+        if script_pool.executor is not None:
+            script_pool.discard(script_pool.executor)
@@ -0,0 +1,128 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fuzzywuzzy")
+
+from utils.searchindex import (SearchIndex, padded_trigrams, shared_bound, top_fuzzy,  # noqa: E402
+                               unique_by_identity)
+
+NAMES = ["Fireball", "Fire Bolt", "Delayed Blast Fireball", "Wall of Fire", "Firebolt Ring", "Magic Missile",
+         "Mage Armor", "Mage Hand", "Cure Wounds", "Mass Cure Wounds", "Shield", "Shield of Faith", "Light", "Daylight"]
+
+
+def entries(names):
+    return [SimpleNamespace(name=n) for n in names]
+
+
+@pytest.fixture
+def index():
+    return SearchIndex(entries(NAMES), lambda e: e.name)
+
+
+def test_exact(index):
+    result, strict = index.search("fireball")
+    assert strict and result.name == "Fireball"
+    assert index.search("SHIELD", return_key=True) == ("Shield", True)
+
+
+def test_single_partial(index):
+    result, strict = index.search("missile")
+    assert not strict
+    assert [r.name for r in result] == ["Magic Missile"]
+
+
+def test_partial_and_fuzzy(index):
+    result, strict = index.search("cure", return_key=True)
+    assert not strict
+    assert {"Cure Wounds", "Mass Cure Wounds"} <= set(result)
+    assert len(result) == len(set(result))
+
+    result, strict = index.search("firball", return_key=True)
+    assert not strict
+    assert result[0] == "Fireball"
+
+
+def test_with_entries(index):
+    homebrew = index.with_entries(entries(["Fireball", "Frost Lance"]))
+    assert len(homebrew) == len(NAMES) + 2
+    assert len(index) == len(NAMES)
+    assert index.with_entries([]) is index
+
+    # the compendium's entry wins an exact match, like it does in a chained list
+    result, strict = homebrew.search("fireball")
+    assert strict and result is index.entries[0]
+    assert homebrew.search("frost lance", return_key=True) == ("Frost Lance", True)
+    assert [e.name for e in homebrew.entries] == NAMES + ["Fireball", "Frost Lance"]
+
+
+def test_padded_trigrams():
+    assert padded_trigrams("ab") == {"  a", " ab", "ab "}
+
+
+def test_top_fuzzy():
+    from fuzzywuzzy import fuzz, process
+    from fuzzywuzzy.utils import full_process
+
+    names = NAMES + ["Fire", "Fore", "Fira"]  # ties go to the earlier name
+    for query in ("fire", "fireball", "mage", "xyz", "cure wound"):
+        for cutoff in (0, 5, 60):
+            expected = [r for r in process.extract(query, names, scorer=fuzz.ratio) if r[1] >= cutoff]
+            assert top_fuzzy(full_process(query), ((n, full_process(n)) for n in names), cutoff) == expected
+
+
+def test_shared_bound():
+    from fuzzywuzzy import fuzz
+
+    rand = random.Random(0)
+    for _ in range(20000):
+        a, b = (''.join(rand.choice("abc ") for _ in range(rand.randint(1, 10))) for _ in range(2))
+        grams_a, grams_b = padded_trigrams(a), padded_trigrams(b)
+        assert fuzz.ratio(a, b) <= shared_bound(len(a), len(grams_a), len(b), len(grams_b), len(grams_a & grams_b))
+
+
+def test_unique_by_identity():
+    a, b = SimpleNamespace(name="A"), SimpleNamespace(name="A")
+    assert unique_by_identity([a, b, a, b]) == [a, b]
+    assert unique_by_identity([(a, 1), (a, 2), (b, 3)], lambda r: r[0]) == [(a, 1), (b, 3)]
+
+
+def test_matches_search():
+    pytest.importorskip("discord")
+    from utils.functions import search
+
+    choices = entries(NAMES)
+    index = SearchIndex(choices, lambda e: e.name)
+    for query in ("fireball", "missile", "mage", "shield of", "light", "cure", "wounds"):
+        assert index.search(query) == search(choices, query, lambda e: e.name)
+    for query in ("fire", "firball", "wonds", "xyz", "a"):
+        assert index.search(query, return_key=True) == search(choices, query, lambda e: e.name, return_key=True)
+
+
+def test_matches_search_with_typos():
+    pytest.importorskip("discord")
+    from utils.functions import search
+
+    rand = random.Random(0)
+    syllables = ("ar", "bel", "cor", "dra", "el", "fir", "gor", "is", "kal", "lum", "mor", "or", "pyr", "sil", "um")
+    names = [''.join(rand.choice(syllables) for _ in range(rand.randint(1, 4))).title() + rand.choice(("", " Bolt"))
+             for _ in range(2000)]  # with duplicates, so that ties are broken by order
+    choices = entries(names)
+    index = SearchIndex(choices[:1500], lambda e: e.name).with_entries(choices[1500:])
+
+    queries = ["bolt", "o", "zzz"]
+    for name in rand.sample(names, 50):
+        name = list(name.lower())
+        i = rand.randrange(len(name))
+        name[i] = rand.choice("aeioxyz ")
+        queries.append(''.join(name))
+    for query in queries:
+        for cutoff in (5, 60):
+            result, strict = index.search(query, cutoff)
+            expected, expected_strict = search(choices, query, lambda e: e.name, cutoff)
+            assert strict == expected_strict
+            if strict:
+                assert result is expected
+            else:  # the same entries, not just equal ones
+                assert [id(e) for e in result] == [id(e) for e in expected]
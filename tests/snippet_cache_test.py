@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("discord")
+
+from cogs5e.funcs.scripting.helpers import invalidate_snippets, parse_snippets, snippet_cache  # noqa: E402
+from tests.alias_index_test import FakeCollection, run  # noqa: E402
+
+
+def test_parse_snippets():
+    snippet_cache.clear()
+    snippets = FakeCollection('owner', [{'owner': '1', 'name': 'sneak', 'snippet': '-d 2d6'},
+                                        {'owner': '1', 'name': 'adv', 'snippet': ''}])
+    servsnippets = FakeCollection('server', [{'server': '3', 'name': 'adv', 'snippet': 'adv -b 1'},
+                                             {'server': '3', 'name': 'bless', 'snippet': '-b 1d4'}])
+    ctx = SimpleNamespace(bot=SimpleNamespace(mdb={'snippets': snippets, 'servsnippets': servsnippets}),
+                          author=SimpleNamespace(id=1), guild=SimpleNamespace(id=3))
+
+    assert run(parse_snippets('', ctx)) == ''
+    assert snippets.queries == 0
+    assert run(parse_snippets('sword sneak bless "a b"', ctx)) == 'sword -d 2d6 -b 1d4 "a b"'
+    assert run(parse_snippets('sword adv', ctx)) == 'sword adv'  # the user's snippet takes priority
+    assert run(parse_snippets('sword -t "a b" -b 1', ctx)) == 'sword -t "a b" -b 1'  # no snippets
+    assert (snippets.queries, servsnippets.queries) == (1, 1)
+
+    snippets.docs.append({'owner': '1', 'name': 'gwm', 'snippet': '-b -5 -d 10'})
+    invalidate_snippets(owner_id='1')
+    assert run(parse_snippets('gwm', ctx)) == '-b -5 -d 10'
+    assert (snippets.queries, servsnippets.queries) == (2, 1)
@@ -0,0 +1,62 @@
+"""
+Per-message memoization of data that several parts of one command load, like the author's active character or the
+channel's combat. An alias and the command it runs, and every line of a !multiline, share one message, so they share
+one loader. Code that writes loaded data to the db updates or invalidates its key, so later loads see the change.
+Loaded objects are shared, not copied, so a command that fails is assumed to have left them with changes it never
+saved: the message's loader is cleared, and later lines of a !multiline load from the db again.
+"""
+from collections import Counter
+
+import cachetools
+
+LOADER_CACHE_SIZE = 1024
+LOADER_TTL = 60  # seconds - long enough for a !multiline; data is never shared between messages
+
+# message id -> DataLoader
+loaders = cachetools.TTLCache(LOADER_CACHE_SIZE, LOADER_TTL)
+# kind of data -> loads saved this session
+loader_stats = Counter()
+
+
+class DataLoader:
+    """Memoizes the data loaded for one message. Keys are tuples whose first item names the kind of data."""
+
+    def __init__(self):
+        self.results = {}
+        self.saved = 0
+
+    async def load(self, key, loader, *args):
+        """Returns await loader(*args), only calling it the first time key is loaded. None is memoized like any
+        other value; exceptions are not."""
+        if key in self.results:
+            self.saved += 1
+            loader_stats[key[0]] += 1
+            return self.results[key]
+        value = await loader(*args)
+        self.results[key] = value
+        return value
+
+    def put(self, key, value):
+        """Sets what the next load of key returns, after writing value to the db."""
+        self.results[key] = value
+
+    def invalidate(self, key):
+        """Makes the next load of key go to the db."""
+        self.results.pop(key, None)
+
+    def clear(self):
+        """Makes the next load of every key go to the db, after a command fails partway through."""
+        self.results.clear()
+
+
+def get_loader(ctx):
+    """Gets the loader of a context's message. Contexts without a message get a loader of their own.
+    Everything loaded through it is the same object for the rest of the message, so callers that change it must save
+    it or make the command fail."""
+    message = getattr(ctx, 'message', None)
+    if message is None:
+        return DataLoader()
+    loader = loaders.get(message.id)
+    if loader is None:
+        loader = loaders[message.id] = DataLoader()
+    return loader
@@ -14,10 +14,11 @@ import aiohttp
 import discord
 import numpy
 from PIL import Image
-from fuzzywuzzy import fuzz, process
+from fuzzywuzzy.utils import full_process
 from pygsheets import NoValidUrlKeyFound
 
 from cogs5e.models.errors import NoSelectionElements, SelectionCancelled
+from utils.searchindex import SearchIndex, top_fuzzy, unique_by_identity
 
 log = logging.getLogger(__name__)
 
@@ -74,23 +75,24 @@ def fuzzy_search(list_to_search: list, key, value):
 def search(list_to_search: list, value, key, cutoff=5, return_key=False, strict=False):
     """Fuzzy searches a list for an object
     result can be either an object or list of objects
-    :param list_to_search: The list to search.
+    :param list_to_search: The list to search, or a SearchIndex of it.
     :param value: The value to search for.
-    :param key: A function defining what to search for.
+    :param key: A function defining what to search for. Ignored for a SearchIndex, which has its own.
     :param cutoff: The scorer cutoff value for fuzzy searching.
     :param return_key: Whether to return the key of the object that matched or the object itself.
     :param strict: Kinda does nothing. I'm not sure why this is here.
     :returns: A two-tuple (result, strict) or None"""
+    if isinstance(list_to_search, SearchIndex):
+        return list_to_search.search(value, cutoff, return_key)
     # full match, return result
     result = next((a for a in list_to_search if value.lower() == key(a).lower()), None)
     if result is None:
         partial_matches = [a for a in list_to_search if value.lower() in key(a).lower()]
         if len(partial_matches) > 1 or not partial_matches:
-            names = [key(d) for d in list_to_search]
-            fuzzy_map = {key(d): d for d in list_to_search}
-            fuzzy_results = [r for r in process.extract(value, names, scorer=fuzz.ratio) if r[1] >= cutoff]
+            choices = ((d, full_process(key(d))) for d in list_to_search)
+            fuzzy_results = top_fuzzy(full_process(value), choices, cutoff)
             fuzzy_sum = sum(r[1] for r in fuzzy_results)
-            fuzzy_matches_and_confidences = [(fuzzy_map[r[0]], r[1] / fuzzy_sum) for r in fuzzy_results]
+            fuzzy_matches_and_confidences = [(r[0], r[1] / fuzzy_sum) for r in fuzzy_results]
 
             # display the results in order of confidence
             weighted_results = []
@@ -99,10 +101,7 @@ def search(list_to_search: list, value, key, cutoff=5, return_key=False, strict=
             sorted_weighted = sorted(weighted_results, key=lambda e: e[1], reverse=True)
 
             # build results list, unique
-            results = []
-            for r in sorted_weighted:
-                if r[0] not in results:
-                    results.append(r[0])
+            results = unique_by_identity(r[0] for r in sorted_weighted)
         else:
             results = partial_matches
         if return_key:
@@ -120,7 +119,7 @@ async def search_and_select(ctx, list_to_search: list, value, key, cutoff=5, ret
     """
     Searches a list for an object matching the key, and prompts user to select on multiple matches.
     :param ctx: The context of the search.
-    :param list_to_search: The list of objects to search.
+    :param list_to_search: The list of objects to search, or a SearchIndex of them.
     :param value: The value to search for.
     :param key: How to search - compares key(obj) to value
     :param cutoff: The cutoff percentage of fuzzy searches.
@@ -136,11 +135,13 @@ async def search_and_select(ctx, list_to_search: list, value, key, cutoff=5, ret
         message = f"{message}\nOnly results from the 5e SRD are included."
     else:
         message = "Only results from the 5e SRD are included."
-    if list_filter:
-        list_to_search = list(filter(list_filter, list_to_search))
-
     if search_func is None:
         search_func = search
+    if isinstance(list_to_search, SearchIndex) and (list_filter or search_func is not search):
+        list_to_search = list_to_search.entries  # the index only helps search()
+
+    if list_filter:
+        list_to_search = list(filter(list_filter, list_to_search))
 
     if asyncio.iscoroutinefunction(search_func):
         result = await search_func(list_to_search, value, key, cutoff, return_key)
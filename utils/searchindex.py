@@ -0,0 +1,219 @@
+"""
+An index of the names in a corpus, so that searching it does not go over every entry. Build one per corpus and reuse
+it; entries that change per search, like a user's homebrew, are added on top with SearchIndex.with_entries().
+Results are ranked like utils.functions.search(): an exact match, then the only substring match, then substring and
+fuzzy matches ordered by confidence. How many trigrams an entry shares with the query bounds its fuzzy score, so
+entries are scored from the highest bound down until none left can make the best matches.
+"""
+import heapq
+from collections import Counter, defaultdict
+
+from fuzzywuzzy import fuzz
+from fuzzywuzzy.utils import full_process
+
+FUZZY_LIMIT = 5  # fuzzy matches to keep, as fuzzywuzzy.process.extract() keeps
+
+
+def trigrams(string):
+    return {string[i:i + 3] for i in range(len(string) - 2)}
+
+
+def padded_trigrams(string):
+    """Trigrams of a string padded at either end, so that short strings and typos near the ends still share some."""
+    return trigrams(f"  {string} ")
+
+
+def length_bound(query_len, name_len):
+    """:returns int - the most fuzz.ratio() can score strings of these lengths, which is when one contains the other."""
+    if not query_len or not name_len:
+        return 0
+    return round(200 * min(query_len, name_len) / (query_len + name_len))
+
+
+def shared_bound(query_len, query_grams, name_len, name_grams, shared):
+    """Bounds fuzz.ratio() by the padded trigrams two strings share. Each character deleted from one string on the way
+    to their longest common subsequence breaks at most three of its trigrams, and each character inserted at most two;
+    the trigrams left are shared.
+    :param query_grams: How many distinct padded trigrams the query has.
+    :param name_grams: How many distinct padded trigrams the name has.
+    :param shared: How many distinct padded trigrams they share.
+    :returns int - the most fuzz.ratio() can score the strings."""
+    if not query_len or not name_len:
+        return 0
+    common = min(query_len, name_len,
+                 (3 * query_len + 2 * name_len - query_grams + shared) // 5,
+                 (3 * name_len + 2 * query_len - name_grams + shared) // 5)
+    return -(-200 * common // (query_len + name_len))  # rounded up
+
+
+def top_fuzzy(query, choices, cutoff, limit=FUZZY_LIMIT):
+    """Scores choices against query with fuzz.ratio() and keeps the best, like fuzzywuzzy.process.extract() followed
+    by a cutoff. A choice is only scored if its length lets it beat both the cutoff and the worst match kept so far;
+    ties go to the earlier choice.
+    :param query: The processed query.
+    :param choices: An iterable of (item, processed name).
+    :returns list - (item, score) of at most limit matches scoring at least cutoff, best first."""
+    heap = []  # (score, -order, item) - heap[0] is the match to drop next
+    query_len = len(query)
+    threshold = cutoff
+    for order, (item, name) in enumerate(choices):
+        if length_bound(query_len, len(name)) < threshold:
+            continue
+        score = fuzz.ratio(query, name)
+        if score < threshold:
+            continue
+        if len(heap) < limit:
+            heapq.heappush(heap, (score, -order, item))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, -order, item))
+        else:
+            continue
+        if len(heap) == limit:
+            threshold = max(cutoff, heap[0][0] + 1)  # a later choice has to beat the worst kept
+    return [(item, score) for score, _, item in sorted(heap, key=lambda r: (-r[0], -r[1]))]
+
+
+def unique_by_identity(items, obj=lambda item: item):
+    """:returns list - items without those whose obj(item) is the same object as an earlier one's."""
+    seen = set()
+    unique = []
+    for item in items:
+        if id(obj(item)) not in seen:
+            seen.add(id(obj(item)))
+            unique.append(item)
+    return unique
+
+
+class _Segment:
+    """A list of entries and the indexes of their names."""
+
+    def __init__(self, entries, key):
+        self.entries = list(entries)
+        self.keys = [key(e) for e in self.entries]
+        self.lowered = [k.lower() for k in self.keys]
+        self.processed = [full_process(k) for k in self.keys]  # what fuzzywuzzy compares
+        self.exact = {}  # lowered name -> index of its first entry
+        self.substrings = defaultdict(list)  # trigram of a lowered name -> indices of entries, ascending
+        self.grams = defaultdict(list)  # trigram of a processed name -> indices of entries, ascending
+        self.gram_counts = []  # how many trigrams each processed name has
+        self.shapes = defaultdict(list)  # (length, trigram count) of a processed name -> indices of entries, ascending
+        for i, (lowered, processed) in enumerate(zip(self.lowered, self.processed)):
+            self.exact.setdefault(lowered, i)
+            for gram in trigrams(lowered):
+                self.substrings[gram].append(i)
+            grams = padded_trigrams(processed) if processed else set()
+            for gram in grams:
+                self.grams[gram].append(i)
+            self.gram_counts.append(len(grams))
+            self.shapes[len(processed), len(grams)].append(i)
+
+    def partial_matches(self, value):
+        """:returns list - the indices of entries whose lowered name contains value, ascending."""
+        grams = trigrams(value)
+        if not grams:
+            return [i for i, lowered in enumerate(self.lowered) if value in lowered]
+        postings = sorted((self.substrings.get(g, ()) for g in grams), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0]).intersection(*postings[1:])  # a substring has all of value's trigrams
+        return [i for i in sorted(candidates) if value in self.lowered[i]]
+
+    def fuzzy_candidates(self, grams):
+        """:returns Counter - index of each entry whose processed name shares a trigram with the query -> how many."""
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        return shared
+
+
+class SearchIndex:
+    """A searchable corpus. Entries are searched in the order they were added."""
+
+    def __init__(self, entries, key, _segments=None):
+        """
+        :param entries: The objects to search.
+        :param key: A function giving the name to search an object by.
+        """
+        self.key = key
+        if _segments is None:
+            _segments = [_Segment(entries, key)]
+        self._segments = _segments
+
+    def with_entries(self, entries):
+        """:returns SearchIndex - an index of this index's entries followed by entries. This index is unchanged."""
+        entries = list(entries)
+        if not entries:
+            return self
+        return SearchIndex(None, self.key, self._segments + [_Segment(entries, self.key)])
+
+    @property
+    def entries(self):
+        return [e for segment in self._segments for e in segment.entries]
+
+    def __len__(self):
+        return sum(len(segment.entries) for segment in self._segments)
+
+    def search(self, value, cutoff=5, return_key=False):
+        """Searches the index like utils.functions.search().
+        :returns: A two-tuple (result, strict): an exact match and True, or a list of matches and False."""
+        lowered = value.lower()
+        for segment in self._segments:
+            i = segment.exact.get(lowered)
+            if i is not None:
+                return (segment.keys[i] if return_key else segment.entries[i]), True
+
+        partial_matches = [(segment, i) for segment in self._segments for i in segment.partial_matches(lowered)]
+        if len(partial_matches) == 1:
+            results = [partial_matches[0]]
+        else:
+            fuzzy_results = self._fuzzy(value, cutoff)
+            fuzzy_sum = sum(score for _, score in fuzzy_results)
+
+            # display the results in order of confidence
+            weighted_results = [(match, score / fuzzy_sum) for match, score in fuzzy_results]
+            weighted_results.extend(((segment, i), len(value) / len(segment.keys[i]))
+                                    for segment, i in partial_matches)
+            sorted_weighted = sorted(weighted_results, key=lambda e: e[1], reverse=True)
+
+            # build results list, unique
+            results = unique_by_identity([match for match, _ in sorted_weighted], lambda m: m[0].entries[m[1]])
+
+        if return_key:
+            return [segment.keys[i] for segment, i in results], False
+        return [segment.entries[i] for segment, i in results], False
+
+    def _fuzzy(self, value, cutoff, limit=FUZZY_LIMIT):
+        """Finds the same matches as top_fuzzy() over every entry, scoring entries in order of shared_bound(): those
+        sharing trigrams with the query one by one, and the rest in groups of the same length and trigram count.
+        :returns list - ((segment, index), score) of the best fuzzy matches scoring at least cutoff, best first."""
+        query = full_process(value)
+        if not query:
+            return []
+        grams = padded_trigrams(query)
+        candidates = []  # (bound, n, indices, skipped) - the segment's entries at indices score at most bound
+        for n, segment in enumerate(self._segments):
+            shared = segment.fuzzy_candidates(grams)
+            for i, count in shared.items():
+                bound = shared_bound(len(query), len(grams), len(segment.processed[i]), segment.gram_counts[i], count)
+                candidates.append((bound, n, (i,), ()))
+            for (length, gram_count), indices in segment.shapes.items():
+                bound = shared_bound(len(query), len(grams), length, gram_count, 0)
+                candidates.append((bound, n, indices, shared))  # those sharing trigrams are scored on their own
+        candidates.sort(key=lambda c: c[0], reverse=True)
+
+        heap = []  # (score, -n, -i) - heap[0] is the match to drop next; the earlier entry wins a tie
+        for bound, n, indices, skipped in candidates:
+            if bound < cutoff or (len(heap) == limit and bound < heap[0][0]):
+                break
+            processed = self._segments[n].processed
+            for i in indices:
+                if i in skipped:
+                    continue
+                score = fuzz.ratio(query, processed[i])
+                if score < cutoff:
+                    continue
+                if len(heap) < limit:
+                    heapq.heappush(heap, (score, -n, -i))
+                elif (score, -n, -i) > heap[0]:
+                    heapq.heapreplace(heap, (score, -n, -i))
+        return [((self._segments[-neg_n], -neg_i), score) for score, neg_n, neg_i in sorted(heap, reverse=True)]